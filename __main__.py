@@ -0,0 +1,164 @@
+'''
+Run the console pipelines without a window, eg. on a build server or in CI:
+
+    python -m mini_console build    <beetle_core_dir> <buildtarget_dir> [--workers 4] [--resume] ...
+    python -m mini_console clean    <beetle_core_dir> <buildtarget_dir>
+    python -m mini_console zip      <beetle_core_dir> <buildtarget_dir>
+    python -m mini_console rsync    <src_dir> <tgt_dir> [--exclude PATTERN ...]
+    python -m mini_console download <url>
+
+Run it from the directory that contains the 'mini_console' package, with the other Embeetle modules
+on the path. The output goes to stdout, or to the file given with '--output'. The exit code is 0 if
+the pipeline succeeded, 1 if it failed.
+
+The pipelines hand their steps over with thread switches and timers, so they still need a Qt event
+loop - but a QCoreApplication() is enough: no display, no widgets, no QTextDocument.
+
+'''
+from __future__ import annotations
+from typing import *
+import sys, argparse
+from PyQt5.QtCore import *
+import components.thread_switcher as _sw_
+import mini_console.headless      as _hl_
+import mini_console.trash         as _tr_
+nop = lambda *a, **k: None
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m mini_console", description="Headless mini console.")
+    parser.add_argument("--output", default=None, help="Write the output to this file instead of stdout.")
+    parser.add_argument("--no-history", action="store_true", help="Don't record the run timings.")
+    parser.add_argument("--profile", action="store_true", help="Print a step profile at the end of the run.")
+    parser.add_argument("--trash-timeout", type=float, default=0.0, help="Seconds to wait for the trash to be emptied before exiting.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="Build embeetle.")
+    p.add_argument("beetle_core_dirpath")
+    p.add_argument("buildtarget_dirpath")
+    p.add_argument("--workers", type=int, default=1, help="Nr of build steps that may run in parallel.")
+    p.add_argument("--no-cache", action="store_true", help="Don't skip steps whose inputs didn't change.")
+    p.add_argument("--hash-sources", action="store_true", help="Fingerprint the sources on their content.")
+    p.add_argument("--verbose-purge", action="store_true", help="Log every deleted C-file.")
+    p.add_argument("--resume", action="store_true", help="Skip the steps that completed in the previous run.")
+    p.add_argument("--native-sync", action="store_true", help="Update existing copies with the built-in sync engine.")
+    p.add_argument("--sync-snapshot", action="store_true", help="With --native-sync: only read the directories that changed since the last build.")
+    p.add_argument("--sync-shards", type=int, default=1, help="Update existing copies with this many rsync processes.")
+
+    for name, text in (("clean", "Clean the build output."), ("zip", "Zip the build output.")):
+        p = sub.add_parser(name, help=text)
+        p.add_argument("beetle_core_dirpath")
+        p.add_argument("buildtarget_dirpath")
+    sub.choices["clean"].add_argument("--fast", action="store_true", help="Move the build output to the trash and delete it in the background.")
+
+    p = sub.add_parser("rsync", help="Mirror a local directory into another one.")
+    p.add_argument("src_dirpath")
+    p.add_argument("tgt_dirpath")
+    p.add_argument("--exclude", action="append", default=None, help="Exclusion pattern (repeatable).")
+    p.add_argument("--dry-run-first", action="store_true", help="Size the progressbar with a dry-run (for rsync < 3.1).")
+    p.add_argument("--native", action="store_true", help="Use the built-in sync engine instead of rsync.")
+    p.add_argument("--snapshot", action="store_true", help="With --native: only read the directories that changed since the last sync.")
+    p.add_argument("--shards", type=int, default=1, help="Run this many rsync processes, one per top-level directory.")
+    p.add_argument("--dry-run", action="store_true", help="With --native: only print the changes the sync would make.")
+
+    p = sub.add_parser("download", help="Download a file into the temporary folder.")
+    p.add_argument("url")
+    return parser
+
+def check_args(parser:argparse.ArgumentParser, args:argparse.Namespace) -> None:
+    '''
+    Reject the option combinations that would silently do something else than asked.
+
+    '''
+    if (args.command == "build") and args.sync_snapshot and (not args.native_sync):
+        parser.error("build: --sync-snapshot needs --native-sync")
+    if (args.command == "rsync") and (not args.native):
+        if args.dry_run:
+            parser.error("rsync: --dry-run needs --native")
+        if args.snapshot:
+            parser.error("rsync: --snapshot needs --native")
+    return
+
+def run(args:argparse.Namespace, console:_hl_.HeadlessConsole, callback:Callable, callbackThread:QThread) -> None:
+    '''
+    Start the pipeline chosen on the command line. Must run in a non-main QThread. The callback gets
+    the success flag.
+
+    '''
+    def finish(arg):
+        callback(arg[0])
+        return
+
+    if args.command == "build":
+        console.build_embeetle(
+            beetle_core_dirpath = args.beetle_core_dirpath,
+            buildtarget_dirpath = args.buildtarget_dirpath,
+            callback            = finish,
+            callbackArg         = None,
+            callbackThread      = callbackThread,
+            max_workers         = args.workers,
+            use_cache           = not args.no_cache,
+            hash_sources        = args.hash_sources,
+            verbose_purge       = args.verbose_purge,
+            resume              = args.resume,
+            native_sync         = args.native_sync,
+            sync_snapshot       = args.sync_snapshot,
+            sync_shards         = args.sync_shards,
+        )
+    elif args.command == "clean":
+        console.clean_embeetle(args.beetle_core_dirpath, args.buildtarget_dirpath, finish, None, callbackThread, fast=args.fast)
+    elif args.command == "zip":
+        console.zip_embeetle(args.beetle_core_dirpath, args.buildtarget_dirpath, finish, None, callbackThread)
+    elif args.command == "rsync":
+        console.rsync_local(args.src_dirpath, args.tgt_dirpath, args.exclude, finish, None, callbackThread, single_pass=False if args.dry_run_first else None, native=args.native, use_snapshot=args.snapshot, shards=args.shards, dry_run=args.dry_run)
+    elif args.command == "download":
+        def downloaded(arg):
+            success, filepath, _ = arg
+            if success:
+                console.printout(f"{filepath}\n")
+            callback(success)
+            return
+        console.download_file(args.url, True, downloaded, None, callbackThread)
+    return
+
+def main(argv:Optional[List[str]]=None) -> int:
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    check_args(parser, args)
+    stream = sys.stdout
+    if args.output is not None:
+        stream = open(args.output, 'w', encoding='utf-8', newline='\n')
+    app = QCoreApplication(sys.argv[:1])
+    mainthread:QThread = QThread.currentThread()
+    console = _hl_.HeadlessConsole(stream)
+    console.enable_history(not args.no_history)
+    console.enable_profiling(args.profile)
+
+    def finished(success:bool) -> None:
+        assert QThread.currentThread() is mainthread
+        app.exit(0 if success else 1)
+        return
+
+    worker = QThread()
+    worker.start()
+    QTimer.singleShot(
+        0,
+        lambda: _sw_.switch_thread(
+            qthread      = worker,
+            callback     = lambda _: run(args, console, finished, mainthread),
+            callbackArg  = None,
+            notifycaller = nop,
+        ),
+    )
+    exitcode = app.exec_()
+    # A fast clean returns before its trash is gone. Give the collector a moment; whatever is left
+    # gets reclaimed on the next start.
+    _tr_.get_collector().wait(timeout=args.trash_timeout)
+    console.close()
+    worker.quit()
+    worker.wait()
+    if stream is not sys.stdout:
+        stream.close()
+    return exitcode
+
+if __name__ == "__main__":
+    sys.exit(main())
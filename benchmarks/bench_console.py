@@ -0,0 +1,264 @@
+'''
+Headless throughput and latency benchmarks for the mini console.
+
+Run from the directory that contains the 'mini_console' package (so the other Embeetle modules it
+imports are on the path as well):
+
+    python mini_console/benchmarks/bench_console.py --output bench.json
+    python mini_console/benchmarks/bench_console.py --quick --compare bench.json
+
+The Qt platform defaults to 'offscreen', so no display is needed. Every benchmark reports:
+
+    lines/s, MB/s, p50/p99 latency (ms), peak RSS (MB)
+
+For the editor and log benchmarks the latency is the duration of a single call (rendering happens
+synchronously in the main thread). For the process benchmarks it is the end-to-end latency from the
+moment the child wrote a line until the line arrived in the output slot - after being rendered in the
+MiniEditor() for the 'process+editor' variant.
+
+'''
+from __future__ import annotations
+from typing import *
+import os, sys, gc, json, time, platform, argparse
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+import mini_console.mini_console as _mc_
+import mini_console.process      as _pr_
+try:
+    import resource
+except ImportError:
+    resource = None
+
+CHILD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "synthetic_child.py").replace('\\', '/')
+
+"""
+1. HELPERS
+"""
+def get_peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def percentile(values:List[float], p:float) -> float:
+    if len(values) == 0:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round((p / 100.0) * (len(values) - 1)))))
+    return values[k]
+
+def make_result(name:str, params:Dict, nlines:int, nbytes:int, seconds:float, latencies:List[float]) -> Dict:
+    seconds = max(seconds, 1e-9)
+    return {
+        "name"           : name,
+        "params"         : params,
+        "lines"          : nlines,
+        "bytes"          : nbytes,
+        "seconds"        : seconds,
+        "lines_per_s"    : nlines / seconds,
+        "mb_per_s"       : nbytes / seconds / (1024 * 1024),
+        "latency_p50_ms" : 1000.0 * percentile(latencies, 50),
+        "latency_p99_ms" : 1000.0 * percentile(latencies, 99),
+        "peak_rss_mb"    : get_peak_rss_mb(),
+    }
+
+def make_line(size:int) -> str:
+    return ('x' * max(0, size - 1)) + '\n'
+
+"""
+2. BENCHMARKS
+"""
+def bench_editor_printout(app:QApplication, nlines:int, size:int, html:bool) -> Dict:
+    editor = _mc_.MiniEditor()
+    editor.show()
+    if html:
+        line = "<span style=\"color:#fce94f;\">" + ('x' * max(0, size - 40)) + "</span><br>"
+        func = editor.printout_html
+    else:
+        line = make_line(size)
+        func = editor.printout
+    latencies = []
+    gc.collect()
+    t0 = time.perf_counter()
+    for i in range(nlines):
+        t = time.perf_counter()
+        func(line)
+        latencies.append(time.perf_counter() - t)
+        if i % 256 == 255:
+            app.processEvents()
+    app.processEvents()
+    seconds = time.perf_counter() - t0
+    editor.close()
+    editor.deleteLater()
+    name = "editor.printout_html" if html else "editor.printout"
+    return make_result(name, {"lines": nlines, "size": size}, nlines, nlines * len(line), seconds, latencies)
+
+def bench_progbar(app:QApplication, nupdates:int) -> Dict:
+    editor = _mc_.MiniEditor()
+    editor.show()
+    editor.printout("Progressbar benchmark\n")
+    editor.start_progbar("Bench:")
+    app.processEvents()
+    latencies = []
+    t0 = time.perf_counter()
+    for i in range(1, nupdates + 1):
+        t = time.perf_counter()
+        editor.set_progbar_val(100.0 * i / nupdates)
+        latencies.append(time.perf_counter() - t)
+    editor.close_progbar()
+    app.processEvents()
+    seconds = time.perf_counter() - t0
+    editor.close()
+    editor.deleteLater()
+    return make_result("editor.set_progbar_val", {"updates": nupdates}, nupdates, 0, seconds, latencies)
+
+def bench_log_output(app:QApplication, nlines:int, size:int) -> Dict:
+    console = _mc_.MiniConsole("bench")
+    progbar = QProgressBar()
+    console.assign_external_progbar(progbar)
+    console.set_extprogbar_max(nlines)
+    console.activate_extprogbar_logging(True)
+    console.clear_log()
+    line = make_line(size)
+    latencies = []
+    t0 = time.perf_counter()
+    for i in range(nlines):
+        t = time.perf_counter()
+        console.log_output(line)
+        latencies.append(time.perf_counter() - t)
+    app.processEvents()
+    seconds = time.perf_counter() - t0
+    console.activate_extprogbar_logging(False)
+    console.close()
+    console.deleteLater()
+    return make_result("console.log_output", {"lines": nlines, "size": size}, nlines, nlines * size, seconds, latencies)
+
+def bench_process(app:QApplication, nlines:int, size:int, rate:float, render:bool) -> Dict:
+    proc   = _pr_.Process()
+    editor = None
+    if render:
+        editor = _mc_.MiniEditor()
+        editor.show()
+        proc.output_sig.connect(editor._printout_)   # Connected first, so it runs before on_output().
+    latencies:List[float] = []
+    nbytes:int  = 0
+    rest:str    = ''
+    result:Dict = {}
+    loop = QEventLoop()
+    def on_output(s:str):
+        nonlocal nbytes, rest
+        now = time.time()
+        nbytes += len(s)
+        *complete, rest = (rest + s).split('\n')
+        for l in complete:
+            try:
+                latencies.append(now - float(l[0:17]))
+            except ValueError:
+                pass   # Newlines inserted by Process() itself
+        return
+    def on_finish(success, code):
+        result["success"] = success
+        result["code"]    = code
+        loop.quit()
+        return
+    proc.output_sig.connect(on_output)
+    cmd = f"\"{sys.executable}\" \"{CHILD}\" --lines {nlines} --size {size} --rate {rate}"
+    t0 = time.perf_counter()
+    proc.execute_command(command=cmd, subproc_callback=None, process_callback=on_finish)
+    if "success" not in result:
+        loop.exec_()
+    seconds = time.perf_counter() - t0
+    if editor is not None:
+        editor.close()
+        editor.deleteLater()
+    proc.deleteLater()
+    name = "process+editor" if render else "process.catch_output"
+    res = make_result(name, {"lines": nlines, "size": size, "rate": rate}, len(latencies), nbytes, seconds, latencies)
+    if not result.get("success"):
+        res["error"] = str(result.get("code"))
+    return res
+
+"""
+3. MAIN
+"""
+def compare(results:List[Dict], baselinepath:str, threshold:float) -> int:
+    '''
+    Print the throughput ratio against a previous results file. Return the nr of regressions.
+
+    '''
+    with open(baselinepath, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)["results"]
+    key = lambda r: (r["name"], json.dumps(r["params"], sort_keys=True))
+    old = {key(r): r for r in baseline}
+    nr_regressions = 0
+    print(f"\nComparison with {baselinepath}:")
+    for r in results:
+        o = old.get(key(r))
+        if (o is None) or (o["lines_per_s"] <= 0):
+            continue
+        ratio = r["lines_per_s"] / o["lines_per_s"]
+        flag  = ''
+        if ratio < 1.0 / (1.0 + threshold):
+            flag = "   <-- REGRESSION"
+            nr_regressions += 1
+        print(f"  {r['name']:<24} {json.dumps(r['params']):<44} {ratio:6.2f}x{flag}")
+    return nr_regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Mini console benchmarks")
+    parser.add_argument("--output",    default=None,  help="Write the results to this JSON file.")
+    parser.add_argument("--compare",   default=None,  help="Compare against a previous JSON results file.")
+    parser.add_argument("--threshold", default=0.2,   type=float, help="Relative slowdown flagged as regression.")
+    parser.add_argument("--quick",     action="store_true", help="Smaller workloads.")
+    args = parser.parse_args()
+
+    app   = QApplication.instance() or QApplication(sys.argv)
+    scale = 1 if args.quick else 5
+    sizes = (16, 80, 400)
+    results:List[Dict] = []
+    def run(res:Dict) -> None:
+        results.append(res)
+        rss = res["peak_rss_mb"]
+        print(
+            f"{res['name']:<24} {json.dumps(res['params']):<44} "
+            f"{res['lines_per_s']:>12,.0f} lines/s {res['mb_per_s']:>8.2f} MB/s "
+            f"p50={res['latency_p50_ms']:.3f}ms p99={res['latency_p99_ms']:.3f}ms "
+            f"rss={'n/a' if rss is None else f'{rss:.0f}MB'}"
+            f"{'   ERROR: ' + res['error'] if 'error' in res else ''}"
+        )
+        return
+
+    for size in sizes:
+        run(bench_editor_printout(app, nlines=1000 * scale, size=size, html=False))
+    for size in sizes:
+        run(bench_editor_printout(app, nlines=1000 * scale, size=size, html=True))
+    run(bench_progbar(app, nupdates=500 * scale))
+    for size in sizes:
+        run(bench_log_output(app, nlines=10000 * scale, size=size))
+    for rate in (1000.0, 10000.0, 0.0):
+        run(bench_process(app, nlines=5000 * scale, size=80, rate=rate, render=False))
+    for rate in (1000.0, 0.0):
+        run(bench_process(app, nlines=2000 * scale, size=80, rate=rate, render=True))
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                "meta": {
+                    "timestamp" : time.time(),
+                    "python"    : platform.python_version(),
+                    "platform"  : platform.platform(),
+                    "qt"        : QT_VERSION_STR,
+                    "pyqt"      : PYQT_VERSION_STR,
+                },
+                "results": results,
+            }, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare is not None:
+        return 1 if compare(results, args.compare, args.threshold) > 0 else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+'''
+Synthetic child process for the Process.catch_output() benchmark. Writes lines of the form:
+
+    <send timestamp> xxxxxxxx...\n
+
+to stdout at a given rate, such that the receiving side can compute the end-to-end latency of every
+line.
+
+'''
+from __future__ import annotations
+import sys, time, argparse
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int,   default=10000, help="Nr of lines to write.")
+    parser.add_argument("--size",  type=int,   default=80,    help="Line length in bytes, including the newline.")
+    parser.add_argument("--rate",  type=float, default=0.0,   help="Lines per second (0 = as fast as possible).")
+    args = parser.parse_args()
+    pad = 'x' * max(0, args.size - 19)   # Timestamp (17 chars) + space + newline
+    out = sys.stdout
+    t0  = time.time()
+    for i in range(args.lines):
+        if args.rate > 0:
+            delay = t0 + (i / args.rate) - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        out.write(f"{time.time():17.6f} {pad}\n")
+        if (args.rate > 0) or (i % 64 == 63):
+            out.flush()
+    out.flush()
+    return
+
+if __name__ == "__main__":
+    main()
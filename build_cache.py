@@ -0,0 +1,268 @@
+from __future__ import annotations
+from typing import *
+import os, json, time, hashlib, threading
+
+# A manifest maps the relative path of every file in a tree to [size, mtime_ns, sha1]. The sha1 is
+# None unless the tree was scanned with hash_files=True.
+Manifest = Dict[str, List]
+
+def scan_tree(dirpath:str,
+              skip_dirnames:Iterable[str]=(),
+              skip_relpaths:Iterable[str]=(),
+              hash_files:bool=False,
+              previous:Optional[Manifest]=None) -> Manifest:
+    '''
+    Walk the given directory with os.scandir() and return its manifest. A missing directory gives an
+    empty manifest.
+
+    :param skip_dirnames:   Names of directories (at any depth) to leave out.
+    :param skip_relpaths:   Paths of directories (relative to dirpath, with forward slashes) to leave out.
+    :param hash_files:      Also compute the SHA-1 of each file.
+    :param previous:        Earlier manifest of the same tree. Its hashes get reused for files whose size
+                            and mtime didn't change.
+
+    '''
+    skip = set(skip_dirnames)
+    skip_paths = set(skip_relpaths)
+    manifest:Manifest = {}
+    if not os.path.isdir(dirpath):
+        return manifest
+    stack = ['']
+    while len(stack) > 0:
+        reldir = stack.pop()
+        with os.scandir(os.path.join(dirpath, reldir)) as it:
+            for entry in it:
+                relpath = f"{reldir}/{entry.name}" if reldir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if (entry.name not in skip) and (relpath not in skip_paths):
+                        stack.append(relpath)
+                    continue
+                st = entry.stat(follow_symlinks=False)
+                digest = None
+                if hash_files:
+                    old = previous.get(relpath) if previous is not None else None
+                    if (old is not None) and (old[0] == st.st_size) and (old[1] == st.st_mtime_ns) and old[2]:
+                        digest = old[2]
+                    else:
+                        digest = hash_file(entry.path)
+                manifest[relpath] = [st.st_size, st.st_mtime_ns, digest]
+    return manifest
+
+def hash_file(filepath:str) -> str:
+    h = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def get_digest(manifest:Manifest, extra:str='') -> str:
+    '''
+    Fingerprint of a whole manifest. Files with a hash are compared on their content, the others on
+    their mtime. The 'extra' string gets mixed in as well (eg. the command that consumes the tree).
+
+    '''
+    h = hashlib.sha1(extra.encode('utf-8'))
+    for relpath in sorted(manifest.keys()):
+        size, mtime_ns, digest = manifest[relpath]
+        h.update(f"{relpath}\0{size}\0{digest if digest else mtime_ns}\n".encode('utf-8', errors='replace'))
+    return h.hexdigest()
+
+def get_combined_digest(parts:Iterable[str]) -> str:
+    '''
+    One fingerprint for several others (or any other strings).
+
+    '''
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(part.encode('utf-8', errors='replace') + b'\n')
+    return h.hexdigest()
+
+def load_json(filepath:str, version:int) -> Optional[Dict]:
+    '''
+    Load a state file. Return None if it's missing, corrupt or has another version.
+
+    '''
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (not isinstance(data, dict)) or (data.get("version") != version):
+        return None
+    return data
+
+def save_json(filepath:str, data:Dict) -> None:
+    '''
+    Save a state file. Write to a temporary file first, such that a crash never leaves a corrupt file
+    behind. A failure only gets reported: losing build state costs time, not correctness.
+
+    '''
+    try:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        tmppath = filepath + ".tmp"
+        with open(tmppath, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmppath, filepath)
+    except OSError as e:
+        print(f"WARNING: cannot save {filepath}: {e}")
+    return
+
+class BuildCache:
+    '''
+    Remember, per build step, the fingerprint of its inputs and of the outputs it produced. A step
+    whose inputs didn't change since its last successful run - while its outputs are still in place -
+    can be skipped. Likewise, values derived from some inputs (eg. the nr of files to be frozen) are
+    remembered together with the fingerprint of those inputs.
+
+    The cache is one JSON file:
+
+        {
+            "version": 1,
+            "steps": {
+                "<step>": {"inputs": <digest>, "outputs": <digest>, "time": <timestamp>, "manifest": {...}},
+                ...
+            },
+            "values": {
+                "<name>": {"inputs": <digest>, "value": <any JSON value>, "time": <timestamp>},
+                ...
+            }
+        }
+
+    The input manifest is only stored when it carries hashes, such that those don't need to be
+    recomputed for unchanged files.
+
+    '''
+    VERSION = 1
+
+    def __init__(self, filepath:str) -> None:
+        self.__filepath = filepath.replace('\\', '/')
+        self.__lock     = threading.RLock()
+        self.__data     = self.__load__()
+        return
+
+    def get_filepath(self) -> str:
+        return self.__filepath
+
+    """
+    1. STEPS
+    """
+    def get_inputs(self, step:str) -> Optional[str]:
+        with self.__lock:
+            return self.__data["steps"].get(step, {}).get("inputs")
+
+    def get_outputs(self, step:str) -> Optional[str]:
+        with self.__lock:
+            return self.__data["steps"].get(step, {}).get("outputs")
+
+    def get_manifest(self, step:str) -> Optional[Manifest]:
+        with self.__lock:
+            return self.__data["steps"].get(step, {}).get("manifest")
+
+    def store(self, step:str, inputs:str, outputs:str, manifest:Optional[Manifest]=None) -> None:
+        with self.__lock:
+            entry = {"inputs": inputs, "outputs": outputs, "time": time.time()}
+            if manifest is not None:
+                entry["manifest"] = manifest
+            self.__data["steps"][step] = entry
+            self.__save__()
+        return
+
+    def invalidate(self, step:str) -> None:
+        with self.__lock:
+            if self.__data["steps"].pop(step, None) is not None:
+                self.__save__()
+        return
+
+    """
+    2. VALUES
+    """
+    def get_value(self, name:str, inputs:str) -> Optional[Any]:
+        '''
+        Return the value stored under the given name, if it was derived from the same inputs.
+
+        '''
+        with self.__lock:
+            entry = self.__data["values"].get(name)
+            if (entry is None) or (entry["inputs"] != inputs):
+                return None
+            return entry["value"]
+
+    def store_value(self, name:str, inputs:str, value:Any) -> None:
+        with self.__lock:
+            self.__data["values"][name] = {"inputs": inputs, "value": value, "time": time.time()}
+            self.__save__()
+        return
+
+    """
+    3. INTERNAL FUNCTIONS
+    """
+    def __load__(self) -> Dict:
+        data = load_json(self.__filepath, self.VERSION)
+        if data is None:
+            return {"version": self.VERSION, "steps": {}, "values": {}}
+        data.setdefault("steps", {})
+        data.setdefault("values", {})
+        return data
+
+    def __save__(self) -> None:
+        save_json(self.__filepath, self.__data)
+        return
+
+class Checkpoints:
+    '''
+    Record which steps of a run completed, together with the fingerprint of their inputs, such that
+    an interrupted or failed run can be resumed:
+
+        {
+            "version": 1,
+            "steps": {
+                "<step>": {"inputs": <digest>, "time": <timestamp>},
+                ...
+            }
+        }
+
+    '''
+    VERSION = 1
+
+    def __init__(self, filepath:str) -> None:
+        self.__filepath = filepath.replace('\\', '/')
+        self.__lock     = threading.RLock()
+        data = load_json(self.__filepath, self.VERSION)
+        self.__steps:Dict[str, Dict] = data.get("steps", {}) if data is not None else {}
+        return
+
+    def get_filepath(self) -> str:
+        return self.__filepath
+
+    def is_done(self, step:str, inputs:str) -> bool:
+        '''
+        True if the step completed before, with the same inputs.
+
+        '''
+        with self.__lock:
+            entry = self.__steps.get(step)
+            return (entry is not None) and (entry["inputs"] == inputs)
+
+    def mark_done(self, step:str, inputs:str) -> None:
+        with self.__lock:
+            self.__steps[step] = {"inputs": inputs, "time": time.time()}
+            self.__save__()
+        return
+
+    def clear(self, steps:Optional[Iterable[str]]=None) -> None:
+        '''
+        Forget the given steps, or all of them.
+
+        '''
+        with self.__lock:
+            if steps is None:
+                self.__steps.clear()
+            else:
+                for step in steps:
+                    self.__steps.pop(step, None)
+            self.__save__()
+        return
+
+    def __save__(self) -> None:
+        save_json(self.__filepath, {"version": self.VERSION, "steps": self.__steps})
+        return
@@ -0,0 +1,104 @@
+from __future__ import annotations
+from typing import *
+import os, hashlib, tempfile
+
+HISTORY_DIRNAME = ".mini_console_history"
+
+def get_history_dirpath(buildtarget_dirpath:str) -> str:
+    '''
+    Directory next to the build target where run history (timings, profiles, ...) is kept. It lives
+    outside the build target, such that it survives clean_embeetle() and doesn't end up in the zip.
+
+    '''
+    parent = os.path.dirname(buildtarget_dirpath.replace('\\', '/').rstrip('/'))
+    return os.path.join(parent, HISTORY_DIRNAME).replace('\\', '/')
+
+def get_history_filepath(history_dirpath:str) -> str:
+    return os.path.join(history_dirpath, "history.jsonl").replace('\\', '/')
+
+def get_query_cache_filepath(buildtarget_dirpath:str) -> str:
+    '''
+    Cache for answers that only depend on the sources (eg. the nr of files to be frozen). Unlike the
+    build cache, it survives clean_embeetle().
+
+    '''
+    return os.path.join(get_history_dirpath(buildtarget_dirpath), "build_queries.json").replace('\\', '/')
+
+STATE_DIRNAME = ".mini_console"
+
+def get_state_dirpath(buildtarget_dirpath:str) -> str:
+    '''
+    Directory inside the build target where build state (cache, checkpoints, ...) is kept. It gets wiped
+    together with the build output it describes. zip_embeetle() leaves it out of the zip.
+
+    '''
+    return os.path.join(buildtarget_dirpath.replace('\\', '/').rstrip('/'), STATE_DIRNAME).replace('\\', '/')
+
+def get_cache_filepath(buildtarget_dirpath:str) -> str:
+    return os.path.join(get_state_dirpath(buildtarget_dirpath), "build_cache.json").replace('\\', '/')
+
+def get_checkpoint_filepath(buildtarget_dirpath:str) -> str:
+    return os.path.join(get_state_dirpath(buildtarget_dirpath), "checkpoints.json").replace('\\', '/')
+
+TRASH_DIRNAME = ".mini_console_trash"
+
+def get_trash_dirpath(path:str) -> str:
+    '''
+    Trash directory for the given file or directory: a sibling of it, such that moving it into the
+    trash is a rename on the same filesystem.
+
+    '''
+    parent = os.path.dirname(path.replace('\\', '/').rstrip('/'))
+    return os.path.join(parent, TRASH_DIRNAME).replace('\\', '/')
+
+def get_user_cache_dirpath() -> str:
+    '''
+    Per-user cache directory of the mini console, for state that doesn't belong to one build target.
+
+    '''
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~/AppData/Local")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "mini_console").replace('\\', '/')
+
+def get_snapshot_filepath(src_dirpath:str, tgt_dirpath:str, exclusions:Optional[Iterable[str]]) -> str:
+    '''
+    File with the snapshot of the tree synced from 'src_dirpath' into 'tgt_dirpath'. Other exclusions
+    give another tree, so they get their own snapshot.
+
+    '''
+    key = '\n'.join([
+        os.path.abspath(src_dirpath).replace('\\', '/').rstrip('/'),
+        os.path.abspath(tgt_dirpath).replace('\\', '/').rstrip('/'),
+        *(exclusions or []),
+    ])
+    name = hashlib.sha1(key.encode('utf-8', errors='replace')).hexdigest()
+    return os.path.join(get_user_cache_dirpath(), "snapshots", f"{name}.json").replace('\\', '/')
+
+def get_shard_sizes_filepath(src_dirpath:str) -> str:
+    '''
+    File with the sizes of the top-level directories of 'src_dirpath', as measured by the last sharded
+    sync. They balance the next one.
+
+    '''
+    key = os.path.abspath(src_dirpath).replace('\\', '/').rstrip('/')
+    name = hashlib.sha1(key.encode('utf-8', errors='replace')).hexdigest()
+    return os.path.join(get_user_cache_dirpath(), "shard_sizes", f"{name}.json").replace('\\', '/')
+
+def get_ssh_control_dirpath() -> str:
+    '''
+    Directory for the control sockets of multiplexed SSH connections. A Unix socket path can't be much
+    longer than 100 characters, so it sits in the temporary directory instead of the user cache, in a
+    folder of its own per user.
+
+    '''
+    base = "/tmp" if os.path.isdir("/tmp") else tempfile.gettempdir()
+    return os.path.join(base, f"mini_console-ssh-{os.getuid()}").replace('\\', '/')
+
+def get_credentials_dirpath() -> str:
+    '''
+    Private directory (0700) for downloaded credentials (eg. the ssh keys of the remote syncs).
+
+    '''
+    return os.path.join(get_user_cache_dirpath(), "credentials").replace('\\', '/')
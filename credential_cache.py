@@ -0,0 +1,94 @@
+from __future__ import annotations
+from typing import *
+import os, time, stat, hashlib, threading, urllib.error
+import functions
+import mini_console.build_dirs  as _bd_
+import mini_console.build_cache as _bc_
+
+# How the file came about: from the cache without asking the server, from the cache after the server
+# sent the same file again, freshly downloaded, or from the cache because the server couldn't be
+# reached.
+CACHED       = "cached"
+NOT_MODIFIED = "not modified"
+DOWNLOADED   = "downloaded"
+STALE        = "stale"
+
+_locks:Dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+def get_lock(name:str) -> threading.Lock:
+    with _locks_lock:
+        return _locks.setdefault(name, threading.Lock())
+
+def get_private_dirpath() -> str:
+    '''
+    Create the credentials directory if needed and make sure only the current user can get into it.
+    Raises OSError if it can't be made private.
+
+    '''
+    dirpath = _bd_.get_credentials_dirpath()
+    os.makedirs(dirpath, mode=0o700, exist_ok=True)
+    if os.name != "nt":
+        st = os.lstat(dirpath)
+        if (not stat.S_ISDIR(st.st_mode)) or (st.st_uid != os.getuid()):
+            raise OSError(f"{dirpath} is not a directory owned by the current user")
+        if stat.S_IMODE(st.st_mode) != 0o700:
+            os.chmod(dirpath, 0o700)
+    return dirpath
+
+def fetch(url:str, ttl:float=3600.0) -> Tuple[str, str]:
+    '''
+    Return the path of a private copy (0600) of the file at the given url, and how it came about (see
+    the constants above). A copy younger than 'ttl' seconds is used as it is. An older one gets
+    revalidated: the file is downloaded again with functions.urlretrieve_beetle() (which takes care of
+    the proxy and SSL settings), and only replaces the copy if it changed. If the server can't be
+    reached or fails (5xx), an older copy is still used. A client error (eg. 403 or 404 for a key that
+    got revoked or moved) is raised, as is any error if there is no copy to fall back on:
+    urllib.error.URLError (HTTPError) or OSError.
+
+    :param ttl:         Seconds a copy is trusted without asking the server. Zero always revalidates.
+
+    '''
+    dirpath  = get_private_dirpath()
+    name     = hashlib.sha1(url.encode('utf-8', errors='replace')).hexdigest()
+    filepath = os.path.join(dirpath, name).replace('\\', '/')
+    metapath = f"{filepath}.json"
+    # One lock per url: a slow server doesn't hold up the lookups of other files.
+    with get_lock(name):
+        meta = _bc_.load_json(metapath, 2)
+        if (meta is None) or (not os.path.isfile(filepath)):
+            meta = {"version": 2, "url": url, "sha1": None, "checked": 0.0}
+        elif time.time() - meta["checked"] < ttl:
+            return filepath, CACHED
+        try:
+            downloaded, _ = functions.urlretrieve_beetle(url)
+        except urllib.error.HTTPError as e:
+            if (e.code < 500) or (not os.path.isfile(filepath)):
+                raise
+            # Don't record the check: the next call asks the server again.
+            return filepath, STALE
+        except (urllib.error.URLError, OSError):
+            if not os.path.isfile(filepath):
+                raise
+            return filepath, STALE
+        try:
+            with open(downloaded, 'rb') as f:
+                content = f.read()
+        finally:
+            try:
+                os.remove(downloaded)
+            except OSError:
+                pass
+        sha1 = hashlib.sha1(content).hexdigest()
+        status = NOT_MODIFIED
+        if (sha1 != meta["sha1"]) or (not os.path.isfile(filepath)):
+            tmppath = f"{filepath}.{os.getpid()}.tmp"
+            fd = os.open(tmppath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmppath, filepath)
+            status = DOWNLOADED
+        meta["sha1"]    = sha1
+        meta["checked"] = time.time()
+        _bc_.save_json(metapath, meta)
+    return filepath, status
@@ -0,0 +1,154 @@
+from __future__ import annotations
+from typing import *
+import os, json, time, queue, threading
+
+class EventSink:
+    '''
+    Opt-in export of console activity as newline-delimited JSON. Every record looks like:
+
+        {"ts": 1571234567.123, "event": "command_finish", "cmd": "...", "success": true, ...}
+
+    Events are put on a bounded queue and written by a background thread, so the GUI thread and the
+    process callbacks never wait for the disk. When the queue is full, events get dropped and counted
+    instead (see get_nr_dropped()). The drop count is written as a 'sink_close' event at the end.
+
+    '''
+    def __init__(self, filepath:str, maxsize:int=10000, sample_every:int=0, sample_bytes:int=256, append:bool=True) -> None:
+        '''
+        :param filepath:        Target .jsonl file.
+        :param maxsize:         Capacity of the event queue.
+        :param sample_every:    Add the payload to every n-th output chunk event (0 = never).
+        :param sample_bytes:    Max nr of characters in a sampled payload.
+        :param append:          Append to an existing file instead of overwriting it.
+
+        '''
+        dirpath = os.path.dirname(filepath)
+        if dirpath != '':
+            os.makedirs(dirpath, exist_ok=True)
+        self.__filepath     = filepath
+        self.__sample_every = sample_every
+        self.__sample_bytes = sample_bytes
+        self.__queue:queue.Queue = queue.Queue(maxsize=maxsize)
+        self.__nr_chunks:int  = 0
+        self.__nr_dropped:int = 0
+        self.__closed:bool    = False
+        self.__file = open(filepath, 'a' if append else 'w', encoding='utf-8')
+        self.__thread = threading.Thread(target=self.__write_loop__, name="EventSink", daemon=True)
+        self.__thread.start()
+        return
+
+    """
+    1. EMIT EVENTS
+    """
+    def emit(self, event:str, **fields) -> None:
+        '''
+        Queue one event. Never blocks.
+
+        '''
+        if self.__closed:
+            return
+        try:
+            self.__queue.put_nowait({"ts": time.time(), "event": event, **fields})
+        except queue.Full:
+            self.__nr_dropped += 1
+        return
+
+    def emit_output(self, outputStr:str) -> None:
+        '''
+        Queue the metadata of one output chunk. Every n-th chunk carries (part of) its payload, if
+        sampling is enabled.
+
+        '''
+        self.__nr_chunks += 1
+        fields = {
+            "chunk" : self.__nr_chunks,
+            "chars" : len(outputStr),
+            "lines" : outputStr.count('\n'),
+        }
+        if (self.__sample_every > 0) and (self.__nr_chunks % self.__sample_every == 0):
+            fields["payload"] = outputStr[0:self.__sample_bytes]
+        self.emit("output", **fields)
+        return
+
+    """
+    2. GETTERS
+    """
+    def get_filepath(self) -> str:
+        return self.__filepath
+
+    def get_nr_dropped(self) -> int:
+        return self.__nr_dropped
+
+    """
+    3. CLOSE
+    """
+    def close(self, timeout:float=2.0) -> None:
+        '''
+        Write the remaining events and stop the writer thread.
+
+        '''
+        if self.__closed:
+            return
+        self.__closed = True
+        # Make room first, such that the drop count in the close event includes what goes to make room.
+        self.__make_room__(2, timeout)
+        self.__put_forced__({"ts": time.time(), "event": "sink_close", "dropped": self.__nr_dropped})
+        # The writer thread only stops (and closes the file) on this one.
+        self.__put_forced__(None)
+        self.__thread.join(timeout)
+        return
+
+    """
+    4. INTERNAL FUNCTIONS
+    """
+    def __make_room__(self, nr_items:int, timeout:float) -> None:
+        # Wait until the queue has room for the given nr of events. If the writer can't make it in time,
+        # drop the oldest events.
+        maxsize = self.__queue.maxsize
+        if maxsize <= 0:
+            return
+        deadline = time.monotonic() + timeout
+        while (self.__queue.qsize() > maxsize - nr_items) and (time.monotonic() < deadline):
+            time.sleep(0.01)
+        while self.__queue.qsize() > maxsize - nr_items:
+            try:
+                self.__queue.get_nowait()
+                self.__nr_dropped += 1
+            except queue.Empty:
+                break
+        return
+
+    def __put_forced__(self, item:Optional[Dict]) -> None:
+        # Normally there's room after __make_room__(). An event emitted in the meantime gets dropped.
+        while True:
+            try:
+                self.__queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            try:
+                self.__queue.get_nowait()
+                self.__nr_dropped += 1
+            except queue.Empty:
+                pass
+
+    def __write_loop__(self) -> None:
+        while True:
+            item = self.__queue.get()
+            batch = [item]
+            # Drain whatever else is waiting, such that one write() call handles a burst.
+            while (item is not None) and (len(batch) < 1000):
+                try:
+                    item = self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+            lines = [json.dumps(e, default=str) + '\n' for e in batch if e is not None]
+            try:
+                self.__file.writelines(lines)
+                self.__file.flush()
+            except (OSError, ValueError):
+                pass
+            if batch[-1] is None:
+                self.__file.close()
+                return
@@ -0,0 +1,173 @@
+from __future__ import annotations
+from typing import *
+import re, functools
+
+def compile_pattern(pattern:str) -> Tuple[str, bool, bool]:
+    '''
+    Translate an rsync '--exclude' pattern into a regex. Return (regex, match_basename_only, dirs_only):
+        - A trailing '/' makes the pattern match directories only.
+        - A pattern without a '/' matches the name of an entry at any depth.
+        - A pattern with a '/' matches the end of the relative path, unless it starts with a '/':
+          then it's anchored at the root of the tree.
+        - '*' and '?' don't match a '/', '**' does.
+
+    '''
+    dirs_only = pattern.endswith('/')
+    pattern   = pattern.rstrip('/')
+    anchored  = pattern.startswith('/')
+    pattern   = pattern.lstrip('/')
+    basename_only = ('/' not in pattern) and (not anchored)
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            continue
+        if c == '*':
+            regex += "[^/]*"
+        elif c == '?':
+            regex += "[^/]"
+        elif c == '[':
+            j = pattern.find(']', i + 1)
+            if j == -1:
+                regex += re.escape(c)
+            else:
+                regex += '[' + pattern[i + 1:j].replace('!', '^', 1) + ']'
+                i = j
+        else:
+            regex += re.escape(c)
+        i += 1
+    if basename_only or anchored:
+        regex = f"^{regex}$"
+    else:
+        regex = f"(?:^|/){regex}$"
+    return regex, basename_only, dirs_only
+
+def is_literal(pattern:str) -> bool:
+    return re.search(r"[*?\[]", pattern) is None
+
+class ExclusionRules:
+    '''
+    Exclusion patterns in rsync's '--exclude' syntax (see compile_pattern()), compiled once into a
+    single matcher. The same object goes to rsync, to the built-in sync and copy engines and to the
+    zipper, so they all leave out the same entries.
+
+    The patterns are split on what they match (the name or the relative path) and on what they apply
+    to (anything or directories only). Plain names go into sets, the other patterns of each group get
+    joined into one regex. Matching an entry is then a few set lookups and at most four regex searches,
+    however many patterns there are.
+
+    '''
+    def __init__(self, patterns:Optional[Iterable[str]]=None) -> None:
+        self.patterns:Tuple[str, ...] = tuple(p for p in (patterns or ()) if p.strip('/') != '')
+        names:Dict[bool, Set[str]]    = {False: set(), True: set()}
+        regexes:Dict[Tuple[bool, bool], List[str]] = {(b, d): [] for b in (False, True) for d in (False, True)}
+        for pattern in self.patterns:
+            regex, basename_only, dirs_only = compile_pattern(pattern)
+            if basename_only and is_literal(pattern):
+                names[dirs_only].add(pattern.rstrip('/'))
+                continue
+            regexes[(basename_only, dirs_only)].append(regex)
+        self.__names_any  = frozenset(names[False])
+        self.__names_dirs = frozenset(names[True])
+        def join(group:List[str]) -> Optional[Pattern]:
+            return re.compile('|'.join(f"(?:{r})" for r in group)) if len(group) > 0 else None
+        self.__name_any  = join(regexes[(True, False)])
+        self.__name_dirs = join(regexes[(True, True)])
+        self.__path_any  = join(regexes[(False, False)])
+        self.__path_dirs = join(regexes[(False, True)])
+        return
+
+    @classmethod
+    def from_names(cls, dirnames:Iterable[str]=(), filenames:Iterable[str]=()) -> ExclusionRules:
+        '''
+        Rules that leave out the directories and files with the given names, at any depth. A file
+        name also matches a directory with that name.
+
+        '''
+        return cls([f"{n}/" for n in dirnames] + list(filenames))
+
+    def __bool__(self) -> bool:
+        return len(self.patterns) > 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.patterns)
+
+    def __eq__(self, other:object) -> bool:
+        return isinstance(other, ExclusionRules) and (other.patterns == self.patterns)
+
+    def __hash__(self) -> int:
+        return hash(self.patterns)
+
+    def __repr__(self) -> str:
+        return f"ExclusionRules({list(self.patterns)!r})"
+
+    def is_excluded(self, relpath:str, is_dir:bool) -> bool:
+        '''
+        :param relpath:     Path relative to the root of the tree, with forward slashes.
+        :param is_dir:      The entry is a directory (a symlink to one is not).
+
+        '''
+        name = relpath.rsplit('/', 1)[-1]
+        if name in self.__names_any:
+            return True
+        if is_dir and (name in self.__names_dirs):
+            return True
+        if (self.__name_any is not None) and self.__name_any.search(name):
+            return True
+        if (self.__path_any is not None) and self.__path_any.search(relpath):
+            return True
+        if is_dir:
+            if (self.__name_dirs is not None) and self.__name_dirs.search(name):
+                return True
+            if (self.__path_dirs is not None) and self.__path_dirs.search(relpath):
+                return True
+        return False
+
+    def get_names(self) -> Tuple[List[str], List[str]]:
+        '''
+        Return the rules as (dirnames, filenames) for tools that only leave out entries by name. Raises
+        ValueError if there are rules that can't be put that way.
+
+        '''
+        if (self.__name_any, self.__name_dirs, self.__path_any, self.__path_dirs) != (None, None, None, None):
+            raise ValueError(f"{self!r} has patterns that don't match plain names")
+        return sorted(self.__names_dirs | self.__names_any), sorted(self.__names_any)
+
+    def get_rsync_args(self) -> List[str]:
+        '''
+        The rules as they go into an rsync argument list. The excluded entries get deleted from the
+        target as well.
+
+        '''
+        if not self:
+            return []
+        args = []
+        for p in self.patterns:
+            args += ["--exclude", p]
+        return args + ["--delete-excluded"]
+
+    def get_rsync_str(self) -> str:
+        '''
+        The rules as they go into an rsync command string.
+
+        '''
+        if not self:
+            return ''
+        return "--exclude " + " --exclude ".join(f"'{p}'" for p in self.patterns) + " --delete-excluded"
+
+@functools.lru_cache(maxsize=64)
+def _get_cached_rules(patterns:Tuple[str, ...]) -> ExclusionRules:
+    return ExclusionRules(patterns)
+
+def get_rules(exclusions:Union[None, Iterable[str], ExclusionRules]) -> ExclusionRules:
+    '''
+    Accept exclusions in any of the forms the console passes around: None, a list of patterns or
+    ExclusionRules. Lists get compiled once and then come from a cache.
+
+    '''
+    if isinstance(exclusions, ExclusionRules):
+        return exclusions
+    return _get_cached_rules(tuple(exclusions or ()))
@@ -0,0 +1,167 @@
+from __future__ import annotations
+from typing import *
+import sys, threading
+from PyQt5.QtCore import *
+import mini_console.mini_console as _mc_
+import mini_console.log_archive  as _la_
+nop = lambda *a, **k: None
+
+class StreamEditor(QObject):
+    '''
+    Drop-in replacement for the MiniEditor() that writes plain text to a stream (stdout, a log file,
+    ...) instead of rendering into a QTextDocument. Colors get dropped and html gets converted to
+    text. It can be used from any thread: writes are serialized with a lock.
+
+    '''
+    def __init__(self, stream:TextIO=sys.stdout, progbar_step:float=10.0) -> None:
+        '''
+        :param stream:          Where the output goes.
+        :param progbar_step:    Print the progressbar value each time it advanced this much [%].
+
+        '''
+        super().__init__()
+        self.__stream = stream
+        self.__lock   = threading.Lock()
+        self.__progbar_open:bool  = False
+        self.__progbar_title:str  = ''
+        self.__progbar_step:float = progbar_step
+        self.__progbar_last:float = 0.0
+        self.__progbar_waiters:List[Callable] = []
+        self.__output_listeners:List[Callable] = []
+        return
+
+    """
+    1. PRINT FUNCTION
+    """
+    @pyqtSlot(str)
+    def _printout_(self, outputStr:str):
+        self.printout(outputStr)
+        return
+
+    def printout(self, outputStr:str, color:str="#ffffff") -> None:
+        self.__notify_output_listeners__(outputStr, False)
+        self.__write__(outputStr)
+        return
+
+    @pyqtSlot(str)
+    def _printout_html_(self, outputStr):
+        self.printout_html(outputStr)
+        return
+
+    def printout_html(self, outputStr:str, color:str="#ffffff") -> None:
+        self.__notify_output_listeners__(outputStr, True)
+        self.__write__(_la_.html_to_text(outputStr))
+        return
+
+    def clear(self) -> None:
+        # A stream can't be cleared.
+        return
+
+    def add_output_listener(self, listener:Callable) -> None:
+        '''
+        Same as MiniEditor.add_output_listener().
+
+        '''
+        if listener not in self.__output_listeners:
+            self.__output_listeners = self.__output_listeners + [listener]
+        return
+
+    def remove_output_listener(self, listener:Callable) -> None:
+        self.__output_listeners = [l for l in self.__output_listeners if l != listener]
+        return
+
+    def __notify_output_listeners__(self, outputStr:str, is_html:bool) -> None:
+        for listener in self.__output_listeners:
+            listener(outputStr, is_html)
+        return
+
+    """
+    2. PROGRESS BAR
+    """
+    def start_progbar(self, title:str) -> None:
+        with self.__lock:
+            self.__progbar_open  = True
+            self.__progbar_title = title.strip()
+            self.__progbar_last  = 0.0
+        self.__write__(f"{self.__progbar_title}: 0%\n")
+        return
+
+    def set_progbar_val(self, fval:float) -> None:
+        fval = min(100.0, fval)
+        with self.__lock:
+            if (not self.__progbar_open) or (fval < self.__progbar_last + self.__progbar_step):
+                return
+            self.__progbar_last = fval
+        self.__write__(f"{self.__progbar_title}: {fval:.0f}%\n")
+        return
+
+    def close_progbar(self) -> None:
+        with self.__lock:
+            if not self.__progbar_open:
+                return
+            self.__progbar_open = False
+            done = self.__progbar_last >= 100.0
+            waiters, self.__progbar_waiters = self.__progbar_waiters, []
+        if not done:
+            self.__write__(f"{self.__progbar_title}: done\n")
+        for waiter in waiters:
+            waiter()
+        return
+
+    def is_progbar_open(self) -> bool:
+        return self.__progbar_open
+
+    def when_progbar_closed(self, waiter:Callable) -> None:
+        '''
+        Same as MiniEditor.when_progbar_closed(), except that the waiter runs in the thread that closes
+        the progressbar.
+
+        '''
+        with self.__lock:
+            if self.__progbar_open:
+                self.__progbar_waiters.append(waiter)
+                return
+        waiter()
+        return
+
+    """
+    3. INTERNAL FUNCTIONS
+    """
+    def __write__(self, text:str) -> None:
+        if text == '':
+            return
+        with self.__lock:
+            try:
+                self.__stream.write(text)
+                self.__stream.flush()
+            except (OSError, ValueError):
+                # Closed stream or broken pipe (eg. piped into 'head').
+                pass
+        return
+
+class HeadlessConsole(_mc_.ConsoleBase, QObject):
+    '''
+    The console without a window. It runs the same pipelines as the MiniConsole(), but needs no more
+    than a QCoreApplication(): the output goes to the given stream.
+
+    '''
+    startSignal = pyqtSignal()
+    closeSignal = pyqtSignal(bool)
+
+    set_extprogbar_val_sig = pyqtSignal(int)
+    set_extprogbar_max_sig = pyqtSignal(int)
+    set_extprogbar_inf_sig = pyqtSignal(bool)
+    set_extprogbar_txt_sig = pyqtSignal(str)
+
+    def __init__(self, stream:TextIO=sys.stdout) -> None:
+        QObject.__init__(self)
+        self.__editor = StreamEditor(stream)
+        self.__init_console__(self.__editor)
+        return
+
+    def get_editor(self) -> StreamEditor:
+        return self.__editor
+
+    def close(self) -> None:
+        self.__set_closed__()
+        return
@@ -0,0 +1,138 @@
+from __future__ import annotations
+from typing import *
+import os, json, statistics, threading
+import mini_console.profiler as _prof_
+
+class StepComparison:
+    '''
+    Timing of one step compared with the rolling median of earlier runs.
+
+    '''
+    def __init__(self, name:str, wall:float, median:Optional[float], nr_runs:int, regressed:bool) -> None:
+        self.name      = name
+        self.wall      = wall      # Wall time of this run [s]
+        self.median    = median    # Median wall time of the earlier runs [s], None if there are none.
+        self.nr_runs   = nr_runs   # Nr of earlier runs the median is based on.
+        self.regressed = regressed
+        return
+
+    def get_change(self) -> Optional[float]:
+        if (self.median is None) or (self.median <= 0):
+            return None
+        return (self.wall - self.median) / self.median
+
+class RunHistory:
+    '''
+    Keep the step timings, file counts and byte counts of every build/clean/zip run in a JSONL file,
+    one line per run:
+
+        {"run": "build_embeetle", "start": <timestamp>, "success": true, "total": 412.3,
+         "steps": [{"name": "freeze_embeetle", "wall": 301.2, "files": 2817, "bytes": 0}, ...]}
+
+    '''
+    def __init__(self, filepath:str, window:int=10, threshold:float=0.25, min_seconds:float=1.0) -> None:
+        '''
+        :param window:      Nr of earlier successful runs the rolling median is based on.
+        :param threshold:   A step that is this much slower than its median (0.25 = 25%) regressed.
+        :param min_seconds: ...as long as it's also at least this much slower. This keeps jitter on
+                            short steps from showing up as regressions.
+
+        '''
+        self.__filepath    = filepath.replace('\\', '/')
+        self.__window      = window
+        self.__threshold   = threshold
+        self.__min_seconds = min_seconds
+        self.__lock        = threading.Lock()
+        return
+
+    def get_filepath(self) -> str:
+        return self.__filepath
+
+    """
+    1. RECORDS
+    """
+    def append(self, profiler:_prof_.RunProfiler) -> Dict:
+        '''
+        Append the given (ended) run and return its record.
+
+        '''
+        spans = profiler.get_spans()
+        total = 0.0
+        if len(spans) > 0:
+            total = max(s.start + s.wall for s in spans) - min(s.start for s in spans)
+        record = {
+            "run"     : profiler.get_run_name(),
+            "start"   : profiler.get_start(),
+            "success" : profiler.get_success(),
+            "total"   : total,
+            "steps"   : [{"name": s.name, "wall": s.wall, "files": s.nr_files, "bytes": s.nr_bytes} for s in spans],
+        }
+        with self.__lock:
+            os.makedirs(os.path.dirname(self.__filepath), exist_ok=True)
+            with open(self.__filepath, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+        return record
+
+    def load(self, run_name:Optional[str]=None) -> List[Dict]:
+        '''
+        Return all records (of the given run), oldest first. Corrupt lines get skipped.
+
+        '''
+        records = []
+        with self.__lock:
+            try:
+                with open(self.__filepath, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        if (run_name is None) or (record.get("run") == run_name):
+                            records.append(record)
+            except FileNotFoundError:
+                pass
+        return records
+
+    """
+    2. COMPARISON
+    """
+    def compare(self, record:Dict) -> List[StepComparison]:
+        '''
+        Compare the steps of the given record with the rolling median of the earlier successful runs
+        with the same name. The record itself may already be in the history.
+
+        '''
+        earlier = [
+            r for r in self.load(record["run"])
+            if r.get("success") and (r.get("start") != record["start"])
+        ][-self.__window:]
+        comparisons = []
+        rows = [(s["name"], s["wall"]) for s in record["steps"]] + [("TOTAL", record["total"])]
+        for name, wall in rows:
+            if name == "TOTAL":
+                walls = [r["total"] for r in earlier]
+            else:
+                walls = [sum(s["wall"] for s in r["steps"] if s["name"] == name) for r in earlier if any(s["name"] == name for s in r["steps"])]
+            median = statistics.median(walls) if len(walls) > 0 else None
+            regressed = (median is not None) and \
+                        (wall > median * (1.0 + self.__threshold)) and \
+                        (wall - median >= self.__min_seconds)
+            comparisons.append(StepComparison(name, wall, median, len(walls), regressed))
+        return comparisons
+
+    def format_comparison(self, comparisons:List[StepComparison]) -> List[Tuple[str, bool]]:
+        '''
+        Return the comparison as table lines: (line, regressed).
+
+        '''
+        lines = [
+            (f"{'Step':<22} {'Now [s]':>10} {'Median [s]':>11} {'Change':>8} {'Runs':>5}", False),
+            (f"{'-'*22} {'-'*10} {'-'*11} {'-'*8} {'-'*5}", False),
+        ]
+        for c in comparisons:
+            change = c.get_change()
+            median = f"{c.median:>11.2f}" if c.median is not None else f"{'-':>11}"
+            change = f"{100.0 * change:>+7.1f}%" if change is not None else f"{'-':>8}"
+            flag   = "   <-- REGRESSION" if c.regressed else ''
+            lines.append((f"{c.name:<22} {c.wall:>10.2f} {median} {change} {c.nr_runs:>5}{flag}", c.regressed))
+        return lines
@@ -0,0 +1,300 @@
+from __future__ import annotations
+from typing import *
+import os, re, json, zlib, time, html, threading
+
+INDEX_FILENAME = "index.json"
+PREAMBLE_STEP  = "(preamble)"
+
+def html_to_text(htmlstr:str) -> str:
+    '''
+    Convert the html snippets fed to MiniEditor.printout_html() into plain text.
+
+    '''
+    text = htmlstr.replace('<br>', '\n')
+    text = re.sub(r"<[^>]*>", '', text)
+    text = html.unescape(text)
+    return text.replace('\xa0', ' ')
+
+class LogArchive:
+    '''
+    Compressed on-disk archive of the console output of past runs (build_embeetle, clean_embeetle,
+    zip_embeetle, ...).
+
+    Each run gets its own data file 'run_xxxxxx.blk' in the archive directory. The output of a run is
+    cut into blocks that are compressed independently with zlib, such that a single step can be read
+    back by seeking to its blocks - without decompressing the rest of the run. The file 'index.json'
+    keeps track of:
+
+        run -> step -> [(offset, compressed length, raw length), ...]
+
+    The oldest runs are dropped as soon as the total size of the data files exceeds 'max_bytes'.
+    All public methods are thread-safe.
+
+    '''
+    def __init__(self, dirpath:str, block_size:int=64*1024, max_bytes:int=64*1024*1024, level:int=6) -> None:
+        '''
+        :param dirpath:     Archive directory. Gets created if needed.
+        :param block_size:  Nr of bytes collected before a block gets compressed and written.
+        :param max_bytes:   Disk budget for all data files together.
+        :param level:       Zlib compression level.
+
+        '''
+        self.__dirpath    = dirpath.replace('\\', '/')
+        self.__block_size = block_size
+        self.__max_bytes  = max_bytes
+        self.__level      = level
+        self.__lock       = threading.RLock()
+        self.__run:Optional[Dict] = None   # Index entry of the ongoing run.
+        self.__file = None                 # Data file of the ongoing run.
+        self.__current:int = 0             # Index of the step that gets the output.
+        self.__thread_steps:Dict[int, int] = {}       # Thread ident -> index of its own step.
+        self.__buffers:Dict[int, List[bytes]] = {}    # Step index -> output not yet in a block.
+        self.__buffer_lens:Dict[int, int] = {}
+        os.makedirs(self.__dirpath, exist_ok=True)
+        self.__index = self.__load_index__()
+        return
+
+    """
+    1. WRITE
+    """
+    def begin_run(self, name:str) -> int:
+        '''
+        Start archiving a new run. An ongoing run gets closed first (as failed).
+        Returns the id of the new run.
+
+        '''
+        with self.__lock:
+            if self.__run is not None:
+                self.end_run(False)
+            run_id = self.__index["next_id"]
+            self.__index["next_id"] += 1
+            self.__run = {
+                "id"      : run_id,
+                "name"    : name,
+                "file"    : f"run_{run_id:06d}.blk",
+                "start"   : time.time(),
+                "end"     : None,
+                "success" : None,
+                "size"    : 0,
+                "steps"   : [{"name": PREAMBLE_STEP, "blocks": []}],
+            }
+            self.__index["runs"].append(self.__run)
+            self.__file = open(self.__get_filepath__(self.__run), 'wb')
+            self.__current = 0
+            self.__thread_steps.clear()
+            self.__save_index__()
+        return run_id
+
+    def begin_step(self, name:str, this_thread_only:bool=False) -> None:
+        '''
+        All output fed from now on belongs to the given step.
+
+        :param this_thread_only:    Only output fed from the calling thread belongs to the given step,
+                                    until end_thread_step(). This keeps the output of steps running in
+                                    parallel apart.
+
+        '''
+        with self.__lock:
+            if self.__run is None:
+                return
+            steps = self.__run["steps"]
+            if (len(steps) == 1) and (steps[0]["name"] == PREAMBLE_STEP) and (len(steps[0]["blocks"]) == 0) \
+                    and (self.__buffer_lens.get(0, 0) == 0) and not this_thread_only:
+                steps.pop()
+            steps.append({"name": name, "blocks": []})
+            if this_thread_only:
+                self.__end_thread_step__()
+                self.__thread_steps[threading.get_ident()] = len(steps) - 1
+            else:
+                self.__flush_all__()
+                self.__current = len(steps) - 1
+            self.__save_index__()
+        return
+
+    def end_thread_step(self) -> None:
+        '''
+        Output fed from the calling thread goes back to the ongoing (global) step.
+
+        '''
+        with self.__lock:
+            if self.__run is None:
+                return
+            self.__end_thread_step__()
+        return
+
+    def feed(self, text:str, is_html:bool=False) -> None:
+        '''
+        Feed console output into the ongoing run. Output fed while no run is ongoing gets dropped.
+        This function has the signature of a MiniEditor output listener.
+
+        '''
+        if self.__run is None:
+            return
+        if is_html:
+            text = html_to_text(text)
+        if text == '':
+            return
+        with self.__lock:
+            if self.__run is None:
+                return
+            i = self.__thread_steps.get(threading.get_ident(), self.__current)
+            b = text.encode('utf-8', errors='replace')
+            self.__buffers.setdefault(i, []).append(b)
+            self.__buffer_lens[i] = self.__buffer_lens.get(i, 0) + len(b)
+            if self.__buffer_lens[i] >= self.__block_size:
+                self.__flush_block__(i)
+        return
+
+    def end_run(self, success:bool) -> None:
+        '''
+        Close the ongoing run and apply the disk budget.
+
+        '''
+        with self.__lock:
+            if self.__run is None:
+                return
+            self.__flush_all__()
+            self.__file.close()
+            self.__file = None
+            self.__run["end"]     = time.time()
+            self.__run["success"] = success
+            self.__run = None
+            self.__apply_budget__()
+            self.__save_index__()
+        return
+
+    """
+    2. READ
+    """
+    def list_runs(self) -> List[Dict]:
+        '''
+        Return a summary of all archived runs, oldest first:
+            [{'id': .., 'name': .., 'start': .., 'end': .., 'success': .., 'size': ..}, ...]
+
+        '''
+        with self.__lock:
+            return [
+                {k: r[k] for k in ("id", "name", "start", "end", "success", "size")}
+                for r in self.__index["runs"]
+            ]
+
+    def list_steps(self, run_id:int) -> List[str]:
+        '''
+        Return the step names of the given run, in order.
+
+        '''
+        with self.__lock:
+            run = self.__get_run__(run_id)
+            return [s["name"] for s in run["steps"]]
+
+    def read_step(self, run_id:int, step:Union[int, str]) -> str:
+        '''
+        Return the output of one step. Only the blocks of that step get read and decompressed.
+
+        :param run_id:  Id of the run.
+        :param step:    Step index or step name (first step with that name).
+
+        '''
+        with self.__lock:
+            run = self.__get_run__(run_id)
+            if isinstance(step, int):
+                stepdict = run["steps"][step]
+            else:
+                try:
+                    stepdict = next(s for s in run["steps"] if s["name"] == step)
+                except StopIteration:
+                    raise KeyError(f"Run {run_id} has no step '{step}'")
+            if run is self.__run:
+                self.__flush_all__()
+                self.__file.flush()
+            blocks = list(stepdict["blocks"])
+            filepath = self.__get_filepath__(run)
+        chunks = []
+        with open(filepath, 'rb') as f:
+            for offset, clen, rawlen in blocks:
+                f.seek(offset)
+                chunks.append(zlib.decompress(f.read(clen)))
+        return b''.join(chunks).decode('utf-8', errors='replace')
+
+    def read_run(self, run_id:int) -> str:
+        '''
+        Return the complete output of the given run.
+
+        '''
+        with self.__lock:
+            n = len(self.__get_run__(run_id)["steps"])
+        return ''.join(self.read_step(run_id, i) for i in range(n))
+
+    """
+    3. INTERNAL FUNCTIONS
+    """
+    def __flush_block__(self, i:int) -> None:
+        '''
+        Compress the buffered output of step 'i' into one block.
+
+        '''
+        if self.__buffer_lens.get(i, 0) == 0:
+            return
+        raw = b''.join(self.__buffers.pop(i))
+        self.__buffer_lens.pop(i)
+        comp = zlib.compress(raw, self.__level)
+        offset = self.__run["size"]
+        self.__file.write(comp)
+        self.__run["size"] += len(comp)
+        self.__run["steps"][i]["blocks"].append([offset, len(comp), len(raw)])
+        return
+
+    def __flush_all__(self) -> None:
+        for i in sorted(self.__buffers.keys()):
+            self.__flush_block__(i)
+        return
+
+    def __end_thread_step__(self) -> None:
+        i = self.__thread_steps.pop(threading.get_ident(), None)
+        if i is not None:
+            self.__flush_block__(i)
+        return
+
+    def __apply_budget__(self) -> None:
+        runs  = self.__index["runs"]
+        total = sum(r["size"] for r in runs)
+        while (total > self.__max_bytes) and (len(runs) > 1) and (runs[0] is not self.__run):
+            run = runs.pop(0)
+            total -= run["size"]
+            try:
+                os.remove(self.__get_filepath__(run))
+            except OSError:
+                pass
+        return
+
+    def __get_run__(self, run_id:int) -> Dict:
+        for r in self.__index["runs"]:
+            if r["id"] == run_id:
+                return r
+        raise KeyError(f"No archived run with id {run_id}")
+
+    def __get_filepath__(self, run:Dict) -> str:
+        return f"{self.__dirpath}/{run['file']}"
+
+    def __load_index__(self) -> Dict:
+        indexpath = f"{self.__dirpath}/{INDEX_FILENAME}"
+        index = {"next_id": 1, "runs": []}
+        try:
+            with open(indexpath, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return index
+        # Runs that never ended belong to a crashed session. Keep what got written.
+        for r in index["runs"]:
+            if r["end"] is None:
+                r["success"] = False
+        index["runs"] = [r for r in index["runs"] if os.path.isfile(self.__get_filepath__(r))]
+        return index
+
+    def __save_index__(self) -> None:
+        indexpath = f"{self.__dirpath}/{INDEX_FILENAME}"
+        temppath  = indexpath + ".tmp"
+        with open(temppath, 'w', encoding='utf-8') as f:
+            json.dump(self.__index, f)
+        os.replace(temppath, indexpath)
+        return
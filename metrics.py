@@ -0,0 +1,243 @@
+from __future__ import annotations
+from typing import *
+import json, math, time, bisect, threading
+
+# Instrumented code checks this flag before measuring anything, such that the metrics cost no more than
+# a global lookup when disabled. Use enable() to flip it.
+enabled:bool = False
+
+class Counter:
+    '''
+    Monotonic counter. Updates are not locked: under heavy contention from several threads an
+    increment can get lost, which is acceptable for a diagnostics counter.
+
+    '''
+    def __init__(self, name:str) -> None:
+        self.name  = name
+        self.value = 0
+        return
+
+    def inc(self, n:int=1) -> None:
+        self.value += n
+        return
+
+    def reset(self) -> None:
+        self.value = 0
+        return
+
+    def snapshot(self) -> Dict:
+        return {"type": "counter", "value": self.value}
+
+class Gauge:
+    '''
+    Value that goes up and down (eg. a queue depth). Remembers its peak value.
+
+    '''
+    def __init__(self, name:str) -> None:
+        self.name  = name
+        self.value = 0
+        self.peak  = 0
+        return
+
+    def set(self, v:int) -> None:
+        self.value = v
+        if v > self.peak:
+            self.peak = v
+        return
+
+    def inc(self, n:int=1) -> None:
+        self.set(self.value + n)
+        return
+
+    def dec(self, n:int=1) -> None:
+        self.value -= n
+        return
+
+    def reset(self) -> None:
+        self.value = 0
+        self.peak  = 0
+        return
+
+    def snapshot(self) -> Dict:
+        return {"type": "gauge", "value": self.value, "peak": self.peak}
+
+# Log-scale bucket bounds (ratio sqrt(2)) from ~1 microsecond up to ~1 terabyte, such that the same
+# Histogram() class can hold durations in seconds as well as sizes in bytes.
+_BOUNDS:List[float] = [2.0 ** (i / 2.0) for i in range(-40, 81)]
+
+class Histogram:
+    '''
+    Distribution of observed values, kept in fixed log-scale buckets. Percentiles are estimated from
+    the bucket bounds (max error ~41%), which is plenty to tell where time goes.
+
+    '''
+    def __init__(self, name:str) -> None:
+        self.name = name
+        self.reset()
+        return
+
+    def observe(self, v:float) -> None:
+        self.count += 1
+        self.sum   += v
+        if v < self.min:
+            self.min = v
+        if v > self.max:
+            self.max = v
+        self.buckets[bisect.bisect_left(_BOUNDS, v)] += 1
+        return
+
+    def percentile(self, p:float) -> float:
+        '''
+        Estimate the p-th percentile (0 <= p <= 100).
+
+        '''
+        if self.count == 0:
+            return 0.0
+        rank = math.ceil(self.count * p / 100.0)
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= max(rank, 1):
+                bound = _BOUNDS[i] if i < len(_BOUNDS) else self.max
+                return min(max(bound, self.min), self.max)
+        return self.max
+
+    def reset(self) -> None:
+        self.count:int   = 0
+        self.sum:float   = 0.0
+        self.min:float   = math.inf
+        self.max:float   = -math.inf
+        self.buckets:List[int] = [0] * (len(_BOUNDS) + 1)
+        return
+
+    def snapshot(self) -> Dict:
+        if self.count == 0:
+            return {"type": "histogram", "count": 0}
+        return {
+            "type"  : "histogram",
+            "count" : self.count,
+            "sum"   : self.sum,
+            "mean"  : self.sum / self.count,
+            "min"   : self.min,
+            "p50"   : self.percentile(50),
+            "p99"   : self.percentile(99),
+            "max"   : self.max,
+        }
+
+class MetricsRegistry:
+    '''
+    Named collection of counters, gauges and histograms. Asking twice for the same name returns the
+    same object, so instrumented modules can bind their metrics once at import time.
+
+    '''
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__metrics:Dict[str, Union[Counter, Gauge, Histogram]] = {}
+        self.__dump_stop:Optional[threading.Event] = None
+        return
+
+    """
+    1. METRICS
+    """
+    def counter(self, name:str) -> Counter:
+        return self.__get_metric__(name, Counter)
+
+    def gauge(self, name:str) -> Gauge:
+        return self.__get_metric__(name, Gauge)
+
+    def histogram(self, name:str) -> Histogram:
+        return self.__get_metric__(name, Histogram)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self.__lock:
+            metrics = dict(self.__metrics)
+        return {name: m.snapshot() for name, m in sorted(metrics.items())}
+
+    def reset(self) -> None:
+        with self.__lock:
+            for m in self.__metrics.values():
+                m.reset()
+        return
+
+    def format_table(self) -> str:
+        '''
+        Return the current values as a human readable table.
+
+        '''
+        lines = []
+        for name, snap in self.snapshot().items():
+            if snap["type"] == "counter":
+                lines.append(f"{name:<34} {snap['value']:>14,}")
+            elif snap["type"] == "gauge":
+                lines.append(f"{name:<34} {snap['value']:>14,}   peak={snap['peak']:,}")
+            elif snap["count"] == 0:
+                lines.append(f"{name:<34} {'-':>14}")
+            else:
+                lines.append(
+                    f"{name:<34} {snap['count']:>14,}   "
+                    f"mean={snap['mean']:.4g} p50={snap['p50']:.4g} p99={snap['p99']:.4g} max={snap['max']:.4g}"
+                )
+        return '\n'.join(lines) + '\n'
+
+    """
+    2. PERIODIC DUMP
+    """
+    def start_periodic_dump(self, interval:float, printfunc:Optional[Callable]=None, filepath:Optional[str]=None) -> None:
+        '''
+        Dump the metrics every 'interval' seconds from a daemon thread.
+
+        :param interval:    Seconds between two dumps.
+        :param printfunc:   Gets the table from format_table() (eg. MiniConsole.printout).
+        :param filepath:    Gets one JSON line per dump appended.
+
+        '''
+        self.stop_periodic_dump()
+        stop = threading.Event()
+        self.__dump_stop = stop
+        def dump_loop():
+            while not stop.wait(interval):
+                self.dump(printfunc, filepath)
+            return
+        threading.Thread(target=dump_loop, name="MetricsDump", daemon=True).start()
+        return
+
+    def stop_periodic_dump(self) -> None:
+        if self.__dump_stop is not None:
+            self.__dump_stop.set()
+            self.__dump_stop = None
+        return
+
+    def dump(self, printfunc:Optional[Callable]=None, filepath:Optional[str]=None) -> None:
+        if printfunc is not None:
+            printfunc(self.format_table())
+        if filepath is not None:
+            with open(filepath, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"ts": time.time(), "metrics": self.snapshot()}) + '\n')
+        return
+
+    """
+    3. INTERNAL FUNCTIONS
+    """
+    def __get_metric__(self, name:str, cls:type):
+        m = self.__metrics.get(name)
+        if m is None:
+            with self.__lock:
+                m = self.__metrics.setdefault(name, cls(name))
+        assert isinstance(m, cls), f"Metric '{name}' already exists as {type(m).__name__}"
+        return m
+
+registry = MetricsRegistry()
+
+def enable(flag:bool=True) -> None:
+    '''
+    Switch the instrumentation on or off. Switching on resets all metrics.
+
+    '''
+    global enabled
+    if flag and not enabled:
+        registry.reset()
+    enabled = flag
+    return
+
+def is_enabled() -> bool:
+    return enabled
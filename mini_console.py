@@ -1,6 +1,6 @@
 from __future__ import annotations
 from typing import *
-import os, threading, functools, re
+import os, threading, functools, re, time, subprocess, concurrent.futures
 import data, functions, weakref, components, platform
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
@@ -13,37 +13,63 @@ import gui.stylesheets.scrollbar   as _sb_
 import bpathlib.file_power         as _fp_
 import bpathlib.path_power         as _pp_
 import mini_console.process        as _pr_
+import mini_console.log_archive    as _la_
+import mini_console.event_sink     as _es_
+import mini_console.metrics        as _mt_
+import mini_console.profiler       as _prof_
+import mini_console.build_dirs     as _bd_
+import mini_console.scheduler      as _sch_
+import mini_console.rsync_tools    as _rs_
+import mini_console.build_cache    as _bc_
+import mini_console.purge          as _pg_
+import mini_console.history        as _hi_
+import mini_console.trash          as _tr_
+import mini_console.sync_engine    as _se_
+import mini_console.credential_cache as _cc_
+import mini_console.throughput     as _tp_
+import mini_console.exclusions     as _ex_
 import gui.stylesheets.progressbar as _progbar_style_
 nop = lambda *a, **k: None
 
+_command_time       = _mt_.registry.histogram("console.command_s")
+_extprogbar_updates = _mt_.registry.counter("console.extprogbar_updates")
+_render_time        = _mt_.registry.histogram("editor.render_s")
+_pending_printouts  = _mt_.registry.gauge("editor.pending_printouts")
+_printout_emits     = _mt_.registry.counter("editor.printout_sig_emits")
+_progbar_updates    = _mt_.registry.counter("editor.progbar_updates")
 
-class MiniConsole(QWidget):
-    startSignal = pyqtSignal()
-    closeSignal = pyqtSignal(bool)
+# Build output that stays out of embeetle.zip.
+_ZIP_EXCLUSIONS = _ex_.ExclusionRules.from_names(
+    dirnames  = ["copied_embeetle", _bd_.STATE_DIRNAME, ],
+    filenames = ["compiled_files.txt", ],
+)
 
-    set_extprogbar_val_sig = pyqtSignal(int)
-    set_extprogbar_max_sig = pyqtSignal(int)
-    set_extprogbar_inf_sig = pyqtSignal(bool)
 
-    def __init__(self, title:str) -> None:
-        super().__init__()
+class ConsoleBase:
+    '''
+    Everything the console does, apart from being a widget: running commands, the build/clean/zip
+    pipelines, rsync, copying, ... All output goes into an editor, which is a MiniEditor() for the
+    MiniConsole() and a StreamEditor() for the HeadlessConsole() (see headless.py).
+
+    The class it gets mixed into must be a QObject that defines these signals:
+        startSignal            = pyqtSignal()
+        closeSignal            = pyqtSignal(bool)
+        set_extprogbar_val_sig = pyqtSignal(int)
+        set_extprogbar_max_sig = pyqtSignal(int)
+        set_extprogbar_inf_sig = pyqtSignal(bool)
+        set_extprogbar_txt_sig = pyqtSignal(str)
+
+    '''
+    def __init_console__(self, editor:Union[MiniEditor, QObject]) -> None:
         assert threading.current_thread() is threading.main_thread()
-        self.setGeometry(100, 100, 1500, 600)
-        self.setWindowTitle(title)
-        self.setStyleSheet("QWidget { background-color: #ffffffff }")
-        self.__lyt = QVBoxLayout()
-        self.__lyt.setAlignment(Qt.AlignTop)
-        self.setLayout(self.__lyt)
         # Mini console
-        self.__miniEditor = MiniEditor()
+        self.__miniEditor = editor
         self.__process = _pr_.Process()
-        self.__process.output_sig.connect(self.__miniEditor._printout_)
+        self.__process.output_sig.connect(self.__process_output__)
         self.__process.output_sig.connect(self.log_output)
         self.__process.output_html_sig.connect(self.__miniEditor._printout_html_)
-        # Layouts
-        self.__lyt.addWidget(self.__miniEditor)
-        self.show()
         self.__isclosed = False
+        self.__output_filter:Optional[_rs_.ProgressFilter] = None
         # External progbar
         self.__extprogbar:QProgressBar = None
         self.__extprogbar_active:bool  = False
@@ -52,6 +78,22 @@ class MiniConsole(QWidget):
         self.set_extprogbar_val_sig.connect(self.set_extprogbar_val)
         self.set_extprogbar_max_sig.connect(self.set_extprogbar_max)
         self.set_extprogbar_inf_sig.connect(self.set_extprogbar_fad)
+        self.set_extprogbar_txt_sig.connect(self.set_extprogbar_txt)
+        # Run tracking
+        self.__run_name:Optional[str] = None
+        self.__run_history_dirpath:Optional[str] = None
+        self.__run_profiler:Optional[_prof_.RunProfiler] = None
+        self.__profiling:bool          = False
+        self.__profiling_cprofile:bool = False
+        self.__profiling_dirpath:Optional[str] = None
+        self.__history_enabled:bool    = True
+        self.__history_window:int      = 10
+        self.__history_threshold:float = 0.25
+        self.__log_archive:Optional[_la_.LogArchive] = None
+        self.__event_sink:Optional[_es_.EventSink]   = None
+        # Remote syncs
+        self.__ssh_control_persist:int = 60
+        self.__ssh_remotes:Set[str]    = set()
         return
 
     """
@@ -80,14 +122,10 @@ class MiniConsole(QWidget):
         self.startSignal.emit()
         return
 
-    def close(self) -> None:
-        QWidget.close(self)
-        return
-
-    def closeEvent(self, event:QCloseEvent) -> None:
+    def __set_closed__(self) -> None:
         self.__isclosed = True
+        self.close_ssh_connections()
         self.closeSignal.emit(False)
-        super().closeEvent(event)
         return
 
     def is_closed(self) -> bool:
@@ -106,6 +144,9 @@ class MiniConsole(QWidget):
             self.set_extprogbar_val_sig.emit(val)
             return
         assert threading.current_thread() is threading.main_thread()
+        self.__emit_event__("progress", bar="external", value=val)
+        if _mt_.enabled:
+            _extprogbar_updates.inc()
         self.__extprogbar.setValue(val)
         return
 
@@ -117,6 +158,7 @@ class MiniConsole(QWidget):
             self.set_extprogbar_max_sig.emit(val)
             return
         assert threading.current_thread() is threading.main_thread()
+        self.__emit_event__("progress", bar="external", maximum=val)
         self.__extprogbar.setMaximum(val)
         return
 
@@ -134,6 +176,23 @@ class MiniConsole(QWidget):
             self.__extprogbar.setStyleSheet(_progbar_style_.get_unfaded_style(color="green"))
         return
 
+    @pyqtSlot(str)
+    def set_extprogbar_txt(self, text:str) -> None:
+        '''
+        Show the given text next to the percentage in the external progressbar (eg. the rate and the
+        ETA of a transfer). An empty string leaves the bare percentage.
+
+        '''
+        if threading.current_thread() is not threading.main_thread():
+            self.set_extprogbar_txt_sig.emit(text)
+            return
+        assert threading.current_thread() is threading.main_thread()
+        self.__emit_event__("progress", bar="external", text=text)
+        if self.__extprogbar is None:
+            return
+        self.__extprogbar.setFormat(f"%p%  {text}" if text != '' else "%p%")
+        return
+
     def activate_extprogbar_logging(self, active:bool, incr_chars:str= '\n') -> None:
         self.__extprogbar_active = active
         self.__progbar_incr_chars = incr_chars
@@ -158,22 +217,97 @@ class MiniConsole(QWidget):
         self.__miniEditor.clear()
 
     def start_progbar(self, title:str) -> None:
+        self.__emit_event__("progbar_start", title=title)
         self.__miniEditor.start_progbar(title)
         return
 
     def set_progbar_val(self, fval:float) -> None:
+        self.__emit_event__("progress", bar="inline", percent=fval)
         self.__miniEditor.set_progbar_val(fval)
         return
 
     def close_progbar(self) -> None:
+        self.__emit_event__("progbar_close")
         self.__miniEditor.close_progbar()
         return
 
+    def __when_progbar_closed__(self, func:Callable, *args) -> None:
+        '''
+        Call func(*args) in the calling QThread the moment the progressbar is really closed, or right
+        away if it isn't open. The next pipeline step uses this to wait for the previous one, instead of
+        polling is_progbar_open() on a timer.
+
+        '''
+        qthread:QThread = QThread.currentThread()
+        def closed():
+            if QThread.currentThread() is qthread:
+                func(*args)
+                return
+            _sw_.switch_thread(qthread=qthread, callback=lambda _: func(*args), callbackArg=None, notifycaller=nop)
+            return
+        self.__miniEditor.when_progbar_closed(closed)
+        return
+
 
 
     """
     3. PROCESS HANDLERS
     """
+    def __process_output__(self, s:str) -> None:
+        if self.__output_filter is not None:
+            s, progress = self.__output_filter.feed(s)
+            if progress is not None:
+                self.__show_rsync_progress__(progress)
+        if s != '':
+            self.__miniEditor._printout_(s)
+        return
+
+    def __set_output_filter__(self, outputfilter:Optional[_rs_.ProgressFilter]) -> None:
+        '''
+        Filter the output of the commands that follow, eg. to pull out the progress records of a
+        single-pass rsync run. Removing the filter prints what it held back.
+
+        '''
+        if (outputfilter is None) and (self.__output_filter is not None):
+            rest = self.__output_filter.flush()
+            if rest != '':
+                self.__miniEditor.printout(rest)
+        self.__output_filter = outputfilter
+        return
+
+    def __show_rsync_progress__(self, progress:_rs_.RsyncProgress) -> None:
+        # Rsync's percentage is weighted by bytes, unlike the nr of files checked: one big archive
+        # doesn't count as one tick, nor do thousands of small deletions race the bar to the end.
+        self.set_extprogbar_fad(False)
+        self.set_extprogbar_max(100)
+        self.set_extprogbar_val(progress.percent)
+        self.set_extprogbar_txt(f"{progress.rate}, {progress.eta}")
+        return
+
+    def __get_file_progress_filter__(self, total_bytes:int) -> _rs_.ProgressFilter:
+        '''
+        Output filter for an rsync run with '--progress', for rsync versions without a progress record
+        of their own for the whole transfer. It sums the per-file records into the bytes transferred so
+        far and shows them against 'total_bytes' (from the dry-run) in the external progressbar, with
+        the rate and the ETA.
+
+        '''
+        meter = _tp_.TransferMeter(total_bytes)
+        summed = _rs_.FileProgressSum()
+        lastperc, lasttime = -1, 0.0
+        self.set_extprogbar_fad(False)
+        self.set_extprogbar_max(100)
+        def on_record(progress:_rs_.RsyncProgress) -> None:
+            nonlocal lastperc, lasttime
+            perc = int(100 * meter.update(summed.add(progress)))
+            # Small files produce records much faster than the progressbar needs them.
+            if (perc > lastperc) or (time.time() - lasttime > 0.5):
+                lastperc, lasttime = perc, time.time()
+                self.set_extprogbar_val(perc)
+                self.set_extprogbar_txt(meter.get_status())
+            return
+        return _rs_.ProgressFilter(on_record)
+
     def __process_exit_handler__(self, success:bool, code:int) -> None:
         if success:
             assert isinstance(code, int)
@@ -199,6 +333,7 @@ class MiniConsole(QWidget):
         :param callbackArg:     callbackArg=(success, callbackArg)
 
         '''
+        starttime:float = 0.0
         def start(*args):
             if not threading.current_thread() is threading.main_thread():
                 _sw_.switch_thread(qthread=_sw_.get_qthread("main"), callback=start, callbackArg=None, notifycaller=nop)
@@ -208,6 +343,9 @@ class MiniConsole(QWidget):
             assert self.__process.is_process_busy() is False
             self.clear_log()
             cwd = os.getcwd().replace('\\', '/')
+            nonlocal starttime
+            starttime = time.time()
+            self.__emit_event__("command_start", cmd=cmd, cwd=cwd)
             self.__miniEditor.printout(f'\n')
             self.__miniEditor.printout(f"{cwd}", "#fce94f")
             self.__miniEditor.printout(f"> ",    "#fce94f")
@@ -228,6 +366,13 @@ class MiniConsole(QWidget):
             return
         def finish(success, code):
             process_feedback = (success, code)
+            if _mt_.enabled:
+                _command_time.observe(time.time() - starttime)
+            self.__emit_event__("command_finish",
+                                cmd      = cmd,
+                                success  = success,
+                                code     = code.name if isinstance(code, _pr_.ProcessErr) else code,
+                                duration = time.time() - starttime)
             _sw_.switch_thread(qthread=callbackThread, callback=callback, callbackArg=(success, code, callbackArg), notifycaller=nop)
             return
         start()
@@ -235,6 +380,8 @@ class MiniConsole(QWidget):
 
     def log_output(self, s:str) -> None:
         self.__log__ += s
+        if self.__event_sink is not None:
+            self.__event_sink.emit_output(s)
         if self.__extprogbar_active:
             if self.__progbar_incr_chars in s:
                 self.__extprogbar_val += s.count(self.__progbar_incr_chars)
@@ -269,22 +416,281 @@ class MiniConsole(QWidget):
         return True
 
     """
-    4. BUILD EMBEETLE
+    4. RUN TRACKING
+    """
+    def attach_log_archive(self, archive:Optional[_la_.LogArchive]) -> None:
+        '''
+        Archive the output of every build, clean and zip run into the given LogArchive(). Pass None to
+        detach the current archive.
+
+        '''
+        if self.__log_archive is not None:
+            self.__miniEditor.remove_output_listener(self.__log_archive.feed)
+            self.__log_archive.end_run(False)
+        self.__log_archive = archive
+        if archive is not None:
+            self.__miniEditor.add_output_listener(archive.feed)
+        return
+
+    def get_log_archive(self) -> Optional[_la_.LogArchive]:
+        return self.__log_archive
+
+    def attach_event_sink(self, sink:Optional[_es_.EventSink]) -> None:
+        '''
+        Export commands, exit codes, progress updates and output chunk metadata to the given
+        EventSink(). Pass None to detach the current sink (it doesn't get closed).
+
+        '''
+        self.__event_sink = sink
+        return
+
+    def get_event_sink(self) -> Optional[_es_.EventSink]:
+        return self.__event_sink
+
+    def enable_profiling(self, enabled:bool, cprofile:bool=False, dirpath:Optional[str]=None) -> None:
+        '''
+        Profile the steps of build, clean and zip runs. At the end of each run, a table with the wall
+        time and CPU time per step is printed to the console and the timings are persisted.
+
+        :param enabled:     Switch profiling on or off.
+        :param cprofile:    Also capture a cProfile per step (for the in-process steps).
+        :param dirpath:     Where to persist the timings. Defaults to the history directory next to
+                            the build target.
+
+        '''
+        self.__profiling          = enabled
+        self.__profiling_cprofile = cprofile
+        self.__profiling_dirpath  = dirpath
+        return
+
+    def enable_history(self, enabled:bool, window:int=10, threshold:float=0.25) -> None:
+        '''
+        Record the step timings, file counts and byte counts of every run in the history folder next to
+        the build target (on by default). At the end of a run, each step gets compared with the rolling
+        median of the earlier successful runs.
+
+        :param window:      Nr of earlier runs in the rolling median.
+        :param threshold:   Relative slowdown that counts as a regression (0.25 = 25%).
+
+        '''
+        self.__history_enabled   = enabled
+        self.__history_window    = window
+        self.__history_threshold = threshold
+        return
+
+    def set_ssh_control_persist(self, seconds:int) -> None:
+        '''
+        Remote syncs share one SSH connection per user@host (see rsync_tools.get_ssh_control_options()).
+        It stays open for the given nr of seconds after the last sync, such that the next one doesn't
+        have to set it up again. Zero switches connection sharing off.
+
+        '''
+        self.__ssh_control_persist = seconds
+        return
+
+    def close_ssh_connections(self) -> None:
+        '''
+        Stop the shared SSH connections this console opened, instead of waiting for them to time out.
+        Doesn't wait: the 'ssh -O exit' commands run in a background thread, each with a short timeout.
+        A master that doesn't answer simply expires after its ControlPersist time.
+
+        '''
+        remotes, self.__ssh_remotes = self.__ssh_remotes, set()
+        if len(remotes) == 0:
+            return
+        def stop_all() -> None:
+            for remote in sorted(remotes):
+                try:
+                    subprocess.run(_rs_.get_ssh_exit_args(remote), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL, timeout=3)
+                except (OSError, subprocess.SubprocessError):
+                    pass
+            return
+        threading.Thread(target=stop_all, name="close_ssh_connections", daemon=True).start()
+        return
+
+    def __get_ssh_cmd_str__(self, remote:str, keypath:str, known_hosts_filepath:str) -> str:
+        control_options = _rs_.get_ssh_control_options(self.__ssh_control_persist)
+        if len(control_options) > 0:
+            # Only then there's a master connection to stop in close_ssh_connections().
+            self.__ssh_remotes.add(remote)
+        return _rs_.get_ssh_cmd_str(keypath, known_hosts_filepath, control_options)
+
+    def __move_to_trash__(self, path:str, recreate:bool=False) -> Optional[str]:
+        '''
+        Move the given path into its trash directory (see trash.py) and return where it went. Return
+        None if that's not possible: the caller must then delete the path in place.
+
+        '''
+        try:
+            trashed = _tr_.move_to_trash(path, recreate)
+        except OSError as e:
+            self.__miniEditor.printout(f"Cannot move {path} to the trash ({e.strerror or e}), deleting it in place.\n", "#fcaf3e")
+            return None
+        self.__miniEditor.printout(f"Moved to trash: {path}\n", "#73d216")
+        return trashed
+
+    def __emit_event__(self, event:str, **fields) -> None:
+        if self.__event_sink is not None:
+            self.__event_sink.emit(event, **fields)
+        return
+
+    def __run_begin__(self, name:str, buildtarget_dirpath:str) -> None:
+        '''
+        Mark the start of a run (eg. 'build_embeetle').
+
+        '''
+        self.__run_name = name
+        self.__run_history_dirpath = _bd_.get_history_dirpath(buildtarget_dirpath)
+        self.__run_profiler = _prof_.RunProfiler(name, cprofile=self.__profiling and self.__profiling_cprofile)
+        if self.__log_archive is not None:
+            self.__log_archive.begin_run(name)
+        self.__emit_event__("run_start", run=name)
+        return
+
+    def __step_begin__(self, name:str, parallel:bool=False) -> None:
+        '''
+        Mark the start of a step within the ongoing run. The previous step (if any) ends here.
+
+        :param parallel:    The step runs in its own thread, next to other steps. Only the output
+                            printed from that thread belongs to the step. Close it with __step_end__().
+
+        '''
+        if self.__run_name is None:
+            return
+        self.__run_profiler.begin_step(name, parallel=parallel)
+        if self.__log_archive is not None:
+            self.__log_archive.begin_step(name, this_thread_only=parallel)
+        self.__emit_event__("step_start", run=self.__run_name, step=name)
+        return
+
+    def __step_end__(self, name:str) -> None:
+        '''
+        Mark the end of a parallel step. Must be called from the thread that started the step.
+
+        '''
+        if self.__run_name is None:
+            return
+        self.__run_profiler.end_step(name)
+        if self.__log_archive is not None:
+            self.__log_archive.end_thread_step()
+        self.__emit_event__("step_finish", run=self.__run_name, step=name)
+        return
+
+    def __step_stats__(self, nr_files:int=0, nr_bytes:int=0, name:Optional[str]=None) -> None:
+        '''
+        Add to the nr of files and bytes processed by the given step (default: the ongoing sequential
+        step). They end up in the run history.
+
+        '''
+        if self.__run_name is None:
+            return
+        self.__run_profiler.add_stats(nr_files=nr_files, nr_bytes=nr_bytes, name=name)
+        return
+
+    def __rsync_step_stats__(self, log:str, nr_files:Optional[int]=None, name:Optional[str]=None) -> None:
+        '''
+        Same as __step_stats__(), with the nr of files and bytes taken from the '--stats' output of an
+        rsync run (or of its dry-run). A count that isn't in the output stays 0.
+
+        '''
+        if nr_files is None:
+            try:
+                nr_files = _rs_.parse_nr_transfers(log)
+            except ValueError:
+                nr_files = 0
+        try:
+            nr_bytes = _rs_.parse_transferred_size(log)
+        except ValueError:
+            nr_bytes = 0
+        self.__step_stats__(nr_files=nr_files, nr_bytes=nr_bytes, name=name)
+        return
+
+    def __run_end__(self, success:bool) -> None:
+        '''
+        Mark the end of the ongoing run.
+
+        '''
+        if self.__run_name is None:
+            return
+        self.__run_profiler.end(success)
+        if self.__profiling:
+            self.__print_profile__(self.__run_profiler)
+        if self.__history_enabled:
+            self.__print_history__(self.__run_profiler)
+        self.__emit_event__("run_finish", run=self.__run_name, success=success)
+        self.__run_name = None
+        if self.__log_archive is not None:
+            self.__log_archive.end_run(success)
+        return
+
+    def __print_profile__(self, profiler:_prof_.RunProfiler) -> None:
+        '''
+        Print the step timings of the given run and persist them.
+
+        '''
+        self.__miniEditor.printout('\n')
+        self.__miniEditor.printout(f"Step timings '{profiler.get_run_name()}'\n", "#fcaf3e")
+        self.__miniEditor.printout(f"=============={'=' * len(profiler.get_run_name())}=\n", "#fcaf3e")
+        self.__miniEditor.printout(profiler.format_table())
+        dirpath = self.__profiling_dirpath if self.__profiling_dirpath is not None else self.__run_history_dirpath
+        try:
+            filepath = profiler.save(dirpath)
+            self.__miniEditor.printout(f"Timings saved to {filepath}\n", "#73d216")
+        except OSError as e:
+            self.__miniEditor.printout(f"Cannot save timings to {dirpath}:\n", "#ef2929")
+            self.__miniEditor.printout(f"{e}\n", "#ef2929")
+        self.__miniEditor.printout('\n')
+        return
+
+    def __print_history__(self, profiler:_prof_.RunProfiler) -> None:
+        '''
+        Add the given run to the history and print how it compares with the earlier runs.
+
+        '''
+        history = _hi_.RunHistory(filepath    = _bd_.get_history_filepath(self.__run_history_dirpath),
+                                  window      = self.__history_window,
+                                  threshold   = self.__history_threshold)
+        try:
+            record = history.append(profiler)
+            lines  = history.format_comparison(history.compare(record))
+        except OSError as e:
+            self.__miniEditor.printout(f"Cannot update the run history {history.get_filepath()}:\n", "#ef2929")
+            self.__miniEditor.printout(f"{e}\n", "#ef2929")
+            return
+        self.__miniEditor.printout('\n')
+        self.__miniEditor.printout(f"Compared with earlier runs\n", "#fcaf3e")
+        self.__miniEditor.printout(f"==========================\n", "#fcaf3e")
+        for line, regressed in lines:
+            self.__miniEditor.printout(f"{line}\n", "#ef2929" if regressed else "#ffffff")
+        self.__miniEditor.printout('\n')
+        return
+
+    """
+    5. BUILD EMBEETLE
     """
     def clean_embeetle(self, beetle_core_dirpath:str,
                              buildtarget_dirpath:str,
                              callback:Callable,
                              callbackArg:object,
-                             callbackThread:QThread):
+                             callbackThread:QThread,
+                             fast:bool=False):
         '''
         Clean build output.
 
+        :param fast:    Don't wait for the deletions: rename the build output into a trash directory next
+                        to it and let a low-priority background thread delete it (see trash.py). If a
+                        rename fails (eg. a locked file on Windows), that part gets deleted in place.
+
         '''
         assert threading.current_thread() is not threading.main_thread()
         origthread:QThread = QThread.currentThread()
         original_path:str  = None
+        beetle_updater_builddir = os.path.join(os.path.dirname(beetle_core_dirpath), f"beetle_updater_{platform.system().lower()}").replace('\\', '/')
+        trashed:List[str] = []
         def start():
             assert QThread.currentThread() is origthread
+            self.__run_begin__("clean_embeetle", buildtarget_dirpath)
             if not os.path.isdir(beetle_core_dirpath):
                 self.__miniEditor.printout(f"Cannot find source code directory:\n", "#ef2929")
                 self.__miniEditor.printout(f"{beetle_core_dirpath}\n",              "#ffffff")
@@ -295,20 +701,35 @@ class MiniConsole(QWidget):
                 self.__miniEditor.printout(f"{buildtarget_dirpath}\n",               "#ffffff")
                 finish(False)
                 return
+            # Trash left behind by an earlier fast clean that didn't get the time to empty it.
+            for trash_dirpath in _tr_.reclaim([buildtarget_dirpath, beetle_updater_builddir]):
+                self.__miniEditor.printout(f"Emptying leftover trash in the background: {trash_dirpath}\n", "#ffffff")
             clean()
             return
 
+        def move_to_trash(path:str, recreate:bool=False) -> bool:
+            # Return True if the path got moved into the trash, False if it must be deleted in place.
+            if not fast:
+                return False
+            trashed_path = self.__move_to_trash__(path, recreate)
+            if trashed_path is None:
+                return False
+            trashed.append(trashed_path)
+            return True
+
         def clean(*args):
             assert QThread.currentThread() is origthread
             assert os.path.isdir(buildtarget_dirpath)
             assert os.path.isdir(beetle_core_dirpath)
             # * 1. Clean target directory
+            self.__step_begin__("clean_target")
             self.__miniEditor.printout("Clean target directory\n", "#fcaf3e")
             self.__miniEditor.printout("======================\n", "#fcaf3e")
             self.set_extprogbar_fad(True)
             self.set_extprogbar_max(0)
             self.activate_extprogbar_logging(False)
-            success = _fp_.clean_dir(dir_abspath=buildtarget_dirpath, printfunc=self.__miniEditor.printout, catch_err=True)
+            success = move_to_trash(buildtarget_dirpath, recreate=True) or \
+                      _fp_.clean_dir(dir_abspath=buildtarget_dirpath, printfunc=self.__miniEditor.printout, catch_err=True)
             self.__miniEditor.printout('\n')
             if not success:
                 finish(False)
@@ -317,20 +738,23 @@ class MiniConsole(QWidget):
             # * 2. Clean zipped folder
             zipfolder = os.path.join(os.path.dirname(buildtarget_dirpath), "embeetle.zip").replace('\\', '/')
             if os.path.isfile(zipfolder):
+                self.__step_begin__("clean_zip")
                 self.__miniEditor.printout("Clean zip folder\n", "#fcaf3e")
                 self.__miniEditor.printout("================\n", "#fcaf3e")
-                success = _fp_.delete_file(file_abspath=zipfolder, printfunc=self.__miniEditor.printout, catch_err=True)
+                success = move_to_trash(zipfolder) or \
+                          _fp_.delete_file(file_abspath=zipfolder, printfunc=self.__miniEditor.printout, catch_err=True)
                 self.__miniEditor.printout('\n')
                 if not success:
                     finish(False)
                     return
 
             # * 3. Clean 'beetle_updater_windows' or 'beetle_updater_linux'
-            beetle_updater_builddir = os.path.join(os.path.dirname(beetle_core_dirpath), f"beetle_updater_{platform.system().lower()}").replace('\\', '/')
             if os.path.exists(beetle_updater_builddir):
+                self.__step_begin__("clean_updater")
                 self.__miniEditor.printout(f"Clean beetle_updater_xxx folder\n", "#fcaf3e")
                 self.__miniEditor.printout(f"===============================\n", "#fcaf3e")
-                success = _fp_.delete_dir(dir_abspath=beetle_updater_builddir, printfunc=self.__miniEditor.printout, catch_err=True)
+                success = move_to_trash(beetle_updater_builddir) or \
+                          _fp_.delete_dir(dir_abspath=beetle_updater_builddir, printfunc=self.__miniEditor.printout, catch_err=True)
                 self.__miniEditor.printout('\n')
                 if not success:
                     finish(False)
@@ -341,10 +765,17 @@ class MiniConsole(QWidget):
 
         def finish(success):
             assert QThread.currentThread() is origthread
-            if self.__miniEditor.is_progbar_open():
-                print("finish() -> delay")
-                QTimer.singleShot(50, functools.partial(finish, success))
-                return
+            self.__when_progbar_closed__(finish_closed, success)
+            return
+
+        def finish_closed(success):
+            assert QThread.currentThread() is origthread
+            # Also on failure: whatever made it into the trash must go.
+            for trash_dirpath in sorted(set(os.path.dirname(t) for t in trashed)):
+                _tr_.get_collector().submit(trash_dirpath)
+            if len(trashed) > 0:
+                self.__miniEditor.printout("The trash gets emptied in the background.\n", "#ffffff")
+            self.__run_end__(success)
             self.set_extprogbar_fad(False)
             self.set_extprogbar_max(100)
             self.set_extprogbar_val(100)
@@ -360,16 +791,80 @@ class MiniConsole(QWidget):
                              buildtarget_dirpath:str,
                              callback:Callable,
                              callbackArg:object,
-                             callbackThread:QThread):
+                             callbackThread:QThread,
+                             max_workers:int=1,
+                             use_cache:bool=True,
+                             hash_sources:bool=False,
+                             verbose_purge:bool=False,
+                             resume:bool=False,
+                             native_sync:bool=False,
+                             sync_snapshot:bool=False,
+                             sync_shards:int=1):
         '''
-        Build embeetle locally.
+        Build embeetle locally. The build is a graph of steps, run by a StepScheduler():
+
+            delete_zip -> goto_updater_src -> freeze_updater -> goto_to_exe -> freeze_embeetle -+-> delete_cfiles -> copy_resources
+                                                                                                |-> copy_tools
+                                                                                                |-> copy_updater
+                                                                                                '-> copy_licenses
+
+        :param max_workers:     Max nr of steps running at the same time. With max_workers=1 the steps
+                                run one after the other, in the order of their numbers. With more
+                                workers, the steps after the freeze run in parallel background threads.
+                                Instead of the console progressbar, they then show their aggregated
+                                progress on the external progressbar.
+        :param use_cache:       Skip the freeze steps if their sources didn't change since the last
+                                build and their output is still in the build target.
+        :param hash_sources:    Compare the sources on their content instead of their size and mtime.
+        :param verbose_purge:   Write the list of deleted C-files to '<build target>/.mini_console/
+                                delete_cfiles.log'. The console only shows a summary.
+        :param resume:          Skip the steps that completed in an earlier build, as long as their
+                                inputs didn't change and neither did the steps they depend on. Every
+                                successful step is checkpointed in '<build target>/.mini_console/
+                                checkpoints.json', whether resuming or not.
+        :param native_sync:     Update existing copies with the built-in sync engine instead of rsync
+                                (see rsync_local()).
+        :param sync_snapshot:   With native_sync: keep snapshots of the copies, such that the next build
+                                only reads the directories that changed since. A file rewritten in place
+                                doesn't change its directory, so this misses such edits.
+        :param sync_shards:     Update existing copies with this many rsync processes at the same time,
+                                one per top-level directory (see rsync_local()).
 
         '''
         assert threading.current_thread() is not threading.main_thread()
         origthread:QThread = QThread.currentThread()
         original_path:str  = None
+        parallel:bool      = max_workers > 1
+        python:str         = "python" if platform.system().lower() == "windows" else "python3"
+        cache:Optional[_bc_.BuildCache] = None
+        # Cached steps: name -> (source dirpath, output dirpath, subdirectories of the output that other
+        # steps fill in, as paths relative to the output dirpath).
+        updater_name = f"beetle_updater_{platform.system().lower()}"
+        cached_steps:Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
+            "freeze_updater"  : (os.path.join(os.path.dirname(beetle_core_dirpath), "beetle_updater_src").replace('\\', '/'),
+                                 os.path.join(os.path.dirname(beetle_core_dirpath), updater_name).replace('\\', '/'),
+                                 ()),
+            "freeze_embeetle" : (beetle_core_dirpath.replace('\\', '/'),
+                                 os.path.join(buildtarget_dirpath, "beetle_core").replace('\\', '/'),
+                                 ("resources", )),
+        }
+        cached_inputs:Dict[str, Optional[str]] = {}
+        cached_manifests:Dict[str, Optional[_bc_.Manifest]] = {}
+        freeze_nr:Optional[concurrent.futures.Future] = None
+        # Checkpointed steps: name -> (source dirpaths, other inputs). The steps that only delete the zip
+        # or change the cwd are cheap, they always run.
+        checkpoints:Optional[_bc_.Checkpoints] = None
+        checkpointed:Dict[str, Tuple[Tuple[str, ...], str]] = {
+            "freeze_updater"  : ((cached_steps["freeze_updater"][0], ),  cached_steps["freeze_updater"][1]),
+            "freeze_embeetle" : ((cached_steps["freeze_embeetle"][0], ), cached_steps["freeze_embeetle"][1]),
+            "delete_cfiles"   : ((), ''),
+        }
+        fingerprints:Dict[str, str] = {}
+        fingerprints_lock = threading.Lock()
         def start():
             assert QThread.currentThread() is origthread
+            nonlocal cache, freeze_nr, checkpoints
+            self.__run_begin__("build_embeetle", buildtarget_dirpath)
             if not os.path.isdir(beetle_core_dirpath):
                 self.__miniEditor.printout(f"Cannot find source code directory:\n", "#ef2929")
                 self.__miniEditor.printout(f"{beetle_core_dirpath}\n",              "#ffffff")
@@ -382,298 +877,438 @@ class MiniConsole(QWidget):
                     self.__miniEditor.printout(f"{buildtarget_dirpath}\n",                 "#ffffff")
                     finish(False)
                     return
-            partial_clean()
-            return
+            # Trash left behind by an earlier fast clean.
+            _tr_.reclaim([buildtarget_dirpath])
+            if use_cache:
+                cache = _bc_.BuildCache(_bd_.get_cache_filepath(buildtarget_dirpath))
+            checkpoints = _bc_.Checkpoints(_bd_.get_checkpoint_filepath(buildtarget_dirpath))
+            steps = get_steps()
+            done_steps = []
+            if resume:
+                done_steps = plan_resume(steps)
+            else:
+                checkpoints.clear()
+                threading.Thread(target=prefetch_fingerprints, name="fingerprints", daemon=True).start()
+            if "freeze_embeetle" in done_steps:
+                enter_copy_phase()
+            elif (cache is None) or (cache.get_inputs("freeze_embeetle") is None):
+                # The freeze runs for sure: query its file count while the first steps run. Otherwise
+                # the freeze step only queries it if its output can't be reused.
+                freeze_nr = query_freeze_nr()
+            scheduler = _sch_.StepScheduler(steps          = steps,
+                                            max_workers    = max_workers,
+                                            post           = post,
+                                            on_finish      = finish,
+                                            on_step_finish = step_finished,
+                                            on_progress    = show_progress if parallel else nop,
+                                            done_steps     = done_steps)
+            scheduler.start()
+            return
+
+        def get_fingerprint(dirpath:str) -> str:
+            # Size/mtime fingerprint of a source tree, computed at most once per build. Can run in any
+            # thread. Raises OSError if the tree can't be read.
+            with fingerprints_lock:
+                if dirpath in fingerprints:
+                    return fingerprints[dirpath]
+            fingerprint = _bc_.get_digest(_bc_.scan_tree(dirpath, skip_dirnames=("__pycache__", )))
+            with fingerprints_lock:
+                return fingerprints.setdefault(dirpath, fingerprint)
+
+        def prefetch_fingerprints() -> None:
+            # Fingerprint the sources before the steps get to them, such that a checkpoint never covers
+            # changes made while its step was running.
+            for sources, _ in list(checkpointed.values()):
+                for dirpath in sources:
+                    try:
+                        get_fingerprint(dirpath)
+                    except OSError:
+                        pass
+            return
+
+        def get_step_inputs(name:str) -> Optional[str]:
+            sources, other = checkpointed[name]
+            try:
+                return _bc_.get_combined_digest([name, other] + [f"{d}:{get_fingerprint(d)}" for d in sources])
+            except OSError:
+                return None
 
-        def partial_clean(*args):
+        def plan_resume(steps:List[_sch_.Step]) -> List[str]:
+            # A step can be skipped if it completed before with the same inputs, and so did all steps it
+            # depends on. The steps list is in dependency order.
             assert QThread.currentThread() is origthread
-            assert os.path.isdir(buildtarget_dirpath)
-            assert os.path.isdir(beetle_core_dirpath)
+            resumable:Dict[str, bool] = {}
+            done_steps = []
+            for step in steps:
+                if step.name not in checkpointed:
+                    resumable[step.name] = True
+                    continue
+                inputs = get_step_inputs(step.name)
+                resumable[step.name] = all(resumable[d] for d in step.deps) and \
+                                       (inputs is not None) and checkpoints.is_done(step.name, inputs)
+                if resumable[step.name]:
+                    done_steps.append(step.name)
+            checkpoints.clear([name for name in checkpointed if name not in done_steps])
             self.__miniEditor.printout('\n')
+            if len(done_steps) == 0:
+                self.__miniEditor.printout("Resume: no completed steps found, build everything.\n", "#fcaf3e")
+            else:
+                self.__miniEditor.printout(f"Resume: skip completed steps {', '.join(done_steps)}\n", "#73d216")
+            return done_steps
+
+        def get_steps() -> List[_sch_.Step]:
+            # The first five steps share the console's Process() and its cwd, so they are exclusive. They
+            # don't count in the aggregated progress: the freeze has its own progressbar.
+            steps = [
+                _sch_.Step("delete_zip",       delete_zip,       (),                      exclusive=True, weight=0),
+                _sch_.Step("goto_updater_src", goto_updater_src, ("delete_zip",),         exclusive=True, weight=0),
+                _sch_.Step("freeze_updater",   freeze_updater,   ("goto_updater_src",),   exclusive=True, weight=0),
+                _sch_.Step("goto_to_exe",      goto_to_exe,      ("freeze_updater",),     exclusive=True, weight=0),
+                _sch_.Step("freeze_embeetle",  freeze_embeetle,  ("goto_to_exe",),        exclusive=True, weight=0),
+            ]
+            beetle_dirpath = os.path.dirname(beetle_core_dirpath).replace('\\', '/')
+            tools_excl     = ["Linux", ] if platform.system().lower() == "windows" else ["Windows", ]
+            copies = (
+                ("copy_tools",     ("freeze_embeetle",),
+                 "|                  STEP 7: COPY 'beetle_tools'              |\n",
+                 f"{beetle_dirpath}/beetle_tools", "beetle_tools", tools_excl),
+                ("copy_resources", ("delete_cfiles",),
+                 "|              STEP 8: COPY 'beetle_core/resources'         |\n",
+                 f"{beetle_core_dirpath}/resources", "beetle_core/resources", ["inkscape_resources", "web_figures", '*.svg', ]),
+                ("copy_updater",   ("freeze_embeetle",),
+                 "|               STEP 9: COPY 'beetle_updater_xxx'           |\n",
+                 f"{beetle_dirpath}/{updater_name}", updater_name, None),
+                ("copy_licenses",  ("freeze_embeetle",),
+                 "|                    STEP 10: COPY 'licenses'               |\n",
+                 f"{beetle_dirpath}/licenses", "licenses", None),
+            )
+            if parallel:
+                steps.append(_sch_.Step("delete_cfiles", delete_cfiles_blocking, ("freeze_embeetle",), blocking=True))
+            else:
+                steps.append(_sch_.Step("delete_cfiles", delete_cfiles, ("freeze_embeetle",)))
+            for name, deps, banner, src, dst, exclusions in copies:
+                src = src.replace('\\', '/')
+                dst = os.path.join(buildtarget_dirpath, dst).replace('\\', '/')
+                checkpointed[name] = ((src, ), f"{dst} {exclusions}")
+                if parallel:
+                    func = functools.partial(copy_blocking, name, banner, src, dst, exclusions)
+                    steps.append(_sch_.Step(name, func, deps, blocking=True))
+                else:
+                    func = functools.partial(copy_sequential, name, banner, src, dst, exclusions)
+                    steps.append(_sch_.Step(name, func, deps))
+            return steps
+
+        def post(func):
+            _sw_.switch_thread(qthread=origthread, callback=lambda *args: func(), callbackArg=None, notifycaller=nop)
+            return
+
+        def print_banner(line:str, newlines:str='\n') -> None:
+            self.__miniEditor.printout(newlines)
             self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            self.__miniEditor.printout("|                STEP 1: Delete zip folder                  |\n", "#fcaf3e")
+            self.__miniEditor.printout(line,                                                            "#fcaf3e")
             self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
+            return
+
+        def run_cmd(cmd:str, done:Callable) -> None:
+            def process_result(arg):
+                assert QThread.currentThread() is origthread
+                success, code, _ = arg
+                done(success)
+                return
+            self.execute_machine_cmd(cmd=cmd, callback=process_result, callbackArg=None, callbackThread=origthread)
+            return
+
+        def delete_zip(done, progress):
+            assert QThread.currentThread() is origthread
+            assert os.path.isdir(buildtarget_dirpath)
+            assert os.path.isdir(beetle_core_dirpath)
+            self.__step_begin__("delete_zip")
+            print_banner("|                STEP 1: Delete zip folder                  |\n")
             zipfolder = os.path.join(os.path.dirname(buildtarget_dirpath), "embeetle.zip").replace('\\', '/')
             if os.path.isfile(zipfolder):
                 success = _fp_.delete_file(file_abspath=zipfolder, printfunc=self.__miniEditor.printout, catch_err=True)
                 self.__miniEditor.printout('\n')
                 if not success:
-                    finish(False)
+                    done(False)
                     return
             else:
                 self.__miniEditor.printout("No zip folder found.\n")
             self.__miniEditor.printout('\n')
-            goto_updaterbuildscript()
+            done(True)
             return
 
-        def goto_updaterbuildscript(*args):
+        def goto_updater_src(done, progress):
             assert QThread.currentThread() is origthread
             assert os.path.isdir(buildtarget_dirpath)
             assert os.path.isdir(beetle_core_dirpath)
-            self.__miniEditor.printout('\n')
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            self.__miniEditor.printout("|               STEP 2: GO TO 'beetle_updater_src'          |\n", "#fcaf3e")
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
+            self.__step_begin__("goto_updater_src")
+            print_banner("|               STEP 2: GO TO 'beetle_updater_src'          |\n")
             nonlocal original_path
             original_path = os.getcwd().replace('\\', '/')
             beetle_updater_srcdir = os.path.join(os.path.dirname(beetle_core_dirpath), f"beetle_updater_src").replace('\\', '/')
-            cmd = f"cd \"{beetle_updater_srcdir}\""
-            self.execute_machine_cmd(cmd=cmd, callback=freeze_updater, callbackArg=None, callbackThread=origthread)
+            run_cmd(f"cd \"{beetle_updater_srcdir}\"", done)
             return
 
-        def freeze_updater(arg):
+        def freeze_updater(done, progress):
             assert QThread.currentThread() is origthread
-            success, code, _ = arg
-            if not success:
-                finish(False)
+            self.__step_begin__("freeze_updater")
+            print_banner("|                 STEP 3: FREEZE THE UPDATER                |\n")
+            if reuse_outputs("freeze_updater"):
+                done(True)
                 return
-            self.__miniEditor.printout('\n')
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            self.__miniEditor.printout("|                 STEP 3: FREEZE THE UPDATER                |\n", "#fcaf3e")
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            python = "python" if platform.system().lower() == "windows" else "python3"
-            cmd = f"{python} build.py"
-            self.execute_machine_cmd(cmd=cmd, callback=goto_buildscript, callbackArg=None, callbackThread=origthread)
+            run_cmd(f"{python} build.py", done)
             return
 
-        def goto_buildscript(arg):
+        def goto_to_exe(done, progress):
             assert QThread.currentThread() is origthread
-            success, code, _ = arg
-            if not success:
-                finish(False)
-                return
             assert os.path.isdir(buildtarget_dirpath)
             assert os.path.isdir(beetle_core_dirpath)
-            self.__miniEditor.printout('\n')
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            self.__miniEditor.printout("|             STEP 4: GO TO 'beetle_core/to_exe'            |\n", "#fcaf3e")
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
+            self.__step_begin__("goto_to_exe")
+            print_banner("|             STEP 4: GO TO 'beetle_core/to_exe'            |\n")
             nonlocal original_path
             original_path = os.getcwd().replace('\\', '/')
             to_exe_dirpath = os.path.join(beetle_core_dirpath, "to_exe").replace('\\', '/')
-            cmd = f"cd \"{to_exe_dirpath}\""
-            self.execute_machine_cmd(cmd=cmd, callback=compute_freeze_nr, callbackArg=None, callbackThread=origthread)
+            run_cmd(f"cd \"{to_exe_dirpath}\"", done)
             return
 
-        def compute_freeze_nr(arg):
-            assert QThread.currentThread() is origthread
-            success, code, _ = arg
-            if not success:
-                finish(False)
+        def query_freeze_nr() -> concurrent.futures.Future:
+            # The nr of files to be frozen sets the progressbar maximum. It only depends on the beetle_core
+            # tree, so it's cached under the fingerprint of that tree. On a cache miss, the '--info-only'
+            # run happens in a background thread while the first steps run.
+            future = concurrent.futures.Future()
+            def query():
+                try:
+                    future.set_result(get_freeze_nr())
+                except BaseException as e:
+                    future.set_exception(e)
                 return
-            def parse_freeze_nr(arg):
+            threading.Thread(target=query, name="freeze_nr", daemon=True).start()
+            return future
+
+        def get_freeze_nr() -> Tuple[int, bool]:
+            # Return (nr of files, from cache). The cache key only covers the sources that get frozen,
+            # not the resources that are copied as they are.
+            query_cache = None
+            fingerprint = None
+            if use_cache:
+                try:
+                    fingerprint = _bc_.get_digest(_bc_.scan_tree(beetle_core_dirpath, skip_dirnames=("__pycache__", ), skip_relpaths=("resources", )))
+                    query_cache = _bc_.BuildCache(_bd_.get_query_cache_filepath(buildtarget_dirpath))
+                except OSError:
+                    pass   # Just don't use the cache then
+            if query_cache is not None:
+                n = query_cache.get_value("freeze_nr", fingerprint)
+                if n is not None:
+                    return n, True
+            to_exe_dirpath = os.path.join(beetle_core_dirpath, "to_exe").replace('\\', '/')
+            code, log = _pr_.run_blocking(
+                [python, "freeze_embeetle.py", "--output", buildtarget_dirpath, "--info-only"],
+                cwd = to_exe_dirpath,
+            )
+            match = re.search(r"(Number of files to be compiled:)\s*(\d+)", log, re.MULTILINE)
+            if match is None:
+                raise ValueError(f"'freeze_embeetle.py --info-only' didn't report the nr of files (exit code {code}):\n{log[-2000:]}")
+            n = int(match.group(2))
+            if query_cache is not None:
+                query_cache.store_value("freeze_nr", fingerprint, n)
+            return n, False
+
+        def freeze_embeetle(done, progress):
+            assert QThread.currentThread() is origthread
+            nonlocal freeze_nr
+            def start_freeze(*args):
                 assert QThread.currentThread() is origthread
-                success, code, _ = arg
-                if not success:
-                    finish(False)
-                    return
                 try:
-                    p = re.compile(r"(Number of files to be compiled:)\s*(\d+)", re.MULTILINE)
-                    match = p.search(self.get_log())
-                    n = int(match.group(2))
-                    freeze_embeetle(n)
-                    return
+                    n, from_cache = freeze_nr.result()
                 except Exception as e:
-                    finish(False)
+                    self.__miniEditor.printout(f"Cannot determine the nr of files to be compiled:\n", "#ef2929")
+                    self.__miniEditor.printout(f"{e}\n")
+                    done(False)
                     return
+                self.__miniEditor.printout(f"Number of files to be compiled: {n}{' (cached)' if from_cache else ''}\n")
+                self.__step_stats__(nr_files=n, name="freeze_embeetle")
+                self.__miniEditor.printout('\n')
+                # * Activate progbar
+                self.set_extprogbar_fad(False)
+                self.set_extprogbar_max(n)
+                self.activate_extprogbar_logging(True, "running build_ext")
+                run_cmd(f"{python} freeze_embeetle.py --output \"{buildtarget_dirpath}\"", done)
                 return
-            self.__miniEditor.printout('\n')
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            self.__miniEditor.printout("|                  STEP 5: FREEZE EMBEETLE                  |\n", "#fcaf3e")
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            python = "python" if platform.system().lower() == "windows" else "python3"
-            cmd = f"{python} freeze_embeetle.py --output \"{buildtarget_dirpath}\" --info-only"
-            self.execute_machine_cmd(cmd=cmd, callback=parse_freeze_nr, callbackArg=None, callbackThread=origthread)
+            self.__step_begin__("freeze_embeetle")
+            print_banner("|                  STEP 5: FREEZE EMBEETLE                  |\n")
+            if reuse_outputs("freeze_embeetle"):
+                done(True)
+                return
+            if freeze_nr is None:
+                freeze_nr = query_freeze_nr()
+            if freeze_nr.done():
+                start_freeze()
+                return
+            self.__miniEditor.printout("Waiting for the nr of files to be compiled...\n")
+            freeze_nr.add_done_callback(lambda f: post(start_freeze))
             return
-        def freeze_embeetle(n):
+
+        def reuse_outputs(name:str) -> bool:
+            # Compare the sources and output of the given step with the fingerprints from the last
+            # build. On a mismatch, the cache entry gets dropped until the step succeeds again.
             assert QThread.currentThread() is origthread
-            self.__miniEditor.printout('\n')
-            # * Activate progbar
-            self.set_extprogbar_fad(False)
-            self.set_extprogbar_max(n)
-            self.activate_extprogbar_logging(True, "running build_ext")
-            python = "python" if platform.system().lower() == "windows" else "python3"
-            cmd = f"{python} freeze_embeetle.py --output \"{buildtarget_dirpath}\""
-            self.execute_machine_cmd(cmd=cmd, callback=delete_cfiles, callbackArg=None, callbackThread=origthread)
-            return
+            if cache is None:
+                return False
+            srcpath, outpath, skip = cached_steps[name]
+            try:
+                previous = cache.get_manifest(name) if hash_sources else None
+                manifest = _bc_.scan_tree(srcpath, skip_dirnames=("__pycache__", ), hash_files=hash_sources, previous=previous)
+                inputs   = _bc_.get_digest(manifest, extra=outpath)
+                outputs  = _bc_.get_digest(_bc_.scan_tree(outpath, skip_relpaths=skip))
+            except OSError as e:
+                self.__miniEditor.printout(f"Cannot fingerprint {srcpath}: {e}\n", "#fcaf3e")
+                cache.invalidate(name)
+                return False
+            cached_inputs[name]    = inputs
+            cached_manifests[name] = manifest if hash_sources else None
+            if (cache.get_inputs(name) == inputs) and (cache.get_outputs(name) == outputs):
+                self.__miniEditor.printout(f"Sources unchanged since the last build.\n", "#73d216")
+                self.__miniEditor.printout(f"Reuse {outpath}\n\n")
+                return True
+            cache.invalidate(name)
+            return False
 
-        def delete_cfiles(arg):
+        def remember_outputs(name:str) -> None:
             assert QThread.currentThread() is origthread
-            success, code, _ = arg
-            if not success:
-                finish(False)
+            if (cache is None) or (cached_inputs.get(name) is None):
                 return
-            self.set_extprogbar_fad(True)
-            self.set_extprogbar_max(0)
-            self.activate_extprogbar_logging(False)
-            beetle_core_dst = os.path.join(buildtarget_dirpath, "beetle_core").replace('\\', '/')
-            self.__miniEditor.printout('\n')
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            self.__miniEditor.printout("|        STEP 6: DELETE ALL C-FILES FROM 'beetle_core'      |\n", "#fcaf3e")
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            for root, dirs, files in os.walk(beetle_core_dst):
-                for name in files:
-                    if name.endswith('.c'):
-                        abspath = os.path.join(root, name).replace('\\', '/')
-                        success = _fp_.delete_file(file_abspath=abspath, printfunc=self.__miniEditor.printout, catch_err=True)
-                        if not success:
-                            finish(False)
-                            return
-            self.__miniEditor.printout('...done\n')
-            copy_tools()
-            return
-
-        def copy_tools():
+            srcpath, outpath, skip = cached_steps[name]
+            try:
+                manifest = _bc_.scan_tree(outpath, skip_relpaths=skip)
+            except OSError:
+                return
+            if len(manifest) == 0:
+                return
+            cache.store(name, cached_inputs[name], _bc_.get_digest(manifest), manifest=cached_manifests.get(name))
+            return
+
+        def step_finished(name:str, success:bool) -> None:
             assert QThread.currentThread() is origthread
-            self.__miniEditor.printout('\n\n')
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            self.__miniEditor.printout("|                  STEP 7: COPY 'beetle_tools'              |\n", "#fcaf3e")
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            beetle_tools_src = os.path.join(os.path.dirname(beetle_core_dirpath), "beetle_tools").replace('\\', '/')
-            beetle_tools_dst = os.path.join(buildtarget_dirpath, "beetle_tools").replace('\\', '/')
-            if not os.path.isdir(beetle_tools_dst):
-                self.copy_folder(sourcedir_abspath = beetle_tools_src,
-                                 targetdir_abspath = beetle_tools_dst,
-                                 exclusions        = ["Linux", ] if platform.system().lower() == "windows" else ["Windows", ],
-                                 show_prog         = True,
-                                 delsource         = False,
-                                 callback          = copy_resources,
-                                 callbackArg       = None,
-                                 callbackThread    = origthread)
+            if success and (name in checkpointed):
+                inputs = get_step_inputs(name)
+                if inputs is not None:
+                    checkpoints.mark_done(name, inputs)
+            if success and (name == "freeze_updater"):
+                remember_outputs("freeze_updater")
+            # The freeze output is final once the C-files are gone.
+            if success and (name == "delete_cfiles"):
+                remember_outputs("freeze_embeetle")
+            if name == "freeze_embeetle":
+                enter_copy_phase()
+            return
+
+        def enter_copy_phase() -> None:
+            assert QThread.currentThread() is origthread
+            self.activate_extprogbar_logging(False)
+            if parallel:
+                # From here on, the external progressbar shows the aggregated progress of steps 6-10.
+                self.set_extprogbar_fad(False)
+                self.set_extprogbar_max(1000)
+                self.set_extprogbar_val(0)
             else:
-                assert os.path.isdir(beetle_tools_dst)
-                beetle_tools_src += '/'
-                beetle_tools_dst += '/'
-                self.rsync_local(src_dirpath    = beetle_tools_src,
-                                 tgt_dirpath    = beetle_tools_dst,
-                                 exclusions     = ["Linux", ] if platform.system().lower() == "windows" else ["Windows", ],
-                                 callback       = copy_resources,
-                                 callbackArg    = None,
-                                 callbackThread = origthread)
+                self.set_extprogbar_fad(True)
+                self.set_extprogbar_max(0)
             return
 
-        def copy_resources(arg):
+        def show_progress(fraction:float) -> None:
+            # Can run in any thread, set_extprogbar_val() takes care of that.
+            self.set_extprogbar_val(int(1000 * fraction))
+            return
+
+        def purge_cfiles(progress:Callable[[float], None]=nop) -> bool:
+            beetle_core_dst = os.path.join(buildtarget_dirpath, "beetle_core").replace('\\', '/')
+            result = _pg_.purge_files(beetle_core_dst, match=lambda name: name.endswith('.c'), keep_list=verbose_purge, progress=progress)
+            self.__step_stats__(nr_files=result.nr_files, nr_bytes=result.nr_bytes, name="delete_cfiles")
+            self.__miniEditor.printout(f"{result.get_summary('C-files')}\n", "#ef2929" if result.errors else "#73d216")
+            for path, msg in result.errors[0:10]:
+                self.__miniEditor.printout(f"    {path}: {msg}\n", "#ef2929")
+            if len(result.errors) > 10:
+                self.__miniEditor.printout(f"    ... and {len(result.errors) - 10} more\n", "#ef2929")
+            if verbose_purge:
+                logpath = os.path.join(_bd_.get_state_dirpath(buildtarget_dirpath), "delete_cfiles.log").replace('\\', '/')
+                try:
+                    os.makedirs(os.path.dirname(logpath), exist_ok=True)
+                    with open(logpath, 'w', encoding='utf-8') as f:
+                        f.writelines(f"deleted {path}\n" for path in result.deleted)
+                        f.writelines(f"error   {path}: {msg}\n" for path, msg in result.errors)
+                    self.__miniEditor.printout(f"File list: {logpath}\n")
+                except OSError as e:
+                    self.__miniEditor.printout(f"Cannot write {logpath}: {e}\n", "#ef2929")
+            return len(result.errors) == 0
+
+        def delete_cfiles(done, progress):
             assert QThread.currentThread() is origthread
-            if self.__miniEditor.is_progbar_open():
-                print("copy_resources() -> delay")
-                QTimer.singleShot(50, functools.partial(copy_resources, arg))
-                return
-            success, _ = arg
-            if not success:
-                finish(False)
-                return
-            self.__miniEditor.printout('\n')
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            self.__miniEditor.printout("|              STEP 8: COPY 'beetle_core/resources'         |\n", "#fcaf3e")
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            resources_src = os.path.join(beetle_core_dirpath, "resources").replace('\\', '/')
-            resources_dst = os.path.join(buildtarget_dirpath, "beetle_core/resources").replace('\\', '/')
-            if not os.path.isdir(resources_dst):
-                self.copy_folder(sourcedir_abspath = resources_src,
-                                 targetdir_abspath = resources_dst,
-                                 exclusions        = ["inkscape_resources", "web_figures", '*.svg', ],
-                                 show_prog         = True,
-                                 delsource         = False,
-                                 callback          = copy_updater,
-                                 callbackArg       = None,
-                                 callbackThread    = origthread)
-            else:
-                assert os.path.isdir(resources_dst)
-                resources_src += '/'
-                resources_dst += '/'
-                self.rsync_local(src_dirpath    = resources_src,
-                                 tgt_dirpath    = resources_dst,
-                                 exclusions     = ["inkscape_resources", "web_figures", '*.svg', ],
-                                 callback       = copy_updater,
-                                 callbackArg    = None,
-                                 callbackThread = origthread)
+            self.__step_begin__("delete_cfiles")
+            print_banner("|        STEP 6: DELETE ALL C-FILES FROM 'beetle_core'      |\n")
+            done(purge_cfiles())
             return
 
-        def copy_updater(arg):
+        def delete_cfiles_blocking(progress) -> bool:
+            self.__step_begin__("delete_cfiles", parallel=True)
+            print_banner("|        STEP 6: DELETE ALL C-FILES FROM 'beetle_core'      |\n")
+            success = purge_cfiles(progress)
+            self.__step_end__("delete_cfiles")
+            return success
+
+        def copy_sequential(name, banner, src, dst, exclusions, done, progress):
             assert QThread.currentThread() is origthread
-            if self.__miniEditor.is_progbar_open():
-                print("copy_updater() -> delay")
-                QTimer.singleShot(50, functools.partial(copy_updater, arg))
-                return
-            success, _ = arg
-            if not success:
-                finish(False)
-                return
-            self.__miniEditor.printout('\n')
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            self.__miniEditor.printout("|               STEP 9: COPY 'beetle_updater_xxx'           |\n", "#fcaf3e")
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            beetle_updater_src = os.path.join(os.path.dirname(beetle_core_dirpath), f"beetle_updater_{platform.system().lower()}").replace('\\', '/')
-            beetle_updater_dst = os.path.join(buildtarget_dirpath, f"beetle_updater_{platform.system().lower()}").replace('\\', '/')
-            if not os.path.isdir(beetle_updater_dst):
-                self.copy_folder(sourcedir_abspath = beetle_updater_src,
-                                 targetdir_abspath = beetle_updater_dst,
-                                 exclusions        = None,
-                                 show_prog         = True,
-                                 delsource         = False,
-                                 callback          = copy_licenses,
-                                 callbackArg       = None,
-                                 callbackThread    = origthread)
-            else:
-                assert os.path.isdir(beetle_updater_dst)
-                beetle_updater_src += '/'
-                beetle_updater_dst += '/'
-                self.rsync_local(src_dirpath    = beetle_updater_src,
-                                 tgt_dirpath    = beetle_updater_dst,
-                                 exclusions     = None,
-                                 callback       = copy_licenses,
-                                 callbackArg    = None,
-                                 callbackThread = origthread)
+            self.__when_progbar_closed__(copy_sequential_closed, name, banner, src, dst, exclusions, done)
             return
 
-        def copy_licenses(arg):
+        def copy_sequential_closed(name, banner, src, dst, exclusions, done):
             assert QThread.currentThread() is origthread
-            if self.__miniEditor.is_progbar_open():
-                print("copy_licenses() -> delay")
-                QTimer.singleShot(50, functools.partial(copy_licenses, arg))
-                return
-            success, _ = arg
-            if not success:
-                finish(False)
-                return
-            self.__miniEditor.printout('\n')
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            self.__miniEditor.printout("|                    STEP 10: COPY 'licenses'               |\n", "#fcaf3e")
-            self.__miniEditor.printout("|===========================================================|\n", "#fcaf3e")
-            licenses_src = os.path.join(os.path.dirname(beetle_core_dirpath), "licenses").replace('\\', '/')
-            licenses_dst = os.path.join(buildtarget_dirpath, "licenses").replace('\\', '/')
-            if not os.path.isdir(licenses_dst):
-                self.copy_folder(sourcedir_abspath = licenses_src,
-                                 targetdir_abspath = licenses_dst,
-                                 exclusions        = None,
+            self.__step_begin__(name)
+            print_banner(banner, '\n\n' if name == "copy_tools" else '\n')
+            if not os.path.isdir(dst):
+                self.copy_folder(sourcedir_abspath = src,
+                                 targetdir_abspath = dst,
+                                 exclusions        = exclusions,
                                  show_prog         = True,
                                  delsource         = False,
-                                 callback          = finish,
+                                 callback          = lambda arg: done(arg[0]),
                                  callbackArg       = None,
                                  callbackThread    = origthread)
             else:
-                assert os.path.isdir(licenses_dst)
-                licenses_src += '/'
-                licenses_dst += '/'
-                self.rsync_local(src_dirpath    = licenses_src,
-                                 tgt_dirpath    = licenses_dst,
-                                 exclusions     = None,
-                                 callback       = finish,
+                self.rsync_local(src_dirpath    = src + '/',
+                                 tgt_dirpath    = dst + '/',
+                                 exclusions     = exclusions,
+                                 callback       = lambda arg: done(arg[0]),
                                  callbackArg    = None,
-                                 callbackThread = origthread)
+                                 callbackThread = origthread,
+                                 native         = native_sync,
+                                 use_snapshot   = native_sync and sync_snapshot,
+                                 shards         = sync_shards)
             return
 
+        def copy_blocking(name, banner, src, dst, exclusions, progress) -> bool:
+            self.__step_begin__(name, parallel=True)
+            print_banner(banner)
+            if not os.path.isdir(dst):
+                success = self.__copy_dir_blocking__(src, dst, exclusions, progress, stepname=name)
+            else:
+                success = self.__rsync_local_blocking__(src + '/', dst + '/', exclusions, progress, stepname=name, native=native_sync, use_snapshot=native_sync and sync_snapshot, shards=sync_shards)
+            self.__miniEditor.printout(f"{name}: {'done' if success else 'FAILED'}\n", "#73d216" if success else "#ef2929")
+            self.__step_end__(name)
+            return success
+
         def finish(arg):
             assert QThread.currentThread() is origthread
-            if self.__miniEditor.is_progbar_open():
-                print("finish() -> delay")
-                QTimer.singleShot(50, functools.partial(finish, arg))
-                return
+            self.__when_progbar_closed__(finish_closed, arg)
+            return
+
+        def finish_closed(arg):
+            assert QThread.currentThread() is origthread
             success = False
             if isinstance(arg, bool):
                 success = arg
             else:
                 success, _ = arg
+            self.__run_end__(success)
             self.set_extprogbar_fad(False)
             self.set_extprogbar_max(100)
             self.set_extprogbar_val(100)
@@ -698,6 +1333,7 @@ class MiniConsole(QWidget):
         original_path:str  = None
         def start():
             assert QThread.currentThread() is origthread
+            self.__run_begin__("zip_embeetle", buildtarget_dirpath)
             if not os.path.isdir(beetle_core_dirpath):
                 self.__miniEditor.printout(f"Cannot find source code directory:\n", "#ef2929")
                 self.__miniEditor.printout(f"{beetle_core_dirpath}\n",              "#ffffff")
@@ -713,11 +1349,12 @@ class MiniConsole(QWidget):
 
         def zip_folder():
             assert QThread.currentThread() is origthread
-            if self.__miniEditor.is_progbar_open():
-                print("zip_folder() -> delay")
-                QTimer.singleShot(50, zip_folder)
-                return
-            print("zip_folder() -> execute")
+            self.__when_progbar_closed__(zip_folder_closed)
+            return
+
+        def zip_folder_closed():
+            assert QThread.currentThread() is origthread
+            self.__step_begin__("zip_folder")
             self.set_extprogbar_fad(True)
             self.set_extprogbar_max(0)
             self.activate_extprogbar_logging(False)
@@ -729,25 +1366,28 @@ class MiniConsole(QWidget):
             zipped_folderpath       = os.path.join(os.path.dirname(buildtarget_dirpath), "embeetle.zip").replace('\\', '/')
             self.zip_dir_to_file(sourcedir_abspath  = buildtarget_dirpath,
                                  targetfile_abspath = zipped_folderpath,
-                                 forbidden_dirnames = ["copied_embeetle", ],
-                                 forbidden_filenames= ["compiled_files.txt", ],
+                                 forbidden_dirnames = None,
+                                 forbidden_filenames= None,
                                  show_prog          = True,
                                  callback           = finish,
                                  callbackArg        = None,
-                                 callbackThread     = origthread)
+                                 callbackThread     = origthread,
+                                 exclusions         = _ZIP_EXCLUSIONS)
             return
 
         def finish(arg):
             assert QThread.currentThread() is origthread
-            if self.__miniEditor.is_progbar_open():
-                print("finish() -> delay")
-                QTimer.singleShot(50, functools.partial(finish, arg))
-                return
+            self.__when_progbar_closed__(finish_closed, arg)
+            return
+
+        def finish_closed(arg):
+            assert QThread.currentThread() is origthread
             success = False
             if isinstance(arg, bool):
                 success = arg
             else:
                 success, _ = arg
+            self.__run_end__(success)
             self.set_extprogbar_fad(False)
             self.set_extprogbar_max(100)
             self.set_extprogbar_val(100)
@@ -771,8 +1411,7 @@ class MiniConsole(QWidget):
         '''
         assert threading.current_thread() is not threading.main_thread()
         origthread: QThread = QThread.currentThread()
-        rsync_folder = _pp_.rel_to_abs(rootpath=data.tools_directory, relpath=f"{platform.system()}/rsync")
-        rsyncpath    = _pp_.rel_to_abs(rootpath=rsync_folder, relpath="rsync.exe")
+        rsyncpath = _rs_.get_rsync_path()
         def start():
             assert QThread.currentThread() is origthread
             assert os.getcwd().replace('\\', '/')       == src_dirpath.replace('\\', '/') or \
@@ -783,13 +1422,8 @@ class MiniConsole(QWidget):
         def run_rsync():
             assert QThread.currentThread() is origthread
             nonlocal tgt_dirpath
-            if tgt_dirpath.startswith("C:"):
-                tgt_dirpath = tgt_dirpath.replace("C:", "/cygdrive/c")
-            if tgt_dirpath.startswith("D:"):
-                tgt_dirpath = tgt_dirpath.replace("D:", "/cygdrive/c")
-            exclusions_str = ''
-            if exclusions is not None:
-                exclusions_str = "--exclude " + " --exclude ".join(f"'{e}'" for e in exclusions) + " --delete-excluded"
+            tgt_dirpath = _rs_.to_cygdrive(tgt_dirpath)
+            exclusions_str = _rs_.get_exclusions_str(exclusions)
             cmd = f"\"{rsyncpath}\" -av --delete {exclusions_str} --dry-run --stats ./ {tgt_dirpath}"
             self.execute_machine_cmd(cmd=cmd, callback=process_rsync_output, callbackArg=None, callbackThread=origthread)
             return
@@ -801,14 +1435,8 @@ class MiniConsole(QWidget):
                 finish(-1)
                 return
             try:
-                p = re.compile(r"(Number of created files:)\s*([\d,]+)", re.MULTILINE)
-                match = p.search(self.get_log())
-                n1 = int(match.group(2).replace(',', ''))
-                p = re.compile(r"(Number of deleted files:)\s*([\d,]+)", re.MULTILINE)
-                match = p.search(self.get_log())
-                n2 = int(match.group(2).replace(',', ''))
-                n = n1 + n2
-            except Exception as e:
+                n = _rs_.parse_nr_transfers(self.get_log())
+            except ValueError as e:
                 finish(-1)
                 return
             finish(n)
@@ -846,12 +1474,8 @@ class MiniConsole(QWidget):
             assert local_keypath is None
         origthread:QThread = QThread.currentThread()
         original_path = None
-        rsync_folder  = _pp_.rel_to_abs(rootpath=data.tools_directory, relpath=f"{platform.system()}/rsync")
-        rsyncpath     = _pp_.rel_to_abs(rootpath=rsync_folder, relpath="rsync.exe")
-        if platform.system() == "Windows":
-            sshpath = _pp_.rel_to_abs(rootpath=rsync_folder, relpath="ssh.exe")
-        else:
-            sshpath = "ssh"
+        rsyncpath     = _rs_.get_rsync_path()
+        remote        = f"{remote_username}@{remote_domain}"
         def start():
             assert QThread.currentThread() is origthread
             assert os.getcwd().replace('\\', '/')       == local_dirpath.replace('\\', '/') or \
@@ -861,13 +1485,13 @@ class MiniConsole(QWidget):
             return
         def run_rsync():
             assert QThread.currentThread() is origthread
-            exclusions_str = ''
-            if exclusions is not None:
-                exclusions_str = "--exclude " + " --exclude ".join(f"'{e}'" for e in exclusions) + " --delete-excluded"
+            exclusions_str = _rs_.get_exclusions_str(exclusions)
             if not reverse:
-                cmd = f"\"{rsyncpath}\" -av --delete {exclusions_str} --dry-run --stats -e \"'{sshpath}' -i '{client_id_rsa_tempfilepath}' -o UserKnownHostsFile='{known_hosts_tempfilepath}'\" {remote_username}@{remote_domain}:{remote_dirpath} ./"
+                ssh_str = self.__get_ssh_cmd_str__(remote, client_id_rsa_tempfilepath, known_hosts_tempfilepath)
+                cmd = f"\"{rsyncpath}\" -av --delete {exclusions_str} --dry-run --stats -e {ssh_str} {remote}:{remote_dirpath} ./"
             else:
-                cmd = f"\"{rsyncpath}\" -av --delete {exclusions_str} --dry-run --stats -e \"'{sshpath}' -i '{local_keypath}' -o UserKnownHostsFile='{known_hosts_tempfilepath}'\" ./ {remote_username}@{remote_domain}:{remote_dirpath}"
+                ssh_str = self.__get_ssh_cmd_str__(remote, local_keypath, known_hosts_tempfilepath)
+                cmd = f"\"{rsyncpath}\" -av --delete {exclusions_str} --dry-run --stats -e {ssh_str} ./ {remote}:{remote_dirpath}"
             self.execute_machine_cmd(cmd=cmd, callback=process_rsync_output, callbackArg=None, callbackThread=origthread)
             return
         def process_rsync_output(arg):
@@ -878,14 +1502,8 @@ class MiniConsole(QWidget):
                 finish(-1)
                 return
             try:
-                p = re.compile(r"(Number of created files:)\s*([\d,]+)", re.MULTILINE)
-                match = p.search(self.get_log())
-                n1 = int(match.group(2).replace(',', ''))
-                p = re.compile(r"(Number of deleted files:)\s*([\d,]+)", re.MULTILINE)
-                match = p.search(self.get_log())
-                n2 = int(match.group(2).replace(',', ''))
-                n = n1 + n2
-            except Exception as e:
+                n = _rs_.parse_nr_transfers(self.get_log())
+            except ValueError as e:
                 finish(-1)
                 return
             finish(n)
@@ -902,7 +1520,13 @@ class MiniConsole(QWidget):
                           exclusions:List[str],
                           callback:Callable,
                           callbackArg:object,
-                          callbackThread: QThread):
+                          callbackThread: QThread,
+                          single_pass:Optional[bool]=None,
+                          native:bool=False,
+                          use_snapshot:bool=False,
+                          shards:int=1,
+                          dry_run:bool=False,
+                          plan:Optional[_se_.SyncPlan]=None):
         '''
 
         :param src_dirpath:
@@ -910,72 +1534,179 @@ class MiniConsole(QWidget):
         :param callback:
         :param callbackArg:
         :param callbackThread:
+        :param single_pass:     Drive the progressbar from rsync's own progress output, instead of
+                                sizing it with a dry-run first. Needs rsync 3.1 or later. By default,
+                                that depends on the version of the bundled rsync.
+        :param native:          Don't run rsync, but mirror the directories with the built-in sync
+                                engine (see sync_engine.py). Same semantics, no cwd changes, and the
+                                progressbar shows the bytes copied.
+        :param use_snapshot:    Only with the built-in engine: keep a snapshot of the synced tree, such that
+                                the next sync only reads the directories that changed since (see
+                                sync_engine.TreeSnapshot).
+        :param shards:          Run this many rsync processes at the same time, each on its own top-level
+                                directory of the source (see __rsync_sharded_blocking__()).
+        :param dry_run:         Only with the built-in engine: only print the changes the sync would make.
+        :param plan:            Execute this plan (see sync_engine.plan_sync()) with the built-in engine,
+                                instead of comparing the directories again. The plan can be a filtered
+                                one.
         :return:
         '''
         assert threading.current_thread() is not threading.main_thread()
         origthread:QThread = QThread.currentThread()
         original_path = None
-        rsync_folder  = _pp_.rel_to_abs(rootpath=data.tools_directory, relpath=f"{platform.system()}/rsync")
-        rsyncpath     = _pp_.rel_to_abs(rootpath=rsync_folder, relpath="rsync.exe")
+        rsyncpath     = _rs_.get_rsync_path()
         progbar_value = 0
         def start():
             assert QThread.currentThread() is origthread
-            nonlocal original_path
+            nonlocal original_path, single_pass
+            if single_pass is None:
+                single_pass = _rs_.supports_progress_args(rsyncpath)
+            if native or (plan is not None):
+                run_native()
+                return
+            if dry_run or use_snapshot:
+                # Rsync would ignore them and really sync - deletions included.
+                self.__miniEditor.printout("The dry-run and snapshot options need the built-in sync engine.\n", "#ef2929")
+                finish(False)
+                return
+            if shards > 1:
+                run_sharded()
+                return
             self.__miniEditor.printout("STEP 1: Go to source directory\n", "#fcaf3e")
             self.__miniEditor.printout("------------------------------", "#fcaf3e")
             original_path = os.getcwd().replace('\\', '/')
             cmd = f"cd \"{src_dirpath}\""
             self.execute_machine_cmd(cmd=cmd, callback=get_nr_transfers, callbackArg=None, callbackThread=origthread)
             return
+        def run_native():
+            assert QThread.currentThread() is origthread
+            self.__miniEditor.printout("Sync with the built-in engine\n", "#fcaf3e")
+            self.__miniEditor.printout("-----------------------------\n", "#fcaf3e")
+            self.__miniEditor.printout(f"{src_dirpath} -> {tgt_dirpath}\n")
+            snapshot_filepath = _bd_.get_snapshot_filepath(src_dirpath, tgt_dirpath, exclusions) if use_snapshot else None
+            sync_plan = plan
+            if sync_plan is None:
+                sync_plan = _se_.plan_sync(src_dirpath, tgt_dirpath, exclusions, snapshot_filepath=snapshot_filepath)
+            if dry_run:
+                self.__print_sync_plan__(sync_plan)
+                finish(len(sync_plan.errors) == 0)
+                return
+            self.set_extprogbar_fad(False)
+            self.set_extprogbar_max(100)
+            self.start_progbar("Sync:")
+            lastperc = -1
+            meter = _tp_.TransferMeter(sync_plan.get_nr_bytes())
+            lock  = threading.Lock()
+            def progress(done, total):
+                # Called from the copy workers.
+                nonlocal lastperc
+                with lock:
+                    meter.update(done)
+                    perc = 100 if total == 0 else int(100 * done / total)
+                    if perc <= lastperc:
+                        return
+                    lastperc = perc
+                    self.set_progbar_val(float(perc))
+                    self.set_extprogbar_val(perc)
+                    self.set_extprogbar_txt(meter.get_status())
+                return
+            result = _se_.execute_plan(sync_plan, progress=progress)
+            self.set_progbar_val(100.0)
+            self.close_progbar()
+            self.__print_sync_result__(result)
+            if result.nr_bytes > 0:
+                self.__miniEditor.printout(f"Copied {meter.get_summary()}\n")
+            self.__step_stats__(nr_files=result.nr_copied + result.nr_deleted, nr_bytes=result.nr_bytes)
+            self.__when_progbar_closed__(finish, len(result.errors) == 0)
+            return
+        def run_sharded():
+            assert QThread.currentThread() is origthread
+            self.__miniEditor.printout(f"Rsync in {shards} shards\n", "#fcaf3e")
+            self.__miniEditor.printout(f"--------------{'-' * len(str(shards))}-------\n", "#fcaf3e")
+            self.__miniEditor.printout(f"{src_dirpath} -> {tgt_dirpath}\n")
+            self.set_extprogbar_fad(False)
+            self.set_extprogbar_max(100)
+            self.start_progbar("Rsync:")
+            lastperc = -1
+            def progress(fraction):
+                nonlocal lastperc
+                perc = int(100 * fraction)
+                if perc > lastperc:
+                    lastperc = perc
+                    self.set_progbar_val(float(perc))
+                    self.set_extprogbar_val(perc)
+                return
+            success = self.__rsync_sharded_blocking__(src_dirpath, tgt_dirpath, exclusions, shards, progress)
+            self.set_progbar_val(100.0)
+            self.close_progbar()
+            self.__when_progbar_closed__(finish, success)
+            return
         def get_nr_transfers(arg):
             assert QThread.currentThread() is origthread
             success, code, _ = arg
             if (success == False) or (code != 0):
                 finish(False)
                 return
-            self.__miniEditor.printout("STEP 2: Rsync dry-run: get nr of transfers\n", "#fcaf3e")
-            self.__miniEditor.printout("------------------------------------------", "#fcaf3e")
             self.set_extprogbar_fad(True)
             self.set_extprogbar_max(0)
+            if single_pass:
+                run_rsync(None)
+                return
+            self.__miniEditor.printout("STEP 2: Rsync dry-run: get nr of transfers\n", "#fcaf3e")
+            self.__miniEditor.printout("------------------------------------------", "#fcaf3e")
             self.__get_nr_transfers__(src_dirpath=src_dirpath,
                                       tgt_dirpath=tgt_dirpath,
                                       exclusions=exclusions,
                                       callback=run_rsync,
                                       callbackArg=None)
             return
+        def get_file_progress_str() -> str:
+            # The log still holds the dry-run, with the nr of bytes to transfer.
+            try:
+                total_bytes = _rs_.parse_transferred_size(self.get_log())
+            except ValueError:
+                return ''
+            if total_bytes == 0:
+                return ''
+            self.__set_output_filter__(self.__get_file_progress_filter__(total_bytes))
+            return "--progress"
         def run_rsync(n, *args):
             assert QThread.currentThread() is origthread
             nonlocal tgt_dirpath
             if n == -1:
                 finish(False)
                 return
-            self.__miniEditor.printout('\n')
-            self.__miniEditor.printout('\n')
-            self.__miniEditor.printout("STEP 3: Rsync run\n", "#fcaf3e")
-            self.__miniEditor.printout("-----------------", "#fcaf3e")
-            if n != 0:
-                self.set_extprogbar_fad(False)
-                self.set_extprogbar_max(n)
-                self.activate_extprogbar_logging(True)
-            if tgt_dirpath.startswith("C:"):
-                tgt_dirpath = tgt_dirpath.replace("C:", "/cygdrive/c")
-            if tgt_dirpath.startswith("D:"):
-                tgt_dirpath = tgt_dirpath.replace("D:", "/cygdrive/d")
-            exclusions_str = ''
-            if exclusions is not None:
-                exclusions_str = "--exclude " + " --exclude ".join(f"'{e}'" for e in exclusions) + " --delete-excluded"
-            cmd = f"\"{rsyncpath}\" -av --delete {exclusions_str} ./ {tgt_dirpath}"
+            progress_str = ''
+            if n is None:
+                self.__miniEditor.printout("STEP 2: Rsync run (single pass)\n", "#fcaf3e")
+                self.__miniEditor.printout("-------------------------------", "#fcaf3e")
+                progress_str = _rs_.get_progress_str()
+                self.__set_output_filter__(_rs_.ProgressFilter())
+            else:
+                self.__miniEditor.printout('\n')
+                self.__miniEditor.printout('\n')
+                self.__miniEditor.printout("STEP 3: Rsync run\n", "#fcaf3e")
+                self.__miniEditor.printout("-----------------", "#fcaf3e")
+                # The log still holds the dry-run, with the nr of bytes to transfer.
+                self.__rsync_step_stats__(self.get_log(), nr_files=n)
+                progress_str = get_file_progress_str()
+            tgt_dirpath = _rs_.to_cygdrive(tgt_dirpath)
+            exclusions_str = _rs_.get_exclusions_str(exclusions)
+            cmd = f"\"{rsyncpath}\" -av --delete {exclusions_str} {progress_str} ./ {tgt_dirpath}"
             self.execute_machine_cmd(cmd=cmd, callback=restore_cwd, callbackArg=None, callbackThread=origthread)
             return
         def restore_cwd(arg):
             assert QThread.currentThread() is origthread
             success, code, _ = arg
+            self.__set_output_filter__(None)
+            if single_pass:
+                self.__rsync_step_stats__(self.get_log())
             if (success == False) or (code != 0):
                 finish(False)
                 return
             self.__miniEditor.printout('\n')
             self.__miniEditor.printout('\n')
-            self.__miniEditor.printout("STEP 4: Return to original path\n", "#fcaf3e")
+            self.__miniEditor.printout(f"STEP {3 if single_pass else 4}: Return to original path\n", "#fcaf3e")
             self.__miniEditor.printout("-------------------------------", "#fcaf3e")
             cmd = f"cd \"{original_path}\""
             self.execute_machine_cmd(cmd=cmd, callback=finish, callbackArg=success, callbackThread=origthread)
@@ -992,6 +1723,7 @@ class MiniConsole(QWidget):
             self.set_extprogbar_fad(False)
             self.set_extprogbar_max(100)
             self.set_extprogbar_val(100)
+            self.set_extprogbar_txt('')
             self.__extprogbar_val = 0
             self.activate_extprogbar_logging(False)
             assert QThread.currentThread() is origthread
@@ -1012,7 +1744,9 @@ class MiniConsole(QWidget):
                                     local_keypath:str,
                                     callback:Callable,
                                     callbackArg:object,
-                                    callbackThread:QThread):
+                                    callbackThread:QThread,
+                                    single_pass:Optional[bool]=None,
+                                    credential_ttl:float=3600.0):
         '''
         Apply the rsync command:
             rsync -av remote_username@remote_domain:remote_dirpath local_dirpath
@@ -1025,6 +1759,13 @@ class MiniConsole(QWidget):
         :param client_id_rsa_url:   URL to 'client_id_rsa' file. Only needed for downstream.
         :param reverse:             Upstream sync.
         :param local_keypath:       Location of local key. Only needed for upstream.
+        :param single_pass:         Drive the progressbar from rsync's own progress output, instead of
+                                    sizing it with a dry-run first (which negotiates SSH a second time).
+                                    Needs rsync 3.1 or later. By default, that depends on the version
+                                    of the bundled rsync.
+        :param credential_ttl:      The ssh keys are kept in a private cache. For this many seconds, a
+                                    cached key gets used without asking the server. After that, it gets
+                                    revalidated and only downloaded again if it changed.
 
         :param callback:            Callback when rsync has finished. @param: (success, callbackArg)
         :param callbackArg:         callbackArg=(success, callbackArg)
@@ -1041,17 +1782,15 @@ class MiniConsole(QWidget):
             assert local_keypath is None
         origthread:QThread = QThread.currentThread()
         original_path = None
-        rsync_folder               = _pp_.rel_to_abs(rootpath=data.tools_directory, relpath=f"{platform.system()}/rsync")
-        rsyncpath                  = _pp_.rel_to_abs(rootpath=rsync_folder, relpath="rsync.exe")
-        if platform.system() == "Windows":
-            sshpath = _pp_.rel_to_abs(rootpath=rsync_folder, relpath="ssh.exe")
-        else:
-            sshpath = "ssh"
+        rsyncpath                  = _rs_.get_rsync_path()
+        remote                     = f"{remote_username}@{remote_domain}"
         known_hosts_tempfilepath   = None
         client_id_rsa_tempfilepath = None
         def start():
             assert QThread.currentThread() is origthread
-            nonlocal original_path
+            nonlocal original_path, single_pass
+            if single_pass is None:
+                single_pass = _rs_.supports_progress_args(rsyncpath)
             self.__miniEditor.printout("STEP 1: Go to local directory\n", "#fcaf3e")
             self.__miniEditor.printout("------------------------------", "#fcaf3e")
             original_path = os.getcwd().replace('\\', '/')
@@ -1066,48 +1805,41 @@ class MiniConsole(QWidget):
                 return
             self.__miniEditor.printout("STEP 2: Download ssh keys\n", "#fcaf3e")
             self.__miniEditor.printout("-------------------------\n", "#fcaf3e")
-            def download_known_hosts(*args):
-                assert QThread.currentThread() is origthread
-                self.download_file(url=known_hosts_url, show_prog=True, callback=download_client_id_rsa, callbackArg=None, callbackThread=origthread)
-                return
-            def download_client_id_rsa(*args):
-                assert QThread.currentThread() is origthread
-                success, filepath, _ = args[0]
-                if not success:
-                    finish(False)
-                    return
-                nonlocal known_hosts_tempfilepath
-                known_hosts_tempfilepath = filepath
-                if reverse:
-                    self.__miniEditor.printout(f"Upstream mode ->             \n")
-                    self.__miniEditor.printout(f"No need to download rsa file.\n")
-                    self.__miniEditor.printout(f"Use local key instead:       \n")
-                    self.__miniEditor.printout(f"    {local_keypath}\n\n")
-                    finish_downloads((True, None, None))
-                else:
-                    print(f"Download file: {client_id_rsa_url}")
-                    self.download_file(url=client_id_rsa_url, show_prog=True, callback=finish_downloads, callbackArg=None, callbackThread=origthread)
+            def fetch(url:str) -> Optional[str]:
+                try:
+                    filepath, how = _cc_.fetch(url, ttl=credential_ttl)
+                except (urllib.error.URLError, OSError, ValueError) as e:
+                    self.__miniEditor.printout(f"ERROR: cannot download {url}\n", "#ef2929")
+                    self.__miniEditor.printout(f"{e}\n", "#ef2929")
+                    return None
+                self.__miniEditor.printout(f"{url} ({how})\n")
+                return filepath
+            nonlocal known_hosts_tempfilepath, client_id_rsa_tempfilepath
+            known_hosts_tempfilepath = fetch(known_hosts_url)
+            if known_hosts_tempfilepath is None:
+                finish(False)
                 return
-            def finish_downloads(*args):
-                assert QThread.currentThread() is origthread
-                success, filepath, _ = args[0]
-                if not reverse:
-                    print(f"Downloaded {client_id_rsa_url} to {filepath}")
-                if (success != True) or ((reverse == False) and (filepath is None)):
+            if reverse:
+                self.__miniEditor.printout(f"Upstream mode ->             \n")
+                self.__miniEditor.printout(f"No need to download rsa file.\n")
+                self.__miniEditor.printout(f"Use local key instead:       \n")
+                self.__miniEditor.printout(f"    {local_keypath}\n\n")
+            else:
+                client_id_rsa_tempfilepath = fetch(client_id_rsa_url)
+                if client_id_rsa_tempfilepath is None:
                     finish(False)
                     return
-                nonlocal client_id_rsa_tempfilepath
-                client_id_rsa_tempfilepath = filepath
-                get_nr_transfers()
-                return
-            download_known_hosts()
+            get_nr_transfers()
             return
         def get_nr_transfers():
             assert QThread.currentThread() is origthread
-            self.__miniEditor.printout("STEP 3: Rsync dry-run: get nr of transfers\n", "#fcaf3e")
-            self.__miniEditor.printout("------------------------------------------", "#fcaf3e")
             self.set_extprogbar_fad(True)
             self.set_extprogbar_max(0)
+            if single_pass:
+                run_rsync(None)
+                return
+            self.__miniEditor.printout("STEP 3: Rsync dry-run: get nr of transfers\n", "#fcaf3e")
+            self.__miniEditor.printout("------------------------------------------", "#fcaf3e")
             self.__get_nr_remote_transfers__(remote_username=remote_username,
                                              remote_domain=remote_domain,
                                              remote_dirpath=remote_dirpath,
@@ -1120,37 +1852,56 @@ class MiniConsole(QWidget):
                                              callback=run_rsync,
                                              callbackArg=None)
             return
+        def get_file_progress_str() -> str:
+            # The log still holds the dry-run, with the nr of bytes to transfer.
+            try:
+                total_bytes = _rs_.parse_transferred_size(self.get_log())
+            except ValueError:
+                return ''
+            if total_bytes == 0:
+                return ''
+            self.__set_output_filter__(self.__get_file_progress_filter__(total_bytes))
+            return "--progress"
         def run_rsync(n, *args):
             assert QThread.currentThread() is origthread
             if n == -1:
                 finish(False)
                 return
-            self.__miniEditor.printout('\n')
-            self.__miniEditor.printout('\n')
-            self.__miniEditor.printout("STEP 4: Rsync run\n", "#fcaf3e")
-            self.__miniEditor.printout("-----------------", "#fcaf3e")
-            if n != 0:
-                self.set_extprogbar_fad(False)
-                self.set_extprogbar_max(n)
-                self.activate_extprogbar_logging(True)
-            exclusions_str = ''
-            if exclusions is not None:
-                exclusions_str = "--exclude " + " --exclude ".join(f"'{e}'" for e in exclusions) + " --delete-excluded"
+            progress_str = ''
+            if n is None:
+                self.__miniEditor.printout("STEP 3: Rsync run (single pass)\n", "#fcaf3e")
+                self.__miniEditor.printout("-------------------------------", "#fcaf3e")
+                progress_str = _rs_.get_progress_str()
+                self.__set_output_filter__(_rs_.ProgressFilter())
+            else:
+                self.__miniEditor.printout('\n')
+                self.__miniEditor.printout('\n')
+                self.__miniEditor.printout("STEP 4: Rsync run\n", "#fcaf3e")
+                self.__miniEditor.printout("-----------------", "#fcaf3e")
+                # The log still holds the dry-run, with the nr of bytes to transfer.
+                self.__rsync_step_stats__(self.get_log(), nr_files=n)
+                progress_str = get_file_progress_str()
+            exclusions_str = _rs_.get_exclusions_str(exclusions)
             if not reverse:
-                cmd = f"\"{rsyncpath}\" -av --delete {exclusions_str} -e \"'{sshpath}' -i '{client_id_rsa_tempfilepath}' -o UserKnownHostsFile='{known_hosts_tempfilepath}'\" {remote_username}@{remote_domain}:{remote_dirpath} ./"
+                ssh_str = self.__get_ssh_cmd_str__(remote, client_id_rsa_tempfilepath, known_hosts_tempfilepath)
+                cmd = f"\"{rsyncpath}\" -av --delete {exclusions_str} {progress_str} -e {ssh_str} {remote}:{remote_dirpath} ./"
             else:
-                cmd = f"\"{rsyncpath}\" -av --delete {exclusions_str} -e \"'{sshpath}' -i '{local_keypath}' -o UserKnownHostsFile='{known_hosts_tempfilepath}'\" ./ {remote_username}@{remote_domain}:{remote_dirpath}"
+                ssh_str = self.__get_ssh_cmd_str__(remote, local_keypath, known_hosts_tempfilepath)
+                cmd = f"\"{rsyncpath}\" -av --delete {exclusions_str} {progress_str} -e {ssh_str} ./ {remote}:{remote_dirpath}"
             self.execute_machine_cmd(cmd=cmd, callback=restore_cwd, callbackArg=None, callbackThread=origthread)
             return
         def restore_cwd(arg):
             assert QThread.currentThread() is origthread
             success, code, _ = arg
+            self.__set_output_filter__(None)
+            if single_pass:
+                self.__rsync_step_stats__(self.get_log())
             if (success == False) or (code != 0):
                 finish(False)
                 return
             self.__miniEditor.printout('\n')
             self.__miniEditor.printout('\n')
-            self.__miniEditor.printout("STEP 5: Return to original path\n", "#fcaf3e")
+            self.__miniEditor.printout(f"STEP {4 if single_pass else 5}: Return to original path\n", "#fcaf3e")
             self.__miniEditor.printout("-------------------------------", "#fcaf3e")
             cmd = f"cd \"{original_path}\""
             self.execute_machine_cmd(cmd=cmd, callback=finish, callbackArg=success, callbackThread=origthread)
@@ -1167,6 +1918,7 @@ class MiniConsole(QWidget):
             self.set_extprogbar_fad(False)
             self.set_extprogbar_max(100)
             self.set_extprogbar_val(100)
+            self.set_extprogbar_txt('')
             self.__extprogbar_val = 0
             self.activate_extprogbar_logging(False)
             assert QThread.currentThread() is origthread
@@ -1185,9 +1937,11 @@ class MiniConsole(QWidget):
                           callbackThread:QThread) -> None:
         '''
         Copy a big folder from the given 'sourcedir_abspath' to 'targetdir_abspath'. If the target directory already
-        exists, it will be cleaned first.
+        exists, it will be cleaned first. The files get copied in parallel, in the kernel where the OS allows it (see
+        sync_engine.copy_tree()), and the progressbar follows the bytes copied.
 
         :param sourcedir_abspath:   Source directory.
+        :param exclusions:          Patterns in rsync's '--exclude' syntax, or ExclusionRules().
         :param targetdir_abspath:   Target directory.
         :param show_prog:           Show a progressbar.
         :param delsource:           Perform a move instead of a copy.
@@ -1199,72 +1953,227 @@ class MiniConsole(QWidget):
         assert threading.current_thread() is not threading.main_thread()
         origthread = QThread.currentThread()
         def start():
-            QTimer.singleShot(50, dircopy)
+            # Return to the caller first, the copy blocks this thread.
+            QTimer.singleShot(0, dircopy)
             return
         def dircopy(*args):
-            j: int    = 0    # Cntr on reporthook calls.
-            jmax: int = 1    # Max for cntr, reporthook should update progressbar on overflow.
-            def reporthook(i, n):
-                nonlocal j, jmax
-                j += 1
-                if j > jmax:
-                    j = 0
-                    jmax = int( n / 100.0)  # Calculate 'jmax' such that cntr overflow happens 100 times.
-                    perc = 100.0 * (i / n)
-                    if show_prog:
-                        if not self.__miniEditor.is_progbar_open():
-                            if delsource:
-                                self.start_progbar("Move:")
-                            else:
-                                self.start_progbar("Copy:")
-                        self.set_progbar_val(perc)
+            progbar_started: bool = False  # The progbar opens asynchronously, so remember if it was asked for.
+            lastperc: int = -1
+            meter:Optional[_tp_.TransferMeter] = None
+            lock = threading.Lock()
+            def progress(done, total):
+                # Called from the copy workers.
+                nonlocal progbar_started, lastperc, meter
+                with lock:
+                    if meter is None:
+                        meter = _tp_.TransferMeter(total)
+                    meter.update(done)
+                    perc = 100 if total == 0 else int(100 * done / total)
+                    if (not show_prog) or (perc <= lastperc):
+                        return
+                    lastperc = perc
+                    if not progbar_started:
+                        progbar_started = True
+                        self.start_progbar("Move:" if delsource else "Copy:")
+                    self.set_progbar_val(float(perc))
+                    self.set_extprogbar_txt(meter.get_status())
                 return
-
-            if delsource:
-                success = _fp_.move_dir(sourcedir_abspath=sourcedir_abspath,
-                                        targetdir_abspath=targetdir_abspath,
-                                        exclusions=exclusions,
-                                        reporthook=reporthook,
-                                        printfunc=self.get_printfunc(),
-                                        catch_err=True,
-                                        overwr=True)
-            else:
-                success = _fp_.copy_dir(sourcedir_abspath=sourcedir_abspath,
-                                        targetdir_abspath=targetdir_abspath,
-                                        exclusions=exclusions,
-                                        reporthook=reporthook,
-                                        printfunc=self.get_printfunc(),
-                                        catch_err=True,
-                                        overwr=True)
-            if show_prog and self.__miniEditor.is_progbar_open():
+            result = _se_.copy_tree(sourcedir_abspath, targetdir_abspath, exclusions, move=delsource, progress=progress)
+            success = len(result.errors) == 0
+            self.__step_stats__(nr_files=result.nr_copied, nr_bytes=result.nr_bytes)
+            if progbar_started:
                 self.set_progbar_val(100.0)
                 self.close_progbar()
+                self.set_extprogbar_txt('')
             self.__miniEditor.printout('\n')
-            if not success:
-                finish(False)
-                return
-            QTimer.singleShot(100, lambda: finish(True))
+            self.__print_sync_result__(result)
+            if (meter is not None) and (result.nr_bytes > 0):
+                self.__miniEditor.printout(f"{'Moved' if delsource else 'Copied'} {meter.get_summary()}\n")
+            self.__when_progbar_closed__(finish, success)
             return
         def finish(success):
             assert QThread.currentThread() is origthread
-            if self.__miniEditor.is_progbar_open():
-                print(f"WARNING: copy_folder({targetdir_abspath.split('/')[-1]}) did not properly close the progbar!")
-                self.close_progbar()
-                QTimer.singleShot(250, functools.partial(finish, success))
-                return
             self.__miniEditor.printout('\n')
             _sw_.switch_thread(qthread=callbackThread, callback=callback, callbackArg=(success, callbackArg), notifycaller=nop)
             return
         start()
         return
 
-    def zip_dir_to_file(self, sourcedir_abspath:str, targetfile_abspath:str, forbidden_dirnames:List[str], forbidden_filenames:List[str], show_prog:bool, callback:Callable, callbackArg:object, callbackThread:QThread) -> None:
+    def __copy_dir_blocking__(self, sourcedir_abspath:str,
+                                    targetdir_abspath:str,
+                                    exclusions:Optional[List[str]],
+                                    progress:Callable[[float], None],
+                                    stepname:Optional[str]=None) -> bool:
+        '''
+        Blocking variant of copy_folder() for steps that run in a background thread. It doesn't touch
+        the progressbars, but reports its progress (0.0-1.0) to the given function instead.
+
+        '''
+        result = _se_.copy_tree(sourcedir_abspath, targetdir_abspath, exclusions,
+                                progress = lambda d, t: progress(d / t if t > 0 else 1.0))
+        if len(result.errors) > 0:
+            self.__print_sync_result__(result)
+        self.__step_stats__(nr_files=result.nr_copied, nr_bytes=result.nr_bytes, name=stepname)
+        return len(result.errors) == 0
+
+    def __rsync_local_blocking__(self, src_dirpath:str,
+                                       tgt_dirpath:str,
+                                       exclusions:Optional[List[str]],
+                                       progress:Callable[[float], None],
+                                       stepname:Optional[str]=None,
+                                       native:bool=False,
+                                       use_snapshot:bool=False,
+                                       shards:int=1) -> bool:
+        '''
+        Blocking variant of rsync_local() for steps that run in a background thread. It runs rsync in
+        its own subprocess, so it leaves the console's Process() and the cwd alone. Rsync's file list
+        doesn't get printed (it would interleave with the other steps), only its output on failure.
+        Rsync runs once, in single-pass mode. An rsync older than 3.1 only reports its progress at
+        the end.
+
+        '''
+        if native:
+            result = _se_.sync_dirs(src_dirpath, tgt_dirpath, exclusions,
+                                    progress          = lambda d, t: progress(d / t if t > 0 else 1.0),
+                                    snapshot_filepath = _bd_.get_snapshot_filepath(src_dirpath, tgt_dirpath, exclusions) if use_snapshot else None)
+            if len(result.errors) > 0:
+                self.__print_sync_result__(result)
+            self.__step_stats__(nr_files=result.nr_copied + result.nr_deleted, nr_bytes=result.nr_bytes, name=stepname)
+            return len(result.errors) == 0
+        if shards > 1:
+            return self.__rsync_sharded_blocking__(src_dirpath, tgt_dirpath, exclusions, shards, progress, stepname)
+        args = [_rs_.get_rsync_path(), "-av", "--delete", *_rs_.get_exclusions_args(exclusions), *_rs_.get_progress_args()]
+        tgt  = _rs_.to_cygdrive(tgt_dirpath)
+        def parse_line(line:str) -> None:
+            # The subprocess output is read in text mode, which turns rsync's carriage returns into
+            # line ends: each progress record arrives as a line of its own.
+            p = _rs_.parse_progress(line)
+            if p is not None:
+                progress(min(1.0, p.percent / 100.0))
+            return
+        code, log = _pr_.run_blocking(args + ["./", tgt], cwd=src_dirpath, linefunc=parse_line)
+        if code != 0:
+            self.__miniEditor.printout(f"Rsync failed for {src_dirpath}:\n", "#ef2929")
+            self.__miniEditor.printout(_rs_.ProgressFilter().feed(log + '\n')[0])
+            return False
+        self.__rsync_step_stats__(log, name=stepname)
+        return True
+
+    def __rsync_sharded_blocking__(self, src_dirpath:str,
+                                         tgt_dirpath:str,
+                                         exclusions:Optional[List[str]],
+                                         shards:int,
+                                         progress:Callable[[float], None],
+                                         stepname:Optional[str]=None) -> bool:
+        '''
+        Mirror 'src_dirpath' into 'tgt_dirpath' with several rsync processes at the same time, such
+        that one process's I/O pipeline isn't the limit:
+
+            1. One rsync without recursion (-d) handles the top level: the files in it, the top-level
+               directories themselves and all deletions at that level (--delete, --delete-excluded).
+            2. Then every top-level directory gets its own rsync, 'shards' of them at a time and the
+               biggest first, according to the sizes measured by the previous sharded sync. The
+               directories are passed without a trailing slash, so the exclusions stay anchored at
+               the root of the source.
+
+        The progress of the processes gets merged, weighted by their expected size. Blocking: runs in
+        the calling thread and leaves the console's Process() and the cwd alone.
+
+        '''
+        src  = src_dirpath.replace('\\', '/').rstrip('/')
+        tgt  = _rs_.to_cygdrive(tgt_dirpath.replace('\\', '/').rstrip('/')) + '/'
+        rules = _ex_.get_rules(exclusions)
+        base  = [_rs_.get_rsync_path(), *rules.get_rsync_args(), *_rs_.get_progress_args()]
+        def print_failure(what:str, log:str) -> None:
+            self.__miniEditor.printout(f"Rsync failed for {what}:\n", "#ef2929")
+            self.__miniEditor.printout(_rs_.ProgressFilter().feed(log + '\n')[0])
+            return
+
+        # * 1. Top level
+        code, log = _pr_.run_blocking(base + ["-dlptgoD", "--delete", "./", tgt], cwd=src)
+        if code != 0:
+            print_failure(src, log)
+            return False
+        self.__rsync_step_stats__(log, name=stepname)
+
+        # * 2. Top-level directories
+        try:
+            with os.scandir(src) as it:
+                names = [
+                    e.name for e in it
+                    if e.is_dir(follow_symlinks=False) and not rules.is_excluded(e.name, True)
+                ]
+        except OSError as e:
+            self.__miniEditor.printout(f"Cannot read {src}: {e.strerror or e}\n", "#ef2929")
+            return False
+        sizes_filepath = _bd_.get_shard_sizes_filepath(src)
+        data  = _bc_.load_json(sizes_filepath, 1)
+        sizes:Dict[str, int] = data.get("sizes", {}) if data is not None else {}
+        known = [sizes[n] for n in names if n in sizes]
+        guess = sum(known) / len(known) if len(known) > 0 else 1.0
+        weights = {n: float(sizes.get(n, guess)) for n in names}
+        names.sort(key=lambda n: weights[n], reverse=True)
+        merged = _rs_.ShardProgress(weights)
+        def run_shard(name:str) -> Tuple[str, int, str]:
+            def parse_line(line:str) -> None:
+                p = _rs_.parse_progress(line)
+                if p is not None:
+                    progress(merged.update(name, p.percent / 100.0))
+                return
+            code, log = _pr_.run_blocking(base + ["-a", "--delete", f"./{name}", tgt], cwd=src, linefunc=parse_line)
+            if code == 0:
+                progress(merged.update(name, 1.0))
+            return name, code, log
+        success = True
+        if len(names) > 0:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(shards, len(names)))) as pool:
+                for name, code, log in pool.map(run_shard, names):
+                    if code != 0:
+                        print_failure(f"{src}/{name}", log)
+                        success = False
+                        continue
+                    self.__rsync_step_stats__(log, name=stepname)
+                    try:
+                        sizes[name] = _rs_.parse_total_size(log)
+                    except ValueError:
+                        pass
+        progress(1.0)
+        _bc_.save_json(sizes_filepath, {"version": 1, "sizes": {n: sizes[n] for n in names if n in sizes}})
+        return success
+
+    def __print_sync_plan__(self, plan:_se_.SyncPlan, max_changes:int=50) -> None:
+        colors = {"delete": "#ef2929", "mkdir": "#729fcf", "create": "#73d216", "update": "#fce94f", "link": "#ad7fa8"}
+        for change in plan.changes[:max_changes]:
+            size = f" ({_pg_.format_size(change.size)})" if change.size > 0 else ''
+            self.__miniEditor.printout(f"    {change.action:<6} ", colors[change.action])
+            self.__miniEditor.printout(f"{change.relpath}{size}\n")
+        if len(plan.changes) > max_changes:
+            self.__miniEditor.printout(f"    ... and {len(plan.changes) - max_changes} more\n")
+        ok = len(plan.errors) == 0
+        self.__miniEditor.printout(plan.get_summary() + '\n', "#73d216" if ok else "#ef2929")
+        for path, msg in plan.errors[:max_changes]:
+            self.__miniEditor.printout(f"    {path}: {msg}\n", "#ef2929")
+        return
+
+    def __print_sync_result__(self, result:_se_.SyncResult, max_errors:int=20) -> None:
+        ok = len(result.errors) == 0
+        self.__miniEditor.printout(result.get_summary() + '\n', "#73d216" if ok else "#ef2929")
+        for path, msg in result.errors[:max_errors]:
+            self.__miniEditor.printout(f"    {path}: {msg}\n", "#ef2929")
+        if len(result.errors) > max_errors:
+            self.__miniEditor.printout(f"    ... and {len(result.errors) - max_errors} more\n", "#ef2929")
+        return
+
+    def zip_dir_to_file(self, sourcedir_abspath:str, targetfile_abspath:str, forbidden_dirnames:Optional[List[str]], forbidden_filenames:Optional[List[str]], show_prog:bool, callback:Callable, callbackArg:object, callbackThread:QThread, exclusions:Optional[_ex_.ExclusionRules]=None) -> None:
         '''
         Zip the given folder into a .zip file.
 
         :param sourcedir_abspath:   Folder getting zipped. Must exist.
         :param targetfile_abspath:  Target .zip file. If exists, gets deleted first.
         :param show_prog:           Show a progressbar.
+        :param exclusions:          Entries to leave out, on top of the forbidden names. The zipper only
+                                    leaves out entries by name, so these must be plain names (see
+                                    ExclusionRules.get_names()).
         :param callback:            Provide a callback.
         :param callbackArg:         callbackArg=(success, callbackArg)
         :param callbackThread:      QThread you want the callback to run in.
@@ -1272,40 +2181,51 @@ class MiniConsole(QWidget):
         assert threading.current_thread() is not threading.main_thread()
         origthread = QThread.currentThread()
         def start():
-            QTimer.singleShot(50, dirzip)
+            QTimer.singleShot(0, dirzip)
             return
         def dirzip(*args):
+            try:
+                dirnames, filenames = _ex_.get_rules(exclusions).get_names()
+            except ValueError as e:
+                self.__miniEditor.printout(f"ERROR: {e}\n", "#ef2929")
+                finish(False)
+                return
+            dirnames  = list(forbidden_dirnames or []) + dirnames
+            filenames = list(forbidden_filenames or []) + filenames
             j: int    = 0    # Cntr on reporthook calls.
             jmax: int = 1    # Max for cntr, reporthook should update progressbar on overflow.
+            nr_files: int = 0
+            progbar_started: bool = False
             def reporthook(i, n):
-                nonlocal j, jmax
+                nonlocal j, jmax, nr_files, progbar_started
+                nr_files = n
                 j += 1
                 if j > jmax:
                     j = 0
                     jmax = int( n / 100.0)  # Calculate 'jmax' such that cntr overflow happens 100 times.
                     perc = 100.0 * (i / n)
                     if show_prog:
-                        if not self.__miniEditor.is_progbar_open():
+                        if not progbar_started:
+                            progbar_started = True
                             self.start_progbar("Zip:")
                         self.set_progbar_val(perc)
                 return
 
             success = _fp_.zip_dir_to_file(sourcedir_abspath=sourcedir_abspath,
                                            targetfile_abspath=targetfile_abspath,
-                                           forbidden_dirnames=forbidden_dirnames,
-                                           forbidden_filenames=forbidden_filenames,
+                                           forbidden_dirnames=dirnames,
+                                           forbidden_filenames=filenames,
                                            reporthook=reporthook,
                                            printfunc=self.get_printfunc(),
                                            catch_err=True,
                                            overwr=True)
-            if show_prog and self.__miniEditor.is_progbar_open():
+            if success and os.path.isfile(targetfile_abspath):
+                self.__step_stats__(nr_files=nr_files, nr_bytes=os.path.getsize(targetfile_abspath))
+            if progbar_started:
                 self.set_progbar_val(100.0)
                 self.close_progbar()
             self.__miniEditor.printout('\n')
-            if not success:
-                finish(False)
-                return
-            QTimer.singleShot(50, lambda: finish(True))
+            self.__when_progbar_closed__(finish, success)
             return
         def finish(success):
             assert QThread.currentThread() is origthread
@@ -1328,34 +2248,33 @@ class MiniConsole(QWidget):
         assert threading.current_thread() is not threading.main_thread()
         origthread = QThread.currentThread()
         def start():
-            QTimer.singleShot(50, dirunzip)
+            QTimer.singleShot(0, dirunzip)
             return
         def dirunzip(*args):
             j: int    = 0    # Cntr on reporthook calls.
             jmax: int = 1    # Max for cntr, reporthook should update progressbar on overflow.
+            progbar_started: bool = False
             def reporthook(i, n):
-                nonlocal j, jmax
+                nonlocal j, jmax, progbar_started
                 j += 1
                 if j > jmax:
                     j = 0
                     jmax = int( n / 100.0)  # Calculate 'jmax' such that cntr overflow happens 100 times.
                     perc = 100.0 * (i / n)
                     if show_prog:
-                        if not self.__miniEditor.is_progbar_open():
+                        if not progbar_started:
+                            progbar_started = True
                             self.start_progbar("Unzip:")
                         self.set_progbar_val(perc)
                 return
 
             success = _fp_.unzip_file_to_dir(sourcefile_abspath=spath, targetdir_abspath=dpath,
                                              reporthook=reporthook, printfunc=self.get_printfunc(), catch_err=True, overwr=True)
-            if show_prog and self.__miniEditor.is_progbar_open():
+            if progbar_started:
                 self.set_progbar_val(100.0)
                 self.close_progbar()
             self.__miniEditor.printout('\n')
-            if not success:
-                finish(False)
-                return
-            QTimer.singleShot(50, lambda: finish(True))
+            self.__when_progbar_closed__(finish, success)
             return
         def finish(success):
             assert QThread.currentThread() is origthread
@@ -1384,7 +2303,7 @@ class MiniConsole(QWidget):
             self.__miniEditor.printout(url, "#729fcf")
             self.__miniEditor.printout('\n')
             self.start_progbar("Download:") if show_prog else nop()
-            QTimer.singleShot(50, download)
+            QTimer.singleShot(0, download)
             return
         def download(*args):
             j:int    = 0    # Cntr on reporthook calls.
@@ -1410,7 +2329,7 @@ class MiniConsole(QWidget):
                 self.__miniEditor.printout(f"{e}\n", "#ef2929")
                 print("ERROR: Download interrupted\n")
                 print(f"{e}\n")
-                QTimer.singleShot(100, functools.partial(finish, False, None))
+                self.__when_progbar_closed__(finish, False, None)
                 return
             except urllib.error.HTTPError as e:
                 self.close_progbar() if show_prog else nop()
@@ -1419,7 +2338,7 @@ class MiniConsole(QWidget):
                 self.__miniEditor.printout(f"{e}\n", "#ef2929")
                 print("ERROR: HTTP error\n")
                 print(f"{e}\n")
-                QTimer.singleShot(100, functools.partial(finish, False, None))
+                self.__when_progbar_closed__(finish, False, None)
                 return
             except urllib.error.URLError as e:
                 self.close_progbar() if show_prog else nop()
@@ -1428,7 +2347,7 @@ class MiniConsole(QWidget):
                 self.__miniEditor.printout(f"{e}\n", "#ef2929")
                 print("ERROR: URL error\n")
                 print(f"{e}\n")
-                QTimer.singleShot(100, functools.partial(finish, False, None))
+                self.__when_progbar_closed__(finish, False, None)
                 return
             except socket.timeout as e:
                 self.close_progbar() if show_prog else nop()
@@ -1437,7 +2356,7 @@ class MiniConsole(QWidget):
                 self.__miniEditor.printout(f"{e}\n", "#ef2929")
                 print("ERROR: Timeout\n")
                 print(f"{e}\n")
-                QTimer.singleShot(100, functools.partial(finish, False, None))
+                self.__when_progbar_closed__(finish, False, None)
                 return
             except Exception as e:
                 self.close_progbar() if show_prog else nop()
@@ -1446,7 +2365,7 @@ class MiniConsole(QWidget):
                 self.__miniEditor.printout(f"{e}\n", "#ef2929")
                 print("ERROR: URL error\n")
                 print(f"{e}\n")
-                QTimer.singleShot(100, functools.partial(finish, False, None))
+                self.__when_progbar_closed__(finish, False, None)
                 return
 
             try:
@@ -1472,9 +2391,9 @@ class MiniConsole(QWidget):
                 self.__miniEditor.printout('\n')
                 self.__miniEditor.printout("ERROR: Could not print URL headers.\n", "#ef2929")
                 self.__miniEditor.printout(f"{e}\n", "#ef2929")
-                QTimer.singleShot(100, functools.partial(finish, False, None))
+                self.__when_progbar_closed__(finish, False, None)
                 return
-            QTimer.singleShot(100, functools.partial(finish, True, filepath))
+            self.__when_progbar_closed__(finish, True, filepath)
             return
         def finish(success, filepath):
             assert QThread.currentThread() is origthread
@@ -1485,6 +2404,42 @@ class MiniConsole(QWidget):
 
 # TODO: --------------------------------------------------------------------------------------------------------------
 
+class MiniConsole(ConsoleBase, QWidget):
+    startSignal = pyqtSignal()
+    closeSignal = pyqtSignal(bool)
+
+    set_extprogbar_val_sig = pyqtSignal(int)
+    set_extprogbar_max_sig = pyqtSignal(int)
+    set_extprogbar_inf_sig = pyqtSignal(bool)
+    set_extprogbar_txt_sig = pyqtSignal(str)
+
+    def __init__(self, title:str) -> None:
+        super().__init__()
+        assert threading.current_thread() is threading.main_thread()
+        self.setGeometry(100, 100, 1500, 600)
+        self.setWindowTitle(title)
+        self.setStyleSheet("QWidget { background-color: #ffffffff }")
+        self.__lyt = QVBoxLayout()
+        self.__lyt.setAlignment(Qt.AlignTop)
+        self.setLayout(self.__lyt)
+        # Mini console
+        editor = MiniEditor()
+        self.__init_console__(editor)
+        # Layouts
+        self.__lyt.addWidget(editor)
+        self.show()
+        return
+
+    def close(self) -> None:
+        QWidget.close(self)
+        return
+
+    def closeEvent(self, event:QCloseEvent) -> None:
+        self.__set_closed__()
+        super().closeEvent(event)
+        return
+
+
 class MiniEditor(QPlainTextEdit):
     printout_signal        = pyqtSignal(str, str)
     printout_html_signal   = pyqtSignal(str, str)
@@ -1516,10 +2471,10 @@ class MiniEditor(QPlainTextEdit):
         self.setReadOnly(True)
         self.verticalScrollBar().setStyleSheet(_sb_.get_verticalScrollBar_style())
         self.horizontalScrollBar().setStyleSheet(_sb_.get_horizontalScrollBar_style())
-        self.printout_signal.connect(self.printout)
-        self.printout_html_signal.connect(self.printout_html)
+        self.printout_signal.connect(self.__printout__)
+        self.printout_html_signal.connect(self.__printout_html__)
         self.clear_signal.connect(self.clear)
-        self.show_progbar_signal.connect(self.start_progbar)
+        self.show_progbar_signal.connect(self.__start_requested_progbar__)
         self.set_progbar_val_signal.connect(self.set_progbar_val)
         self.close_progbar_signal.connect(self.close_progbar)
         self.__progress_mutex__:threading.Lock = threading.Lock() # Indicates progressbar is 'on' (but could be nonbusy).
@@ -1528,6 +2483,10 @@ class MiniEditor(QPlainTextEdit):
         self.__tsize:int = 10
         self.__bsize:int = 50
         self.__minipop:MiniPopup = None
+        self.__output_listeners:List[Callable] = []
+        self.__progbar_waiters:List[Callable] = []
+        self.__progbar_waiters_lock = threading.Lock()
+        self.__progbar_requests:int = 0 # Progressbars requested with start_progbar() and not closed yet.
         return
 
     """
@@ -1538,13 +2497,20 @@ class MiniEditor(QPlainTextEdit):
         self.printout(outputStr)
         return
 
-    @pyqtSlot(str, str)
     def printout(self, outputStr:str, color:str="#ffffff") -> None:
+        self.__notify_output_listeners__(outputStr, False)
+        self.__printout__(outputStr, color)
+        return
+
+    @pyqtSlot(str, str)
+    def __printout__(self, outputStr:str, color:str="#ffffff") -> None:
         if not (threading.current_thread() is threading.main_thread()):
+            if _mt_.enabled:
+                _printout_emits.inc()
             self.printout_signal.emit(outputStr, color)
             return
         if self.__progress_mutex__.locked():
-            QTimer.singleShot(40, functools.partial(self.printout, outputStr, color))
+            self.__defer_printout__(self.__printout__, outputStr, color)
             return
         if self.__progress_busy__.locked():
             raise IOError("ERROR: Mini Console progressbar was busy.")
@@ -1557,13 +2523,20 @@ class MiniEditor(QPlainTextEdit):
         self.printout_html(outputStr)
         return
 
-    @pyqtSlot(str, str)
     def printout_html(self, outputStr:str, color:str="#ffffff") -> None:
+        self.__notify_output_listeners__(outputStr, True)
+        self.__printout_html__(outputStr, color)
+        return
+
+    @pyqtSlot(str, str)
+    def __printout_html__(self, outputStr:str, color:str="#ffffff") -> None:
         if not (threading.current_thread() is threading.main_thread()):
+            if _mt_.enabled:
+                _printout_emits.inc()
             self.printout_html_signal.emit(outputStr, color)
             return
         if self.__progress_mutex__.locked():
-            QTimer.singleShot(40, functools.partial(self.printout_html, outputStr, color))
+            self.__defer_printout__(self.__printout_html__, outputStr, color)
             return
         if self.__progress_busy__.locked():
             raise IOError("ERROR: Mini Console progressbar was busy.")
@@ -1584,20 +2557,72 @@ class MiniEditor(QPlainTextEdit):
         super().clear()
         return
 
+    def __defer_printout__(self, printfunc:Callable, outputStr:str, color:str) -> None:
+        '''
+        Retry the printout later, while the progressbar is busy.
+
+        '''
+        if _mt_.enabled:
+            _pending_printouts.inc()
+        def retry():
+            if _mt_.enabled:
+                _pending_printouts.dec()
+            printfunc(outputStr, color)
+            return
+        QTimer.singleShot(40, retry)
+        return
+
+    def add_output_listener(self, listener:Callable) -> None:
+        '''
+        Register a listener that gets every printout, right when it's issued (in the thread of the
+        caller, before the text is queued for rendering). This keeps the output in order with whatever
+        the caller does next.
+
+        :param listener:    Callable with parameters (outputStr:str, is_html:bool). Must be thread-safe.
+
+        '''
+        if listener not in self.__output_listeners:
+            self.__output_listeners = self.__output_listeners + [listener]
+        return
+
+    def remove_output_listener(self, listener:Callable) -> None:
+        self.__output_listeners = [l for l in self.__output_listeners if l != listener]
+        return
+
+    def __notify_output_listeners__(self, outputStr:str, is_html:bool) -> None:
+        for listener in self.__output_listeners:
+            listener(outputStr, is_html)
+        return
+
     """
     2. PROGRESS BAR
     """
     @pyqtSlot(str)
     def start_progbar(self, title:str) -> None:
         if not (threading.current_thread() is threading.main_thread()):
+            with self.__progbar_waiters_lock:
+                self.__progbar_requests += 1
             self.show_progbar_signal.emit(title)
             return
+        self.__start_progbar__(title, requested=False)
+        return
+
+    @pyqtSlot(str)
+    def __start_requested_progbar__(self, title:str) -> None:
+        self.__start_progbar__(title, requested=True)
+        return
+
+    def __start_progbar__(self, title:str, requested:bool) -> None:
+        # Count the request once, when it's made - not at every retry below.
+        if not requested:
+            with self.__progbar_waiters_lock:
+                self.__progbar_requests += 1
         if not self.__progress_mutex__.acquire(blocking=False):
-            QTimer.singleShot(10, functools.partial(self.start_progbar, title))
+            QTimer.singleShot(10, functools.partial(self.__start_progbar__, title, True))
             return
         if not self.__progress_busy__.acquire(blocking=False):
             self.__progress_mutex__.release()
-            QTimer.singleShot(10, functools.partial(self.start_progbar, title))
+            QTimer.singleShot(10, functools.partial(self.__start_progbar__, title, True))
             return
         assert self.__progress_mutex__.locked()
         assert self.__progress_busy__.locked()
@@ -1626,6 +2651,8 @@ class MiniEditor(QPlainTextEdit):
             self.__progress_busy__.release()
             return
         self.__progress_perc__ = fval
+        if _mt_.enabled:
+            _progbar_updates.inc()
         val:int = int( (self.__progress_perc__/100) * self.__bsize )
         cursor:QTextCursor = self.textCursor()
         cursor.beginEditBlock()
@@ -1657,15 +2684,43 @@ class MiniEditor(QPlainTextEdit):
             return
         self.moveCursor(QTextCursor.End)
         self.__progress_busy__.release()
+        closed = False
         try:
             self.__progress_mutex__.release()
+            closed = True
         except Exception as e:
             print("WARNING: close_progbar() tried to release self.__progress_mutex__ but it was already released!")
+        with self.__progbar_waiters_lock:
+            if closed:
+                self.__progbar_requests = max(0, self.__progbar_requests - 1)
+            if self.__progbar_requests > 0:
+                # Another progressbar got requested in the meantime: the waiters wait for that one too.
+                return
+            waiters, self.__progbar_waiters = self.__progbar_waiters, []
+        for waiter in waiters:
+            waiter()
         return
 
     def is_progbar_open(self) -> bool:
         return self.__progress_mutex__.locked()
 
+    def when_progbar_closed(self, waiter:Callable) -> None:
+        '''
+        Call waiter() once the progressbar is closed: right away (in the calling thread) if it isn't
+        open, otherwise from close_progbar() in the main thread.
+
+        A progressbar counts as open from the moment start_progbar() gets called, until close_progbar()
+        really closed it. From another thread, both are only queued to the main thread: a waiter added
+        right after them still waits for the bar to open and close.
+
+        '''
+        with self.__progbar_waiters_lock:
+            if self.__progbar_requests > 0:
+                self.__progbar_waiters.append(waiter)
+                return
+        waiter()
+        return
+
     """
     3. INTERNAL FUNCTIONS
     """
@@ -1696,6 +2751,7 @@ class MiniEditor(QPlainTextEdit):
         return
 
     def insertHtml(self, html:str, color:str="#ffffff") -> None:
+        t0 = time.perf_counter() if _mt_.enabled else 0.0
         html.replace('\n', '<br>')
         html = f"<span style=\"color:{color};\">" + html + "</span>"
         cursor = self.textCursor()
@@ -1709,6 +2765,8 @@ class MiniEditor(QPlainTextEdit):
                 cursor.insertBlock()  # Insert new block/paragraph.
         cursor.endEditBlock()   # End of undo/redo action.
         self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
+        if _mt_.enabled:
+            _render_time.observe(time.perf_counter() - t0)
         return
 
     # TODO: --------------------------------------------------------------------------------------------------------------
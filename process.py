@@ -3,7 +3,8 @@ from typing import *
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
-import os, time, re, data, threading, enum, sys
+import os, time, re, data, threading, enum, sys, subprocess
+import mini_console.metrics as _mt_
 nop = lambda *a, **k: None
 EOL = '\r\n' if os.name == "nt" else '\n'
 
@@ -23,6 +24,36 @@ class ProcessErr(enum.Enum):
 def get_prompts() -> List[str]:
     return ["(gdb)", ">>>", "..."]
 
+def run_blocking(args:List[str], cwd:str, linefunc:Callable[[str], None]=nop) -> Tuple[int, str]:
+    '''
+    Run a command outside the shared Process(), such that several of them can run at the same time
+    from background threads. Every output line (stdout and stderr) is passed on to 'linefunc'.
+    Returns (exitcode, complete output). A command that can't be started returns exitcode -1.
+
+    '''
+    try:
+        proc = subprocess.Popen(
+            args,
+            cwd      = cwd,
+            stdout   = subprocess.PIPE,
+            stderr   = subprocess.STDOUT,
+            stdin    = subprocess.DEVNULL,
+            text     = True,
+            encoding = 'utf-8',
+            errors   = 'replace',
+        )
+    except OSError as e:
+        linefunc(f"Cannot start {args[0]}: {e}\n")
+        return -1, ''
+    output = []
+    for line in proc.stdout:
+        output.append(line)
+        linefunc(line)
+    return proc.wait(), ''.join(output)
+
+_output_bytes  = _mt_.registry.counter("process.output_bytes")
+_output_chunks = _mt_.registry.counter("process.output_chunks")
+
 class Process(QProcess):
     output_sig      = pyqtSignal(str)   # Tied to body.__printout__().
     output_html_sig = pyqtSignal(str)   # Tied to body.__printout_html__().
@@ -268,7 +299,11 @@ class Process(QProcess):
         'NATIVE SIGNAL CATCHER'
         def catch_output():
             nonlocal prompt_candidate
-            _data_ = bytes(self.readAll()).decode().replace('\r\n', '\n')
+            _raw_ = bytes(self.readAll())
+            if _mt_.enabled:
+                _output_bytes.inc(len(_raw_))
+                _output_chunks.inc()
+            _data_ = _raw_.decode().replace('\r\n', '\n')
             eolIndex = _data_.rfind('\n')
             prompt_candidate = _data_[eolIndex + 1:] if eolIndex >= 0 else (prompt_candidate + _data_)
             prompt_candidate = prompt_candidate.strip()
@@ -0,0 +1,228 @@
+from __future__ import annotations
+from typing import *
+import os, re, sys, json, time, cProfile, threading
+
+class StepSpan:
+    '''
+    Timing of one step in a run.
+
+    '''
+    def __init__(self, name:str) -> None:
+        self.name:str         = name
+        self.start:float      = time.time()
+        self.wall:float       = 0.0   # Wall time [s]
+        self.cpu:float        = 0.0   # CPU time of this process (all threads) [s]
+        self.child_cpu:float  = 0.0   # CPU time of finished child processes [s]
+        self.nr_files:int     = 0     # Files processed (copied, deleted, compiled, ...)
+        self.nr_bytes:int     = 0     # Bytes processed
+        self.__t0             = time.perf_counter()
+        self.__cpu0           = time.process_time()
+        self.__child_cpu0     = get_child_cpu()
+        return
+
+    def stop(self) -> None:
+        self.wall      = time.perf_counter() - self.__t0
+        self.cpu       = time.process_time() - self.__cpu0
+        self.child_cpu = get_child_cpu() - self.__child_cpu0
+        return
+
+    def to_dict(self) -> Dict:
+        return {
+            "name"      : self.name,
+            "start"     : self.start,
+            "wall"      : self.wall,
+            "cpu"       : self.cpu,
+            "child_cpu" : self.child_cpu,
+            "files"     : self.nr_files,
+            "bytes"     : self.nr_bytes,
+        }
+
+def get_child_cpu() -> float:
+    '''
+    CPU time consumed by all child processes that have been waited for (always 0 on Windows).
+
+    '''
+    t = os.times()
+    return t.children_user + t.children_system
+
+class RunProfiler:
+    '''
+    Wrap each step of a run (eg. build_embeetle) in a timing span. Optionally, every sequential step
+    also gets its own cProfile capture. The capture only covers the thread that starts the step, which
+    is where the in-process steps (deleting, copying, zipping, ...) run. Steps that wait on an external
+    process show up in the 'child_cpu' column instead.
+
+    Parallel steps get overlapping spans, without cProfile capture. Their CPU columns overlap as well.
+    The capture is for sequential runs only: once a parallel step begins, it stops for the rest of the
+    run. Before Python 3.12, a profiler can only be stopped from its own thread, and parallel steps
+    begin in worker threads. So the capture of the step that was ongoing then gets dropped: it would
+    hold samples of later steps. Its thread stops it at its next call into the RunProfiler.
+
+    '''
+    def __init__(self, run_name:str, cprofile:bool=False) -> None:
+        self.__run_name = run_name
+        self.__use_cprofile = cprofile
+        self.__start:float = time.time()
+        self.__success:Optional[bool] = None
+        self.__spans:List[StepSpan] = []
+        self.__profiles:Dict[str, cProfile.Profile] = {}
+        self.__open:Dict[str, StepSpan] = {}
+        self.__sequential:Optional[StepSpan] = None
+        self.__current_prof:Optional[cProfile.Profile] = None
+        self.__prof_thread:Optional[int] = None   # Thread that enabled the current profiler.
+        self.__orphaned:List[Tuple[int, cProfile.Profile]] = []   # (thread, profiler) still to be stopped.
+        self.__lock = threading.Lock()
+        return
+
+    """
+    1. SPANS
+    """
+    def begin_step(self, name:str, parallel:bool=False) -> None:
+        '''
+        Open a new span. A sequential step first closes all ongoing spans. A parallel step only closes
+        the ongoing sequential span; it must be closed itself with end_step().
+
+        '''
+        with self.__lock:
+            self.__stop_orphaned__()
+            if parallel:
+                self.__use_cprofile = False
+                self.__stop_sequential__()
+            else:
+                self.__stop_all__()
+            span = StepSpan(name)
+            self.__spans.append(span)
+            self.__open[name] = span
+            if not parallel:
+                self.__sequential = span
+            if self.__use_cprofile and not parallel:
+                self.__current_prof = cProfile.Profile()
+                self.__profiles[name] = self.__current_prof
+                self.__prof_thread = threading.get_ident()
+                self.__current_prof.enable()
+        return
+
+    def end_step(self, name:str) -> None:
+        with self.__lock:
+            self.__stop_orphaned__()
+            span = self.__open.pop(name, None)
+            if span is not None:
+                span.stop()
+        return
+
+    def add_stats(self, nr_files:int=0, nr_bytes:int=0, name:Optional[str]=None) -> None:
+        '''
+        Add to the nr of files and bytes processed by the given step. Without a name, the ongoing
+        sequential step gets them.
+
+        '''
+        with self.__lock:
+            span = self.__sequential if name is None else self.__open.get(name)
+            if span is None:
+                return
+            span.nr_files += nr_files
+            span.nr_bytes += nr_bytes
+        return
+
+    def end(self, success:bool) -> None:
+        with self.__lock:
+            self.__stop_orphaned__()
+            self.__stop_all__()
+            self.__success = success
+        return
+
+    def get_start(self) -> float:
+        return self.__start
+
+    def get_success(self) -> Optional[bool]:
+        return self.__success
+
+    def get_run_name(self) -> str:
+        return self.__run_name
+
+    def get_spans(self) -> List[StepSpan]:
+        return list(self.__spans)
+
+    """
+    2. REPORT
+    """
+    def format_table(self) -> str:
+        '''
+        Return a per-step summary table of wall time and CPU time.
+
+        '''
+        # Parallel spans overlap, so the total is the elapsed time rather than the sum.
+        total_wall = 0.0
+        if len(self.__spans) > 0:
+            total_wall = max(s.start + s.wall for s in self.__spans) - min(s.start for s in self.__spans)
+        lines = [
+            f"{'Step':<22} {'Wall [s]':>10} {'CPU [s]':>10} {'Child CPU [s]':>14} {'Share':>7}",
+            f"{'-'*22} {'-'*10} {'-'*10} {'-'*14} {'-'*7}",
+        ]
+        for s in self.__spans:
+            share = (100.0 * s.wall / total_wall) if total_wall > 0 else 0.0
+            lines.append(f"{s.name:<22} {s.wall:>10.2f} {s.cpu:>10.2f} {s.child_cpu:>14.2f} {share:>6.1f}%")
+        lines.append(f"{'-'*22} {'-'*10} {'-'*10} {'-'*14} {'-'*7}")
+        lines.append(
+            f"{'TOTAL':<22} {total_wall:>10.2f} {sum(s.cpu for s in self.__spans):>10.2f} "
+            f"{sum(s.child_cpu for s in self.__spans):>14.2f} {'':>7}"
+        )
+        return '\n'.join(lines) + '\n'
+
+    def save(self, dirpath:str) -> str:
+        '''
+        Append the timings of this run as one JSON line to '<dirpath>/profiles.jsonl'. The cProfile
+        captures (if any) are dumped next to it as '<run>_<timestamp>_<step>.prof'.
+        Returns the path to the .jsonl file.
+
+        '''
+        os.makedirs(dirpath, exist_ok=True)
+        stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(self.__start))
+        prof_files = {}
+        for stepname, prof in self.__profiles.items():
+            filename = f"{self.__run_name}_{stamp}_{re.sub(r'[^A-Za-z0-9_]+', '_', stepname)}.prof"
+            prof.dump_stats(os.path.join(dirpath, filename))
+            prof_files[stepname] = filename
+        filepath = os.path.join(dirpath, "profiles.jsonl").replace('\\', '/')
+        with open(filepath, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                "run"     : self.__run_name,
+                "start"   : self.__start,
+                "success" : self.__success,
+                "steps"   : [s.to_dict() for s in self.__spans],
+                "cprofile": prof_files,
+            }) + '\n')
+        return filepath
+
+    """
+    3. INTERNAL FUNCTIONS
+    """
+    def __stop_sequential__(self) -> None:
+        if self.__current_prof is not None:
+            if (threading.get_ident() == self.__prof_thread) or (sys.version_info >= (3, 12)):
+                self.__current_prof.disable()
+            else:
+                # Only its own thread can stop it. Until then, it catches samples of other steps.
+                self.__orphaned.append((self.__prof_thread, self.__current_prof))
+                self.__profiles = {k: v for k, v in self.__profiles.items() if v is not self.__current_prof}
+            self.__current_prof = None
+            self.__prof_thread  = None
+        if self.__sequential is not None:
+            self.__open.pop(self.__sequential.name, None)
+            self.__sequential.stop()
+            self.__sequential = None
+        return
+
+    def __stop_orphaned__(self) -> None:
+        me = threading.get_ident()
+        for thread, prof in [o for o in self.__orphaned if o[0] == me]:
+            prof.disable()
+        self.__orphaned = [o for o in self.__orphaned if o[0] != me]
+        return
+
+    def __stop_all__(self) -> None:
+        self.__stop_sequential__()
+        for span in self.__open.values():
+            span.stop()
+        self.__open.clear()
+        return
@@ -0,0 +1,119 @@
+from __future__ import annotations
+from typing import *
+import os, stat, time, concurrent.futures
+nop = lambda *a, **k: None
+
+class PurgeResult:
+    '''
+    Outcome of purge_files().
+
+    '''
+    def __init__(self) -> None:
+        self.nr_files:int = 0                    # Nr of deleted files.
+        self.nr_bytes:int = 0                    # Bytes freed.
+        self.errors:List[Tuple[str, str]] = []   # (path, error message) for everything that failed.
+        self.deleted:List[str] = []              # Deleted files, only filled in with keep_list=True.
+        self.seconds:float = 0.0
+        return
+
+    def get_summary(self, what:str="files") -> str:
+        return (
+            f"Deleted {self.nr_files:,} {what} ({format_size(self.nr_bytes)}) in {self.seconds:.2f}s, "
+            f"{len(self.errors)} error{'' if len(self.errors) == 1 else 's'}"
+        )
+
+def format_size(nbytes:int) -> str:
+    size = float(nbytes)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024.0 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024.0
+    return ''
+
+def find_files(dirpath:str, match:Callable[[str], bool]) -> Tuple[List[Tuple[str, int]], List[Tuple[str, str]]]:
+    '''
+    Walk the given directory with os.scandir() and return:
+        - (path, size) of every file whose name matches
+        - (path, error message) of every directory that couldn't be read
+    A missing directory gives an empty result: there is nothing to purge.
+
+    '''
+    files:List[Tuple[str, int]]  = []
+    errors:List[Tuple[str, str]] = []
+    if not os.path.isdir(dirpath):
+        return files, errors
+    stack = [dirpath]
+    while len(stack) > 0:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif match(entry.name):
+                            files.append((entry.path.replace('\\', '/'), entry.stat(follow_symlinks=False).st_size))
+                    except OSError as e:
+                        errors.append((entry.path.replace('\\', '/'), e.strerror or str(e)))
+        except OSError as e:
+            errors.append((d.replace('\\', '/'), e.strerror or str(e)))
+    return files, errors
+
+def unlink(filepath:str) -> None:
+    try:
+        os.unlink(filepath)
+    except PermissionError:
+        # Read-only files can't be deleted on Windows.
+        os.chmod(filepath, stat.S_IWRITE)
+        os.unlink(filepath)
+    return
+
+def purge_files(dirpath:str,
+                match:Callable[[str], bool],
+                max_workers:int=8,
+                batch_size:int=256,
+                keep_list:bool=False,
+                progress:Callable[[float], None]=nop) -> PurgeResult:
+    '''
+    Delete all files below 'dirpath' whose name matches. The files get unlinked in batches from a
+    thread pool, which pays off on disks (and virus scanners) with a high per-file latency. Nothing
+    gets printed: the caller reports the returned PurgeResult().
+
+    :param match:       match(filename) -> True if the file must go.
+    :param keep_list:   Keep the paths of the deleted files in the result.
+    :param progress:    Called with the fraction done (0.0-1.0) after every batch.
+
+    '''
+    t0 = time.perf_counter()
+    result = PurgeResult()
+    files, result.errors = find_files(dirpath, match)
+    batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+
+    def unlink_batch(batch:List[Tuple[str, int]]) -> Tuple[int, int, List[Tuple[str, str]], List[str]]:
+        nr, nbytes, errors, deleted = 0, 0, [], []
+        for filepath, size in batch:
+            try:
+                unlink(filepath)
+            except OSError as e:
+                errors.append((filepath, e.strerror or str(e)))
+                continue
+            nr     += 1
+            nbytes += size
+            if keep_list:
+                deleted.append(filepath)
+        return nr, nbytes, errors, deleted
+
+    nr_handled = 0
+    if len(batches) > 0:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as pool:
+            futures = {pool.submit(unlink_batch, b): len(b) for b in batches}
+            for future in concurrent.futures.as_completed(futures):
+                nr, nbytes, errors, deleted = future.result()
+                result.nr_files += nr
+                result.nr_bytes += nbytes
+                result.errors   += errors
+                result.deleted  += deleted
+                nr_handled += futures[future]
+                progress(nr_handled / len(files))
+    result.seconds = time.perf_counter() - t0
+    return result
@@ -0,0 +1,314 @@
+from __future__ import annotations
+from typing import *
+import os, re, stat, platform, threading, subprocess
+import data
+import bpathlib.path_power     as _pp_
+import mini_console.build_dirs as _bd_
+import mini_console.exclusions as _ex_
+nop = lambda *a, **k: None
+
+def get_rsync_folder() -> str:
+    return _pp_.rel_to_abs(rootpath=data.tools_directory, relpath=f"{platform.system()}/rsync")
+
+def get_rsync_path() -> str:
+    return _pp_.rel_to_abs(rootpath=get_rsync_folder(), relpath="rsync.exe")
+
+def get_ssh_path() -> str:
+    if platform.system() == "Windows":
+        return _pp_.rel_to_abs(rootpath=get_rsync_folder(), relpath="ssh.exe")
+    return "ssh"
+
+def get_ssh_control_options(control_persist:int) -> List[str]:
+    '''
+    SSH options that multiplex all connections to the same user@host:port over one master connection.
+    The first ssh (eg. the one of the rsync dry-run) sets it up, the next ones skip the TCP, key
+    exchange and authentication round-trips. The master stays in the background for 'control_persist'
+    seconds after its last client quit. Returns [] if 'control_persist' is 0, or on Windows, where the
+    bundled ssh can't share connections.
+
+    '''
+    if (control_persist <= 0) or (platform.system() == "Windows"):
+        return []
+    dirpath = _bd_.get_ssh_control_dirpath()
+    try:
+        os.makedirs(dirpath, mode=0o700, exist_ok=True)
+        st = os.lstat(dirpath)
+        # Other users must not be able to hijack the sockets.
+        if (not stat.S_ISDIR(st.st_mode)) or (st.st_uid != os.getuid()):
+            return []
+        if stat.S_IMODE(st.st_mode) != 0o700:
+            os.chmod(dirpath, 0o700)
+    except OSError:
+        return []
+    return [
+        "ControlMaster=auto",
+        f"ControlPath={dirpath}/%C",
+        f"ControlPersist={control_persist}",
+    ]
+
+def get_ssh_cmd_str(keypath:str, known_hosts_filepath:str, control_options:Iterable[str]=()) -> str:
+    '''
+    Remote shell for rsync's '-e' option, as it goes into an rsync command string (quotes included).
+
+    :param control_options:     See get_ssh_control_options().
+
+    '''
+    options = [f"UserKnownHostsFile={known_hosts_filepath}", *control_options]
+    return f"\"'{get_ssh_path()}' -i '{keypath}'" + ''.join(f" -o '{o}'" for o in options) + "\""
+
+def get_ssh_exit_args(remote:str) -> List[str]:
+    '''
+    Command that stops the master connection to 'remote' (user@host), if there is one.
+
+    '''
+    args = [get_ssh_path(), "-O", "exit"]
+    for o in get_ssh_control_options(1):
+        if o.startswith("ControlPath="):
+            args += ["-o", o]
+    return args + [remote]
+
+def to_cygdrive(path:str) -> str:
+    '''
+    Convert a Windows drive path into the form the bundled (cygwin) rsync understands:
+        C:/foo/bar  ->  /cygdrive/c/foo/bar
+
+    '''
+    return re.sub(r"^([A-Za-z]):", lambda m: f"/cygdrive/{m.group(1).lower()}", path)
+
+def get_exclusions_str(exclusions:Union[None, Iterable[str], _ex_.ExclusionRules]) -> str:
+    '''
+    Exclusions as they go into an rsync command string.
+
+    '''
+    return _ex_.get_rules(exclusions).get_rsync_str()
+
+def get_exclusions_args(exclusions:Union[None, Iterable[str], _ex_.ExclusionRules]) -> List[str]:
+    '''
+    Exclusions as they go into an rsync argument list.
+
+    '''
+    return _ex_.get_rules(exclusions).get_rsync_args()
+
+def parse_nr_transfers(log:str) -> int:
+    '''
+    Parse the output of 'rsync --stats' and return the nr of created + deleted files.
+    Raises ValueError if the statistics are not found.
+
+    '''
+    nrs = []
+    for label in ("Number of created files:", "Number of deleted files:"):
+        match = re.search(rf"({label})\s*([\d,]+)", log, re.MULTILINE)
+        if match is None:
+            raise ValueError(f"'{label}' not found in rsync output")
+        nrs.append(int(match.group(2).replace(',', '')))
+    return sum(nrs)
+
+# Options for a single-pass run: rsync reports its overall progress itself, so no dry-run is needed
+# to size the progressbar. Without incremental recursion, the file list is complete before the
+# transfer starts and the 'to-chk' totals are exact. The statistics at the end replace those of the
+# dry-run. Needs rsync 3.1 or later.
+PROGRESS_ARGS = ["--info=progress2", "--no-inc-recursive", "--stats"]
+
+def get_progress_str() -> str:
+    return ' '.join(PROGRESS_ARGS)
+
+_versions:Dict[str, Optional[Tuple[int, int]]] = {}
+_versions_lock = threading.Lock()
+
+def get_rsync_version(rsyncpath:Optional[str]=None) -> Optional[Tuple[int, int]]:
+    '''
+    Return the (major, minor) version of the given rsync (default: the bundled one), or None if it
+    can't be told. 'rsync --version' runs once per path, the answer gets cached.
+
+    '''
+    if rsyncpath is None:
+        rsyncpath = get_rsync_path()
+    with _versions_lock:
+        if rsyncpath in _versions:
+            return _versions[rsyncpath]
+    version = None
+    try:
+        proc = subprocess.run([rsyncpath, "--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              stdin=subprocess.DEVNULL, text=True, errors='replace', timeout=10)
+        match = re.search(r"rsync\s+version\s+v?(\d+)\.(\d+)", proc.stdout)
+        if match is not None:
+            version = (int(match.group(1)), int(match.group(2)))
+    except (OSError, subprocess.SubprocessError):
+        pass
+    with _versions_lock:
+        _versions[rsyncpath] = version
+    return version
+
+def supports_progress_args(rsyncpath:Optional[str]=None) -> bool:
+    '''
+    True if the given rsync (default: the bundled one) accepts PROGRESS_ARGS. Older versions, and
+    those that don't tell their version, reject '--info=progress2'.
+
+    '''
+    version = get_rsync_version(rsyncpath)
+    return (version is not None) and (version >= (3, 1))
+
+def get_progress_args(rsyncpath:Optional[str]=None) -> List[str]:
+    '''
+    PROGRESS_ARGS if the given rsync accepts them, otherwise only '--stats': the progress then jumps
+    to the end when rsync is done.
+
+    '''
+    return PROGRESS_ARGS if supports_progress_args(rsyncpath) else ["--stats"]
+
+_progress_pattern = re.compile(
+    r"^\s*([\d,.]+)\s+(\d+)%\s+(\S+/s)\s+(\d+:\d{2}:\d{2})"
+    r"(?:\s+\(xfe?r#(\d+),\s*(?:to|ir)-ch(?:ec)?k=(\d+)/(\d+)\))?\s*$"
+)
+
+class RsyncProgress:
+    '''
+    One '--info=progress2' record:
+        1,234,567  45%   10.00MB/s    0:00:12 (xfr#12, to-chk=1000/2000)
+
+    or one per-file '--progress' record (the suffix only comes with the last record of each file, and
+    is spelled 'xfer#'/'to-check' before rsync 3.1):
+          567,890 100%    9.50MB/s    0:00:01 (xfer#3, to-check=17/20)
+
+    '''
+    def __init__(self, nr_bytes:int, percent:int, rate:str, eta:str, nr_done:int, nr_total:int) -> None:
+        self.nr_bytes = nr_bytes    # Bytes transferred so far.
+        self.percent  = percent     # Overall progress, as computed by rsync.
+        self.rate     = rate        # eg. '10.00MB/s'
+        self.eta      = eta         # eg. '0:00:12' (the elapsed time in the last record)
+        self.nr_done  = nr_done     # Nr of files checked so far, -1 if unknown.
+        self.nr_total = nr_total    # Nr of files to check, -1 if unknown.
+        return
+
+def parse_progress(line:str) -> Optional[RsyncProgress]:
+    '''
+    Parse a '--info=progress2' or '--progress' record. Return None for any other line.
+
+    '''
+    match = _progress_pattern.match(line)
+    if match is None:
+        return None
+    nr_done, nr_total = -1, -1
+    if match.group(7) is not None:
+        nr_total = int(match.group(7))
+        nr_done  = nr_total - int(match.group(6))
+    return RsyncProgress(
+        nr_bytes = int(re.sub(r"[,.]", '', match.group(1))),
+        percent  = int(match.group(2)),
+        rate     = match.group(3),
+        eta      = match.group(4),
+        nr_done  = nr_done,
+        nr_total = nr_total,
+    )
+
+class ProgressFilter:
+    '''
+    Split the output of a single-pass rsync run into the text to be shown and the progress records.
+    Rsync rewrites its progress line with carriage returns, which would flood the console. The output
+    arrives in arbitrary chunks, so an incomplete line is held back until the next one.
+
+    '''
+    def __init__(self, on_record:Callable[[RsyncProgress], None]=nop) -> None:
+        '''
+        :param on_record:   Called for every progress record, not just the latest one of each chunk.
+
+        '''
+        self.__tail:str = ''
+        self.__on_record = on_record
+        return
+
+    def feed(self, chunk:str) -> Tuple[str, Optional[RsyncProgress]]:
+        '''
+        Return the text to be shown and the latest progress record in this chunk (None if there's
+        none).
+
+        '''
+        data = self.__tail + chunk
+        # A trailing '\r' could be the first half of '\r\n'.
+        end = max(data.rfind('\n'), data.rfind('\r', 0, len(data) - 1))
+        self.__tail = data[end + 1:]
+        text, progress = [], None
+        for line, sep in re.findall(r"([^\r\n]*)(\r\n|\r|\n)", data[:end + 1]):
+            p = parse_progress(line)
+            if p is not None:
+                progress = p
+                self.__on_record(p)
+                continue
+            if (sep == '\r') and (line == ''):
+                continue
+            text.append(line + '\n')
+        return ''.join(text), progress
+
+    def flush(self) -> str:
+        '''
+        Return the text that was held back.
+
+        '''
+        text, self.__tail = self.__tail, ''
+        return '' if parse_progress(text) is not None else text
+
+def parse_total_size(log:str) -> int:
+    '''
+    Parse the output of 'rsync --stats' and return the total size of the source files.
+    Raises ValueError if the statistics are not found.
+
+    '''
+    match = re.search(r"Total file size:\s*([\d,.]+)", log)
+    if match is None:
+        raise ValueError("'Total file size:' not found in rsync output")
+    return int(re.sub(r"[,.]", '', match.group(1)))
+
+def parse_transferred_size(log:str) -> int:
+    '''
+    Parse the output of 'rsync --stats' and return the nr of bytes in the files that get (or, for a
+    dry-run, would get) transferred. Raises ValueError if the statistics are not found.
+
+    '''
+    match = re.search(r"Total transferred file size:\s*([\d,.]+)", log)
+    if match is None:
+        raise ValueError("'Total transferred file size:' not found in rsync output")
+    return int(re.sub(r"[,.]", '', match.group(1)))
+
+class FileProgressSum:
+    '''
+    Sum the per-file '--progress' records into the nr of bytes transferred so far, for rsync versions
+    without '--info=progress2'.
+
+    '''
+    def __init__(self) -> None:
+        self.__done:int    = 0   # Bytes in the files that are complete.
+        self.__current:int = 0   # Bytes of the file in transfer.
+        return
+
+    def add(self, progress:RsyncProgress) -> int:
+        if progress.nr_total >= 0:
+            # Last record of a file.
+            self.__done += progress.nr_bytes
+            self.__current = 0
+        else:
+            self.__current = progress.nr_bytes
+        return self.__done + self.__current
+
+class ShardProgress:
+    '''
+    Merge the progress of several concurrent rsync processes - one per shard - into one fraction.
+    Each shard weighs in with its expected size.
+
+    '''
+    def __init__(self, weights:Dict[str, float]) -> None:
+        self.__weights   = dict(weights)
+        self.__total     = sum(self.__weights.values())
+        self.__fractions = {name: 0.0 for name in self.__weights}
+        self.__lock      = threading.Lock()
+        return
+
+    def update(self, name:str, fraction:float) -> float:
+        '''
+        Set the progress of the given shard (0.0-1.0) and return the overall progress.
+
+        '''
+        with self.__lock:
+            self.__fractions[name] = max(self.__fractions[name], min(1.0, fraction))
+            if self.__total <= 0:
+                return sum(self.__fractions.values()) / max(1, len(self.__fractions))
+            return sum(self.__weights[n] * f for n, f in self.__fractions.items()) / self.__total
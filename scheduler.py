@@ -0,0 +1,233 @@
+from __future__ import annotations
+from typing import *
+import threading, concurrent.futures
+nop = lambda *a, **k: None
+
+class Step:
+    '''
+    One node in a step graph.
+
+    There are two kinds of steps:
+        > Callback steps (blocking=False):
+          func(done, progress) gets called in the scheduler thread. It starts the work and returns
+          immediately. Later on - from whatever thread - it calls done(success).
+        > Blocking steps (blocking=True):
+          func(progress) -> bool runs in a worker thread of the scheduler's thread pool. Its return
+          value is the success. An exception counts as a failure.
+
+    In both cases, progress(fraction) can be called from any thread with 0.0 <= fraction <= 1.0.
+
+    '''
+    def __init__(self, name:str,
+                       func:Callable,
+                       deps:Iterable[str]=(),
+                       blocking:bool=False,
+                       exclusive:bool=False,
+                       weight:float=1.0) -> None:
+        '''
+        :param name:        Unique name of the step.
+        :param func:        See above.
+        :param deps:        Names of the steps that must succeed before this one can start.
+        :param blocking:    See above.
+        :param exclusive:   The step needs a resource that can't be shared (eg. the console's Process()
+                            or the cwd). Two exclusive steps never run at the same time.
+        :param weight:      Relative share of this step in the aggregated progress.
+
+        '''
+        self.name      = name
+        self.func      = func
+        self.deps      = tuple(deps)
+        self.blocking  = blocking
+        self.exclusive = exclusive
+        self.weight    = weight
+        return
+
+class StepScheduler:
+    '''
+    Run a graph of steps. Steps whose dependencies have all succeeded start as soon as a worker slot is
+    free, up to 'max_workers' steps at the same time. Ready steps start in the order of the 'steps'
+    list, so with max_workers=1 the graph runs one step after the other - just like a callback chain.
+
+    When a step fails, no new steps get started. As soon as the running ones have finished, on_finish()
+    gets called with False.
+
+    All bookkeeping runs in the scheduler thread: the thread that calls start(). Completions coming from
+    other threads get handed over to it with the 'post' function.
+
+    '''
+    def __init__(self, steps:List[Step],
+                       max_workers:int,
+                       post:Callable[[Callable], None],
+                       on_finish:Callable[[bool], None],
+                       on_step_finish:Callable[[str, bool], None]=nop,
+                       on_progress:Callable[[float], None]=nop,
+                       done_steps:Iterable[str]=()) -> None:
+        '''
+        :param steps:           Steps of the graph.
+        :param max_workers:     Max nr of steps running at the same time.
+        :param post:            post(func) must call func() in the scheduler thread.
+        :param on_finish:       Called once at the end.        @param: (success)
+        :param on_step_finish:  Called after each step.        @param: (name, success)
+        :param on_progress:     Aggregated progress (0.0-1.0). @param: (fraction) - from any thread!
+        :param done_steps:      Steps that already succeeded in an earlier run. They don't run again,
+                                but count as succeeded for the steps depending on them.
+
+        '''
+        assert max_workers >= 1
+        self.__steps:Dict[str, Step] = {}
+        for step in steps:
+            if step.name in self.__steps:
+                raise ValueError(f"Duplicate step '{step.name}'")
+            self.__steps[step.name] = step
+        for step in steps:
+            for dep in step.deps:
+                if dep not in self.__steps:
+                    raise ValueError(f"Step '{step.name}' depends on unknown step '{dep}'")
+        self.__check_cycles__()
+        self.__order:List[str]  = [s.name for s in steps]
+        self.__max_workers      = max_workers
+        self.__post             = post
+        self.__on_finish        = on_finish
+        self.__on_step_finish   = on_step_finish
+        self.__on_progress      = on_progress
+        done_steps = set(done_steps)
+        for name in done_steps:
+            if name not in self.__steps:
+                raise ValueError(f"Unknown done step '{name}'")
+        self.__pending:List[str]   = [name for name in self.__order if name not in done_steps]
+        self.__running:Set[str]    = set()
+        self.__succeeded:Set[str]  = set(done_steps)
+        self.__failed:bool         = False
+        self.__finished:bool       = False
+        self.__scheduling:bool     = False
+        self.__reschedule:bool     = False
+        self.__errors:Dict[str, BaseException] = {}
+        self.__progress:Dict[str, float] = {name: (1.0 if name in self.__succeeded else 0.0) for name in self.__order}
+        self.__progress_lock       = threading.Lock()
+        self.__pool:Optional[concurrent.futures.ThreadPoolExecutor] = None
+        return
+
+    """
+    1. RUN
+    """
+    def start(self) -> None:
+        if any(s.blocking for s in self.__steps.values()):
+            self.__pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix="step")
+        self.__schedule__()
+        return
+
+    def get_errors(self) -> Dict[str, BaseException]:
+        '''
+        Exceptions raised by blocking steps, per step name.
+
+        '''
+        return dict(self.__errors)
+
+    """
+    2. INTERNAL FUNCTIONS
+    """
+    def __schedule__(self) -> None:
+        # A callback step can report back before its func() even returns. The nested call then only
+        # flags that another scheduling pass is needed.
+        if self.__scheduling:
+            self.__reschedule = True
+            return
+        self.__scheduling = True
+        try:
+            self.__reschedule = True
+            while self.__reschedule and not self.__finished:
+                self.__reschedule = False
+                self.__schedule_pass__()
+        finally:
+            self.__scheduling = False
+        return
+
+    def __schedule_pass__(self) -> None:
+        if self.__failed or (len(self.__pending) == 0):
+            if len(self.__running) == 0:
+                self.__finish__(not self.__failed)
+            return
+        for name in list(self.__pending):
+            if self.__failed or (len(self.__running) >= self.__max_workers):
+                break
+            step = self.__steps[name]
+            if not all(dep in self.__succeeded for dep in step.deps):
+                continue
+            if step.exclusive and any(self.__steps[r].exclusive for r in self.__running):
+                continue
+            self.__pending.remove(name)
+            self.__running.add(name)
+            self.__launch__(step)
+        return
+
+    def __launch__(self, step:Step) -> None:
+        called = False
+        def done(success:bool) -> None:
+            nonlocal called
+            assert not called, f"Step '{step.name}' reported twice"
+            called = True
+            self.__post(lambda: self.__step_done__(step, bool(success)))
+            return
+        def progress(fraction:float) -> None:
+            self.__set_progress__(step.name, fraction)
+            return
+        if not step.blocking:
+            step.func(done, progress)
+            return
+        def run_blocking() -> None:
+            try:
+                success = step.func(progress)
+            except BaseException as e:
+                self.__errors[step.name] = e
+                success = False
+            done(success)
+            return
+        self.__pool.submit(run_blocking)
+        return
+
+    def __step_done__(self, step:Step, success:bool) -> None:
+        self.__running.discard(step.name)
+        if success:
+            self.__succeeded.add(step.name)
+            self.__set_progress__(step.name, 1.0)
+        else:
+            self.__failed = True
+        self.__on_step_finish(step.name, success)
+        self.__schedule__()
+        return
+
+    def __finish__(self, success:bool) -> None:
+        self.__finished = True
+        if self.__pool is not None:
+            self.__pool.shutdown(wait=False)
+            self.__pool = None
+        self.__on_finish(success)
+        return
+
+    def __set_progress__(self, name:str, fraction:float) -> None:
+        total_weight = sum(s.weight for s in self.__steps.values())
+        if total_weight <= 0:
+            return
+        with self.__progress_lock:
+            self.__progress[name] = min(1.0, max(0.0, fraction))
+            total = sum(self.__steps[n].weight * f for n, f in self.__progress.items())
+        self.__on_progress(total / total_weight)
+        return
+
+    def __check_cycles__(self) -> None:
+        visiting:Set[str] = set()
+        visited:Set[str]  = set()
+        def visit(name:str) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Step graph has a cycle through '{name}'")
+            visiting.add(name)
+            for dep in self.__steps[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+            return
+        for name in self.__steps:
+            visit(name)
+        return
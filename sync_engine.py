@@ -0,0 +1,641 @@
+from __future__ import annotations
+from typing import *
+import os, sys, copy, stat, time, errno, shutil, threading, concurrent.futures
+import mini_console.purge       as _pg_
+import mini_console.build_cache as _bc_
+import mini_console.exclusions  as _ex_
+nop = lambda *a, **k: None
+
+# An entry describes one item of a tree: (kind, size, mtime_ns, mode, linktarget). The kind is 'f' for
+# a file, 'd' for a directory and 'l' for a symlink. The linktarget is None unless it's a symlink.
+Entry = Tuple[str, int, int, int, Optional[str]]
+
+"""
+1. SCANNING
+"""
+class TreeSnapshot:
+    '''
+    The directory listings of a tree right after it was synced, together with the mtime of each
+    directory:
+
+        {
+            "version": 1,
+            "time": <timestamp of the scan>,
+            "dirs": {
+                "<reldir>": [<mtime_ns>, {"<name>": <Entry>, ...}],    # '' is the root
+                ...
+            }
+        }
+
+    Adding, removing or renaming an entry changes the mtime of its directory, so a directory whose
+    mtime didn't change still has the same listing. Its subdirectories must still be checked, but the
+    entries themselves don't need to be read again. A file that gets rewritten in place doesn't
+    change the mtime of its directory, though: a snapshot assumes that files get replaced, as build
+    tools and version control do.
+
+    '''
+    VERSION = 1
+    # Directories modified this close to the scan may change again within the same mtime tick, so
+    # their listing is never trusted.
+    RACY_SECONDS = 2.0
+
+    def __init__(self, dirs:Optional[Dict[str, List]]=None, taken:float=0.0) -> None:
+        self.__dirs  = dirs if dirs is not None else {}
+        self.__taken = taken
+        return
+
+    def get_listing(self, reldir:str, mtime_ns:int) -> Optional[Dict[str, Entry]]:
+        '''
+        Return the listing of the given directory, if it can be trusted for the given mtime.
+
+        '''
+        cached = self.__dirs.get(reldir)
+        if (cached is None) or (cached[0] != mtime_ns):
+            return None
+        if mtime_ns >= (self.__taken - self.RACY_SECONDS) * 1e9:
+            return None
+        return cached[1]
+
+    @classmethod
+    def load(cls, filepath:str) -> Optional[TreeSnapshot]:
+        data = _bc_.load_json(filepath, cls.VERSION)
+        if data is None:
+            return None
+        return cls(data.get("dirs", {}), data.get("time", 0.0))
+
+    def save(self, filepath:str) -> None:
+        _bc_.save_json(filepath, {"version": self.VERSION, "time": self.__taken, "dirs": self.__dirs})
+        return
+
+def scan(dirpath:str,
+         exclusions:Union[None, Iterable[str], _ex_.ExclusionRules]=None,
+         previous:Optional[TreeSnapshot]=None,
+         listings:Optional[Dict[str, List]]=None) -> Tuple[Dict[str, Entry], List[Tuple[str, str]]]:
+    '''
+    Walk the given directory with os.scandir() and return:
+        - relpath -> Entry() for everything in it, the root itself excluded
+        - (path, error message) for everything that couldn't be read
+    Excluded directories don't get entered. A missing directory gives an empty result.
+
+    :param previous:    Snapshot of the tree. The listings of the directories whose mtime didn't
+                        change get taken from it, instead of being read again.
+    :param listings:    Dictionary that gets filled in with the (filtered) listing of every directory,
+                        in the form of TreeSnapshot().
+
+    '''
+    entries:Dict[str, Entry] = {}
+    errors:List[Tuple[str, str]] = []
+    if not os.path.isdir(dirpath):
+        return entries, errors
+    rules = _ex_.get_rules(exclusions)
+    stack = ['']
+    while len(stack) > 0:
+        reldir = stack.pop()
+        absdir = os.path.join(dirpath, reldir)
+        listing:Optional[Dict[str, Entry]] = None
+        try:
+            mtime_ns = os.stat(absdir).st_mtime_ns
+        except OSError as e:
+            errors.append((absdir.replace('\\', '/'), e.strerror or str(e)))
+            continue
+        if previous is not None:
+            listing = previous.get_listing(reldir, mtime_ns)
+        if listing is None:
+            listing = {}
+            try:
+                with os.scandir(absdir) as it:
+                    for entry in it:
+                        relpath = f"{reldir}/{entry.name}" if reldir else entry.name
+                        try:
+                            # The entry type comes with the listing on most systems: excluded
+                            # entries don't get stat'ed.
+                            if rules.is_excluded(relpath, entry.is_dir(follow_symlinks=False)):
+                                continue
+                            st = entry.stat(follow_symlinks=False)
+                            if stat.S_ISLNK(st.st_mode):
+                                listing[entry.name] = ('l', 0, st.st_mtime_ns, st.st_mode, os.readlink(entry.path))
+                            elif stat.S_ISDIR(st.st_mode):
+                                listing[entry.name] = ('d', 0, st.st_mtime_ns, st.st_mode, None)
+                            else:
+                                listing[entry.name] = ('f', st.st_size, st.st_mtime_ns, st.st_mode, None)
+                        except OSError as e:
+                            errors.append((entry.path.replace('\\', '/'), e.strerror or str(e)))
+            except OSError as e:
+                errors.append((absdir.replace('\\', '/'), e.strerror or str(e)))
+                continue
+        if listings is not None:
+            listings[reldir] = [mtime_ns, listing]
+        for name, e in listing.items():
+            relpath = f"{reldir}/{name}" if reldir else name
+            entries[relpath] = e
+            if e[0] == 'd':
+                stack.append(relpath)
+    return entries, errors
+
+"""
+2. COPYING
+"""
+COPY_CHUNK = 8 * 1024 * 1024
+
+def copy_data(fsrc:BinaryIO, fdst:BinaryIO, report:Callable[[int], None]=nop) -> None:
+    '''
+    Copy the content of one open file into another, in the kernel where the OS allows it:
+    os.copy_file_range() first (reflinks or server-side copies on filesystems that support them),
+    then os.sendfile() (Linux), then a plain read/write loop. The report function gets the nr of
+    bytes of each chunk.
+
+    '''
+    infd, outfd = fsrc.fileno(), fdst.fileno()
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while True:
+                n = os.copy_file_range(infd, outfd, COPY_CHUNK)
+                if n == 0:
+                    return
+                copied += n
+                report(n)
+        except OSError as e:
+            # Not supported for this pair of files (eg. across filesystems on older kernels).
+            if (copied > 0) or (e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF)):
+                raise
+    if sys.platform.startswith("linux") and hasattr(os, "sendfile"):
+        try:
+            while True:
+                n = os.sendfile(outfd, infd, copied, COPY_CHUNK)
+                if n == 0:
+                    return
+                copied += n
+                report(n)
+        except OSError as e:
+            if (copied > 0) or (e.errno not in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP)):
+                raise
+    buf = bytearray(min(COPY_CHUNK, 1024 * 1024))
+    view = memoryview(buf)
+    while True:
+        n = fsrc.readinto(buf)
+        if not n:
+            return
+        fdst.write(view[:n])
+        report(n)
+
+def copy_file(src:str, dst:str, entry:Entry, report:Callable[[int], None]=nop) -> None:
+    '''
+    Copy a file like 'rsync -a' does: into a temporary file next to the target first, which then
+    replaces the target. Mode bits and mtime are preserved. Raises OSError.
+
+    '''
+    tmp = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.{threading.get_ident()}.~sync")
+    try:
+        with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+            copy_data(fsrc, fdst, report)
+        os.chmod(tmp, stat.S_IMODE(entry[3]))
+        os.utime(tmp, ns=(entry[2], entry[2]))
+        try:
+            os.replace(tmp, dst)
+        except PermissionError:
+            # A read-only target can't be replaced on Windows.
+            os.chmod(dst, stat.S_IWRITE)
+            os.replace(tmp, dst)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return
+
+def copy_symlink(dst:str, entry:Entry) -> None:
+    if os.path.lexists(dst):
+        _pg_.unlink(dst)
+    os.symlink(entry[4], dst)
+    return
+
+def delete_entry(path:str, is_dir:bool) -> None:
+    if not is_dir:
+        _pg_.unlink(path)
+        return
+    def retry(func, p, exc):
+        # Read-only files can't be deleted on Windows.
+        os.chmod(p, stat.S_IWRITE)
+        func(p)
+        return
+    if sys.version_info >= (3, 12):
+        # 'onerror' is deprecated since Python 3.12.
+        shutil.rmtree(path, onexc=retry)
+    else:
+        shutil.rmtree(path, onerror=retry)
+    return
+
+"""
+3. SYNCING
+"""
+class SyncResult:
+    '''
+    Outcome of execute_plan() and sync_dirs().
+
+    '''
+    def __init__(self) -> None:
+        self.nr_copied:int  = 0                  # Nr of copied files and symlinks.
+        self.nr_deleted:int = 0                  # Nr of deleted entries (a directory counts as one).
+        self.nr_dirs:int    = 0                  # Nr of created directories.
+        self.nr_bytes:int   = 0                  # Bytes copied.
+        self.nr_checked:int = 0                  # Nr of entries in the (filtered) source.
+        self.errors:List[Tuple[str, str]] = []   # (path, error message) for everything that failed.
+        self.seconds:float  = 0.0
+        self.renamed:bool   = False              # The whole tree got moved with a single rename.
+        return
+
+    def get_summary(self) -> str:
+        if self.renamed:
+            return f"Moved the whole directory with a rename in {self.seconds:.2f}s"
+        return (
+            f"Checked {self.nr_checked:,} entries: copied {self.nr_copied:,} files "
+            f"({_pg_.format_size(self.nr_bytes)}), created {self.nr_dirs:,} directories, "
+            f"deleted {self.nr_deleted:,} entries in {self.seconds:.2f}s, "
+            f"{len(self.errors)} error{'' if len(self.errors) == 1 else 's'}"
+        )
+
+class Change:
+    '''
+    One change of a SyncPlan().
+
+    '''
+    def __init__(self, action:str, relpath:str, size:int, entry:Entry) -> None:
+        self.action  = action     # 'delete', 'mkdir', 'create', 'update' or 'link'
+        self.relpath = relpath
+        self.size    = size       # Bytes to copy, or for 'delete' the bytes freed (the whole subtree).
+        self.entry   = entry      # The source entry, or the target entry for 'delete'.
+        return
+
+    def __repr__(self) -> str:
+        return f"Change({self.action!r}, {self.relpath!r}, {self.size})"
+
+class SyncPlan:
+    '''
+    The changes that mirror one tree into another, as computed by plan_sync(). The plan can be
+    previewed, sized and filtered before execute_plan() makes exactly these changes, without comparing
+    the trees a second time. The changes are in the order they get executed: deletions, new
+    directories, files and symlinks.
+
+    '''
+    ACTIONS = ("delete", "mkdir", "create", "update", "link")
+
+    def __init__(self, src_dirpath:str, tgt_dirpath:str) -> None:
+        self.src_dirpath = src_dirpath
+        self.tgt_dirpath = tgt_dirpath
+        self.changes:List[Change] = []
+        self.errors:List[Tuple[str, str]] = []   # (path, error message) for what couldn't be read.
+        self.nr_checked:int = 0                  # Nr of entries in the (filtered) source.
+        self.seconds:float  = 0.0                # Time it took to compute the plan.
+        # Only a complete plan makes both trees identical (see filter()).
+        self.complete:bool  = True
+        # Source directories, for their mode and mtime. The target directories in 'touched' get them
+        # after the execution, together with the parents of everything that changed.
+        self.dirs:Dict[str, Entry] = {}
+        self.touched:Set[str] = set()
+        # Snapshot to save after the execution (see sync_dirs()).
+        self.snapshot_filepath:Optional[str] = None
+        self.listings:Optional[Dict[str, List]] = None
+        self.taken:float = 0.0
+        return
+
+    def __len__(self) -> int:
+        return len(self.changes)
+
+    def __iter__(self) -> Iterator[Change]:
+        return iter(self.changes)
+
+    def get_changes(self, action:Optional[str]=None) -> List[Change]:
+        return [c for c in self.changes if (action is None) or (c.action == action)]
+
+    def get_nr_bytes(self) -> int:
+        '''
+        Bytes to copy.
+
+        '''
+        return sum(c.size for c in self.changes if c.action in ("create", "update"))
+
+    def filter(self, predicate:Callable[[Change], bool]) -> SyncPlan:
+        '''
+        Return a plan with only the changes for which predicate(change) is true. Executing it leaves
+        the trees different, so it never updates the snapshot.
+
+        '''
+        plan = copy.copy(self)
+        plan.changes  = [c for c in self.changes if predicate(c)]
+        plan.complete = self.complete and (len(plan.changes) == len(self.changes))
+        return plan
+
+    def get_summary(self) -> str:
+        parts = []
+        for action, what in (("create", "new files"), ("update", "changed files"), ("delete", "deletions")):
+            changes = self.get_changes(action)
+            if len(changes) > 0:
+                parts.append(f"{len(changes):,} {what} ({_pg_.format_size(sum(c.size for c in changes))})")
+        for action, what in (("mkdir", "new directories"), ("link", "symlinks")):
+            n = len(self.get_changes(action))
+            if n > 0:
+                parts.append(f"{n:,} {what}")
+        return (
+            f"Checked {self.nr_checked:,} entries: {', '.join(parts) if len(parts) > 0 else 'nothing to do'}"
+            + (f", {len(self.errors)} error{'' if len(self.errors) == 1 else 's'}" if len(self.errors) > 0 else '')
+        )
+
+def plan_sync(src_dirpath:str,
+              tgt_dirpath:str,
+              exclusions:Union[None, Iterable[str], _ex_.ExclusionRules]=None,
+              delete:bool=True,
+              snapshot_filepath:Optional[str]=None) -> SyncPlan:
+    '''
+    Compare both trees and return the changes that mirror 'src_dirpath' into 'tgt_dirpath' (see
+    sync_dirs() for the semantics and the parameters). Nothing gets changed.
+
+    '''
+    t0 = time.perf_counter()
+    plan = SyncPlan(src_dirpath.replace('\\', '/').rstrip('/'), tgt_dirpath.replace('\\', '/').rstrip('/'))
+    previous:Optional[TreeSnapshot] = None
+    if snapshot_filepath is not None:
+        plan.snapshot_filepath = snapshot_filepath
+        plan.listings = {}
+        plan.taken    = time.time()
+        previous = TreeSnapshot.load(snapshot_filepath)
+    src, src_errors = scan(plan.src_dirpath, exclusions, previous, plan.listings)
+    tgt, tgt_errors = scan(plan.tgt_dirpath, None, previous)
+    plan.errors += src_errors + tgt_errors
+    plan.nr_checked = len(src)
+    plan.dirs = {r: s for r, s in src.items() if s[0] == 'd'}
+    # Directories whose mode or mtime differ from their source.
+    plan.touched = set(
+        r for r, s in plan.dirs.items()
+        if (r in tgt) and (tgt[r][0] == 'd') and ((tgt[r][2] != s[2]) or (tgt[r][3] != s[3]))
+    )
+    plan.touched.add('')
+
+    # * 1. Extraneous entries, and entries that changed their kind. Deleting a directory takes its
+    #      content along.
+    deleted:Dict[str, Change] = {}
+    def get_deleted_parent(relpath:str) -> Optional[Change]:
+        # The deletion of the entry or one of its parent directories.
+        parts = relpath.split('/')
+        for i in range(1, len(parts) + 1):
+            change = deleted.get('/'.join(parts[:i]))
+            if change is not None:
+                return change
+        return None
+    for relpath in sorted(tgt.keys()):
+        t = tgt[relpath]
+        s = src.get(relpath)
+        parent = get_deleted_parent(relpath)
+        if parent is not None:
+            parent.size += t[1]
+            continue
+        if ((s is not None) and (s[0] == t[0])) or ((s is None) and (not delete)):
+            continue
+        change = Change("delete", relpath, t[1], t)
+        plan.changes.append(change)
+        deleted[relpath] = change
+    tgt = {r: t for r, t in tgt.items() if get_deleted_parent(r) is None}
+
+    # * 2. Missing directories.
+    for relpath in sorted(r for r in plan.dirs if r not in tgt):
+        plan.changes.append(Change("mkdir", relpath, 0, src[relpath]))
+
+    # * 3. Files that are new or changed, and symlinks.
+    for relpath in sorted(src.keys()):
+        s = src[relpath]
+        t = tgt.get(relpath)
+        if s[0] == 'f':
+            if t is None:
+                plan.changes.append(Change("create", relpath, s[1], s))
+            elif (t[1] != s[1]) or (t[2] != s[2]):
+                plan.changes.append(Change("update", relpath, s[1], s))
+        elif (s[0] == 'l') and ((t is None) or (t[4] != s[4])):
+            plan.changes.append(Change("link", relpath, 0, s))
+    plan.seconds = time.perf_counter() - t0
+    return plan
+
+def execute_plan(plan:SyncPlan,
+                 max_workers:int=8,
+                 progress:Callable[[int, int], None]=nop,
+                 itemfunc:Callable[[str, str], None]=nop) -> SyncResult:
+    '''
+    Make the changes of the given plan (see plan_sync()), without looking at the trees again. Files get
+    copied by a thread pool. Nothing gets printed: the caller reports the returned SyncResult().
+
+    :param progress:    Called with (bytes copied, total bytes to copy), from any thread.
+    :param itemfunc:    Called with (relpath, action) for every change that was made. From any thread.
+
+    '''
+    t0 = time.perf_counter()
+    result = SyncResult()
+    result.errors += plan.errors
+    result.nr_checked = plan.nr_checked
+    src_dirpath, tgt_dirpath = plan.src_dirpath, plan.tgt_dirpath
+    touched = set(plan.touched)
+    def touch_parent(relpath:str) -> None:
+        touched.add(relpath.rsplit('/', 1)[0] if '/' in relpath else '')
+        return
+    def fail(relpath:str, e:OSError) -> None:
+        result.errors.append((f"{tgt_dirpath}/{relpath}", e.strerror or str(e)))
+        return
+
+    # * 1. Deletions.
+    for change in plan.get_changes("delete"):
+        try:
+            delete_entry(f"{tgt_dirpath}/{change.relpath}", change.entry[0] == 'd')
+        except OSError as e:
+            fail(change.relpath, e)
+            continue
+        itemfunc(change.relpath, "delete")
+        result.nr_deleted += 1
+        touch_parent(change.relpath)
+
+    # * 2. New directories.
+    try:
+        os.makedirs(tgt_dirpath, exist_ok=True)
+    except OSError as e:
+        result.errors.append((tgt_dirpath, e.strerror or str(e)))
+        result.seconds = plan.seconds + time.perf_counter() - t0
+        return result
+    for change in plan.get_changes("mkdir"):
+        try:
+            os.mkdir(f"{tgt_dirpath}/{change.relpath}")
+        except FileExistsError:
+            pass
+        except OSError as e:
+            fail(change.relpath, e)
+            continue
+        itemfunc(change.relpath, "mkdir")
+        result.nr_dirs += 1
+        touched.add(change.relpath)
+        touch_parent(change.relpath)
+
+    # * 3. Files, then symlinks.
+    copies = [c for c in plan.changes if c.action in ("create", "update")]
+    total = sum(c.size for c in copies)
+    done  = 0
+    lock  = threading.Lock()
+    def report(n:int) -> None:
+        nonlocal done
+        with lock:
+            done += n
+            d = done
+        progress(d, total)
+        return
+    def copy_one(change:Change) -> Optional[OSError]:
+        try:
+            copy_file(f"{src_dirpath}/{change.relpath}", f"{tgt_dirpath}/{change.relpath}", change.entry, report)
+        except OSError as e:
+            return e
+        itemfunc(change.relpath, change.action)
+        return None
+    if len(copies) > 0:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(copies)))) as pool:
+            for change, error in zip(copies, pool.map(copy_one, copies)):
+                if error is not None:
+                    fail(change.relpath, error)
+                    continue
+                touch_parent(change.relpath)
+                result.nr_copied += 1
+                result.nr_bytes  += change.size
+    for change in plan.get_changes("link"):
+        try:
+            copy_symlink(f"{tgt_dirpath}/{change.relpath}", change.entry)
+        except OSError as e:
+            fail(change.relpath, e)
+            continue
+        itemfunc(change.relpath, "link")
+        touch_parent(change.relpath)
+        result.nr_copied += 1
+    progress(total, total)
+
+    # * 4. Give the directories the mode and mtime of their source, deepest first: adding files to
+    #      a directory changes its mtime.
+    for relpath in sorted(touched, key=lambda r: -1 if r == '' else r.count('/'), reverse=True):
+        if relpath and (relpath not in plan.dirs):
+            continue
+        path = f"{tgt_dirpath}/{relpath}" if relpath else tgt_dirpath
+        try:
+            if relpath:
+                mode, mtime_ns = plan.dirs[relpath][3], plan.dirs[relpath][2]
+            else:
+                st = os.stat(src_dirpath)
+                mode, mtime_ns = st.st_mode, st.st_mtime_ns
+            os.chmod(path, stat.S_IMODE(mode))
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        except OSError as e:
+            result.errors.append((path, e.strerror or str(e)))
+
+    # * 5. Remember the synced tree. After a failure or a partial plan, the trees may differ: the
+    #      snapshot must go.
+    if plan.snapshot_filepath is not None:
+        if (len(result.errors) == 0) and plan.complete:
+            TreeSnapshot(plan.listings, plan.taken).save(plan.snapshot_filepath)
+        else:
+            try:
+                os.unlink(plan.snapshot_filepath)
+            except OSError:
+                pass
+    result.seconds = plan.seconds + time.perf_counter() - t0
+    return result
+
+def sync_dirs(src_dirpath:str,
+              tgt_dirpath:str,
+              exclusions:Union[None, Iterable[str], _ex_.ExclusionRules]=None,
+              delete:bool=True,
+              max_workers:int=8,
+              progress:Callable[[int, int], None]=nop,
+              itemfunc:Callable[[str, str], None]=nop,
+              snapshot_filepath:Optional[str]=None) -> SyncResult:
+    '''
+    Mirror 'src_dirpath' into 'tgt_dirpath', with the semantics of:
+
+        rsync -a --delete --exclude <pattern> ... --delete-excluded <src_dirpath>/ <tgt_dirpath>
+
+    A file gets copied if it's missing in the target or differs in size or mtime. Files get copied by
+    a thread pool. Everything in the target that isn't in the filtered source gets deleted - excluded
+    entries as well. Nothing gets printed: the caller reports the returned SyncResult(). This is
+    plan_sync() followed by execute_plan().
+
+    :param delete:      Delete extraneous entries from the target (--delete).
+    :param progress:    Called with (bytes copied, total bytes to copy), from any thread.
+    :param itemfunc:    Called with (relpath, action) for every change, action being 'create',
+                        'update', 'link', 'mkdir' or 'delete'. From any thread.
+    :param snapshot_filepath:   Keep a TreeSnapshot() of the synced tree in this file. After a
+                                successful sync, both trees are identical, so the next sync can use
+                                it for the source as well as the target and only read the directories
+                                that changed since.
+
+    '''
+    plan = plan_sync(src_dirpath, tgt_dirpath, exclusions, delete, snapshot_filepath)
+    return execute_plan(plan, max_workers, progress, itemfunc)
+
+"""
+4. COPYING TREES
+"""
+def copy_tree(src_dirpath:str,
+              tgt_dirpath:str,
+              exclusions:Union[None, Iterable[str], _ex_.ExclusionRules]=None,
+              move:bool=False,
+              max_workers:int=8,
+              progress:Callable[[int, int], None]=nop,
+              itemfunc:Callable[[str, str], None]=nop) -> SyncResult:
+    '''
+    Copy 'src_dirpath' into a fresh 'tgt_dirpath': an existing target gets deleted first. It's a sync
+    into an empty directory, so the files get copied by a thread pool, in the kernel where the OS
+    allows it (see copy_data()), and the directories get the mode and mtime of their source.
+
+    :param move:        Delete what got copied from the source afterwards. Excluded entries stay
+                        behind. Without exclusions, the source directory just gets renamed if both
+                        are on the same filesystem. The source doesn't get walked then, so the result
+                        has no counts (see SyncResult.renamed).
+
+    See sync_dirs() for the other parameters.
+
+    '''
+    t0 = time.perf_counter()
+    src_dirpath = src_dirpath.replace('\\', '/').rstrip('/')
+    tgt_dirpath = tgt_dirpath.replace('\\', '/').rstrip('/')
+    result = SyncResult()
+    if os.path.lexists(tgt_dirpath):
+        try:
+            delete_entry(tgt_dirpath, os.path.isdir(tgt_dirpath) and not os.path.islink(tgt_dirpath))
+        except OSError as e:
+            result.errors.append((tgt_dirpath, e.strerror or str(e)))
+            return result
+    if move and (not _ex_.get_rules(exclusions)):
+        try:
+            os.makedirs(os.path.dirname(tgt_dirpath) or '.', exist_ok=True)
+            os.rename(src_dirpath, tgt_dirpath)
+        except OSError:
+            # Another filesystem, or the source is in use: copy and delete instead.
+            pass
+        else:
+            # Nothing got walked, so there is nothing to count.
+            result.renamed = True
+            progress(0, 0)
+            result.seconds = time.perf_counter() - t0
+            return result
+    plan = plan_sync(src_dirpath, tgt_dirpath, exclusions)
+    done:List[str] = []
+    def record(relpath:str, action:str) -> None:
+        if action != "mkdir":
+            done.append(relpath)
+        itemfunc(relpath, action)
+        return
+    result = execute_plan(plan, max_workers, progress, record if move else itemfunc)
+    if move:
+        for relpath in done:
+            try:
+                _pg_.unlink(f"{src_dirpath}/{relpath}")
+            except OSError as e:
+                result.errors.append((f"{src_dirpath}/{relpath}", e.strerror or str(e)))
+        # Directories that still hold something (excluded entries, failed copies) stay.
+        for relpath in sorted(plan.dirs, key=lambda r: r.count('/'), reverse=True) + ['']:
+            try:
+                os.rmdir(f"{src_dirpath}/{relpath}" if relpath else src_dirpath)
+            except OSError:
+                pass
+    result.seconds = time.perf_counter() - t0
+    return result
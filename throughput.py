@@ -0,0 +1,101 @@
+from __future__ import annotations
+from typing import *
+import time, threading, collections
+import mini_console.purge as _pg_
+
+class TransferMeter:
+    '''
+    Progress, rate and ETA of a transfer of known size, weighted by bytes: one big file counts as much
+    as the thousands of small ones that add up to the same size. The rate comes from the samples of the
+    last few seconds, such that it follows the current speed instead of the average since the start.
+    Thread-safe: several copy workers may report into the same meter.
+
+    '''
+    def __init__(self, total_bytes:int, window:float=5.0) -> None:
+        '''
+        :param total_bytes:     Size of the whole transfer.
+        :param window:          Seconds of samples the rate is computed from.
+
+        '''
+        self.total_bytes:int = max(0, total_bytes)
+        self.done_bytes:int  = 0
+        self.__window  = window
+        self.__start   = time.monotonic()
+        self.__samples:Deque[Tuple[float, int]] = collections.deque([(self.__start, 0)])
+        self.__lock    = threading.Lock()
+        return
+
+    def update(self, done_bytes:int) -> float:
+        '''
+        Set the nr of bytes transferred so far and return the progress as a fraction (0.0-1.0).
+
+        '''
+        now = time.monotonic()
+        with self.__lock:
+            self.done_bytes = max(self.done_bytes, done_bytes)
+            self.__samples.append((now, self.done_bytes))
+            while (len(self.__samples) > 2) and (now - self.__samples[1][0] > self.__window):
+                self.__samples.popleft()
+        return self.get_fraction()
+
+    def add(self, nr_bytes:int) -> float:
+        '''
+        Same as update(), but with the nr of bytes transferred since the last call.
+
+        '''
+        with self.__lock:
+            done_bytes = self.done_bytes + nr_bytes
+        return self.update(done_bytes)
+
+    def get_fraction(self) -> float:
+        if self.total_bytes == 0:
+            return 1.0
+        return min(1.0, self.done_bytes / self.total_bytes)
+
+    def get_rate(self) -> float:
+        '''
+        Current rate [bytes/s].
+
+        '''
+        with self.__lock:
+            (t0, b0), (t1, b1) = self.__samples[0], self.__samples[-1]
+        if t1 - t0 <= 0:
+            return 0.0
+        return (b1 - b0) / (t1 - t0)
+
+    def get_eta(self) -> Optional[float]:
+        '''
+        Seconds left at the current rate, None if there's no rate yet.
+
+        '''
+        rate = self.get_rate()
+        if rate <= 0:
+            return None
+        return max(0, self.total_bytes - self.done_bytes) / rate
+
+    def get_elapsed(self) -> float:
+        return time.monotonic() - self.__start
+
+    def get_status(self) -> str:
+        '''
+        eg. '12.3 MB/s, 0:00:42 left'
+
+        '''
+        eta = self.get_eta()
+        return f"{format_rate(self.get_rate())}, {format_duration(eta) if eta is not None else '?'} left"
+
+    def get_summary(self) -> str:
+        '''
+        eg. '1.2 GB in 0:01:40 (12.3 MB/s)'
+
+        '''
+        elapsed = self.get_elapsed()
+        rate = self.done_bytes / elapsed if elapsed > 0 else 0.0
+        return f"{_pg_.format_size(self.done_bytes)} in {format_duration(elapsed)} ({format_rate(rate)})"
+
+def format_rate(bytes_per_second:float) -> str:
+    return f"{_pg_.format_size(int(bytes_per_second))}/s"
+
+def format_duration(seconds:float) -> str:
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{(seconds // 60) % 60:02d}:{seconds % 60:02d}"
@@ -0,0 +1,155 @@
+from __future__ import annotations
+from typing import *
+import os, time, queue, platform, threading
+import mini_console.build_dirs as _bd_
+import mini_console.purge      as _pg_
+
+def move_to_trash(path:str, recreate:bool=False) -> str:
+    '''
+    Rename the given file or directory into its trash directory (see build_dirs.get_trash_dirpath())
+    and return its new path. This is a single rename on the same filesystem, so it takes no time
+    regardless of the size of the tree. Raises OSError if the rename fails, eg. because a file is
+    locked (Windows) or the path is a mount point.
+
+    :param recreate:    Create an empty directory in place of the moved one.
+
+    '''
+    path = path.replace('\\', '/').rstrip('/')
+    trash_dirpath = _bd_.get_trash_dirpath(path)
+    trashed = os.path.join(trash_dirpath, f"{os.path.basename(path)}.{time.time_ns()}.{os.getpid()}").replace('\\', '/')
+    for attempt in range(3):
+        os.makedirs(trash_dirpath, exist_ok=True)
+        try:
+            os.rename(path, trashed)
+            break
+        except FileNotFoundError:
+            # The collector may remove the (empty) trash directory right after it got created.
+            if (attempt == 2) or (not os.path.lexists(path)):
+                raise
+    if recreate:
+        os.makedirs(path, exist_ok=True)
+    return trashed
+
+def delete_tree(path:str) -> Tuple[int, int]:
+    '''
+    Delete the given file or directory tree, bottom-up. Read-only files get their write permission
+    back first. Everything that can't be deleted stays - it'll be retried the next time the trash
+    gets emptied. Return (nr of deleted files, bytes freed).
+
+    '''
+    nr_files, nr_bytes = 0, 0
+    if not os.path.isdir(path) or os.path.islink(path):
+        try:
+            size = os.lstat(path).st_size
+            _pg_.unlink(path)
+            return 1, size
+        except OSError:
+            return 0, 0
+    for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+        for name in filenames + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]:
+            filepath = os.path.join(dirpath, name)
+            try:
+                size = os.lstat(filepath).st_size
+                _pg_.unlink(filepath)
+            except OSError:
+                continue
+            nr_files += 1
+            nr_bytes += size
+        try:
+            os.rmdir(dirpath)
+        except OSError:
+            pass
+        # Give way to the threads that do real work.
+        time.sleep(0)
+    return nr_files, nr_bytes
+
+class TrashCollector:
+    '''
+    Background worker that empties trash directories. It's a single daemon thread at the lowest
+    priority on Linux (where os.nice() applies to the calling thread only). Trash that is still
+    there when the application quits simply gets collected on the next start.
+
+    '''
+    def __init__(self) -> None:
+        self.__queue:queue.Queue = queue.Queue()
+        self.__pending:Set[str]  = set()
+        self.__lock   = threading.Lock()
+        self.__idle   = threading.Event()
+        self.__idle.set()
+        self.__thread:Optional[threading.Thread] = None
+        return
+
+    def submit(self, trash_dirpath:str) -> None:
+        '''
+        Empty the given trash directory (and remove it) in the background. Submitting a directory
+        that is already queued is a no-op.
+
+        '''
+        trash_dirpath = trash_dirpath.replace('\\', '/')
+        with self.__lock:
+            if trash_dirpath in self.__pending:
+                return
+            self.__pending.add(trash_dirpath)
+            self.__idle.clear()
+            if (self.__thread is None) or (not self.__thread.is_alive()):
+                self.__thread = threading.Thread(target=self.__run__, name="TrashCollector", daemon=True)
+                self.__thread.start()
+        self.__queue.put(trash_dirpath)
+        return
+
+    def wait(self, timeout:Optional[float]=None) -> bool:
+        '''
+        Wait until all submitted trash is gone. Return False on timeout.
+
+        '''
+        return self.__idle.wait(timeout)
+
+    def __run__(self) -> None:
+        if platform.system() == "Linux":
+            # Elsewhere, os.nice() would lower the priority of the whole process.
+            try:
+                os.nice(19)
+            except OSError:
+                pass
+        while True:
+            trash_dirpath = self.__queue.get()
+            with self.__lock:
+                # Entries moved into the trash after this point get picked up as well.
+                self.__pending.discard(trash_dirpath)
+            try:
+                names = os.listdir(trash_dirpath)
+            except OSError:
+                names = []
+            for name in names:
+                delete_tree(os.path.join(trash_dirpath, name))
+            try:
+                os.rmdir(trash_dirpath)
+            except OSError:
+                pass
+            with self.__lock:
+                if len(self.__pending) == 0:
+                    self.__idle.set()
+        return
+
+_collector:Optional[TrashCollector] = None
+_collector_lock = threading.Lock()
+
+def get_collector() -> TrashCollector:
+    global _collector
+    with _collector_lock:
+        if _collector is None:
+            _collector = TrashCollector()
+        return _collector
+
+def reclaim(paths:Iterable[str]) -> List[str]:
+    '''
+    Hand the trash left behind next to any of the given paths (eg. by a run that got killed before
+    its trash was emptied) over to the collector. Return the trash directories that were found.
+
+    '''
+    found = []
+    for trash_dirpath in sorted(set(_bd_.get_trash_dirpath(p) for p in paths)):
+        if os.path.isdir(trash_dirpath):
+            get_collector().submit(trash_dirpath)
+            found.append(trash_dirpath)
+    return found